@@ -4,4 +4,6 @@ from website import create_app
 app = create_app()
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    from website.provisioning import provision
+    provision(app)
+    app.run(debug=True)
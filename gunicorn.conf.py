@@ -0,0 +1,58 @@
+"""
+Gunicorn settings for the stumarcot service
+
+Gunicorn picks this file up automatically when started from the project
+directory. The app is imported once in the master (preload_app) and the
+database is provisioned there, so workers fork with code, templates and
+read-only state already in memory and never touch the database at boot.
+Bind address and worker count keep coming from the command line.
+"""
+
+import gc
+
+preload_app = True
+
+
+def on_starting(server):
+    """Runs once in the master before any worker is forked"""
+    from website import db
+    from website.provisioning import provision
+
+    app = server.app.wsgi()
+    if not provision(app):
+        # Workers would serve (and write to) a schema the code does not match
+        server.log.error("Migrations are pending: run `flask db upgrade` before starting gunicorn")
+        raise SystemExit(1)
+
+    if app.config.get('WARMUP_ON_BOOT'):
+        # Compiled templates are inherited by every forked worker
+        from website.warmup import compile_templates
+        compile_templates(app)
+
+    # Never share SQLite connections opened here with the workers
+    with app.app_context():
+        db.engine.dispose()
+
+    # Move everything imported so far into the permanent generation so the
+    # workers' garbage collector does not write to (and un-share) those pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    """Give each worker its own connection pool"""
+    from website import db
+
+    with server.app.wsgi().app_context():
+        db.engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    """Warm the worker up before it accepts requests (WARMUP_ON_BOOT)"""
+    app = worker.app.wsgi()
+    if app.config.get('WARMUP_ON_BOOT'):
+        from website.warmup import warm_up
+
+        # Counts against the worker timeout; workers booting together
+        # share one render per page through the response cache
+        report = warm_up(app)
+        worker.log.info(f"Worker {worker.pid} warmed up in {report.total_ms:.0f}ms")
@@ -0,0 +1,38 @@
+"""Add the catalog_change sync log
+
+Revision ID: a7c9e1f3b5d7
+Revises: f6a8b0c2d4e6
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c9e1f3b5d7'
+down_revision = 'f6a8b0c2d4e6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('catalog_change',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('entity', sa.String(length=20), nullable=False),
+    sa.Column('entity_id', sa.Integer(), nullable=False),
+    sa.Column('action', sa.String(length=10), nullable=False),
+    sa.Column('changed_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sqlite_autoincrement=True
+    )
+    with op.batch_alter_table('catalog_change', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_catalog_change_changed_at'), ['changed_at'], unique=False)
+    # The baseline (one upsert per existing row) is written by `flask provision`
+
+
+def downgrade():
+    with op.batch_alter_table('catalog_change', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_catalog_change_changed_at'))
+
+    op.drop_table('catalog_change')
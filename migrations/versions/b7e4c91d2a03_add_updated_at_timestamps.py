@@ -0,0 +1,38 @@
+"""Add updated_at timestamps for incremental exports
+
+Revision ID: b7e4c91d2a03
+Revises: a1b2c3d4e5f6
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e4c91d2a03'
+down_revision = 'a1b2c3d4e5f6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('category', 'product', 'job_posting'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+            batch_op.create_index(batch_op.f(f'ix_{table}_updated_at'), ['updated_at'], unique=False)
+        # Existing rows have never been edited as far as we know
+        op.execute(f'UPDATE {table} SET updated_at = created_at WHERE updated_at IS NULL')
+
+    with op.batch_alter_table('product_image', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_product_image_created_at'), ['created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('product_image', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_product_image_created_at'))
+
+    for table in ('job_posting', 'product', 'category'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(batch_op.f(f'ix_{table}_updated_at'))
+            batch_op.drop_column('updated_at')
@@ -0,0 +1,26 @@
+"""Rebuild stored product structured data (Offer price, no aggregateRating)
+
+Revision ID: b8d0f2a4c6e8
+Revises: a7c9e1f3b5d7
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8d0f2a4c6e8'
+down_revision = 'a7c9e1f3b5d7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Cleared rows are rebuilt by provisioning (website.seo.backfill), which
+    # needs the app for url_for()
+    op.execute(sa.text('UPDATE product SET structured_data = NULL, list_item_data = NULL, meta_keywords = NULL'))
+
+
+def downgrade():
+    pass
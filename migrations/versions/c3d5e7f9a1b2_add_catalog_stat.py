@@ -0,0 +1,34 @@
+"""Add catalog_stat counters for the dashboards
+
+Revision ID: c3d5e7f9a1b2
+Revises: b7e4c91d2a03
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3d5e7f9a1b2'
+down_revision = 'b7e4c91d2a03'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('catalog_stat',
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('value', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_product_created_at'), ['created_at'], unique=False)
+    # The counters are filled by `flask provision` (or `flask stats-rebuild`)
+
+
+def downgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_product_created_at'))
+
+    op.drop_table('catalog_stat')
@@ -0,0 +1,26 @@
+"""Index product_image.product_id for per-product image lookups
+
+Revision ID: d4e6f8a0b2c4
+Revises: c3d5e7f9a1b2
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4e6f8a0b2c4'
+down_revision = 'c3d5e7f9a1b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('product_image', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_product_image_product_id'), ['product_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('product_image', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_product_image_product_id'))
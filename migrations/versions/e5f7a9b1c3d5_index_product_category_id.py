@@ -0,0 +1,26 @@
+"""Index product.category_id for paged category listings
+
+Revision ID: e5f7a9b1c3d5
+Revises: d4e6f8a0b2c4
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5f7a9b1c3d5'
+down_revision = 'd4e6f8a0b2c4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_product_category_id'), ['category_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_product_category_id'))
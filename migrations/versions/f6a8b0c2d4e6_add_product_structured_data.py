@@ -0,0 +1,30 @@
+"""Add prebuilt structured data columns to product
+
+Revision ID: f6a8b0c2d4e6
+Revises: e5f7a9b1c3d5
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f6a8b0c2d4e6'
+down_revision = 'e5f7a9b1c3d5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('structured_data', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('list_item_data', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('meta_keywords', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_column('meta_keywords')
+        batch_op.drop_column('list_item_data')
+        batch_op.drop_column('structured_data')
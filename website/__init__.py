@@ -1,16 +1,30 @@
-from flask import Flask
+from flask import Flask, g, request
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
-from datetime import date
+from werkzeug.middleware.proxy_fix import ProxyFix
 import os
+import time
 
 db = SQLAlchemy()
 migrate = Migrate()
 DB_NAME = "database.db"
 
-def create_app():
-    app = Flask(__name__, static_folder='static')
+def create_app(test_config=None, instance_path=None):
+    """
+    Build the application without touching the database
+
+    `test_config` overrides settings (e.g. SQLALCHEMY_DATABASE_URI) and
+    `instance_path` moves the runtime files (shared cache, template
+    bytecode, job sweep stamp) for benchmarks and scripts that must not
+    use the live database.
+
+    Table creation and seeding live in website.provisioning and run once per
+    deploy (gunicorn master, `flask provision` or `python app.py`), so that
+    importing the app in a worker is cheap and side-effect free.
+    """
+    started = time.perf_counter()
+    app = Flask(__name__, static_folder='static', instance_path=instance_path)
     app.config["SERVER_NAME"] = "stumarcot.co.tz"
     app.config["PREFERRED_URL_SCHEME"] = "https"
     app.config['SECRET_KEY'] = 'your-secret-key-here'
@@ -18,6 +32,98 @@ def create_app():
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['UPLOAD_FOLDER'] = 'website/static/uploads'
 
+    # Typeahead prefix index: hard cap on keys held in memory, and how old
+    # (seconds) the index may get before it is refreshed in the background
+    app.config['SEARCH_INDEX_MAX_ENTRIES'] = 200000
+    app.config['SEARCH_INDEX_MAX_AGE'] = 300
+
+    # Per-worker cache of logged-in users: seconds an entry lives, max entries
+    app.config['USER_CACHE_TTL'] = 30
+    app.config['USER_CACHE_SIZE'] = 1024
+
+    # Password hashing: method/cost for new hashes (e.g. 'pbkdf2:sha256:600000';
+    # without a count Werkzeug's default is used, and stored hashes made with a
+    # different cost are rehashed on the next login), hashing threads per
+    # worker (they only offload work from threaded gunicorn workers; a sync
+    # worker runs one request at a time), max checks queued per worker, max
+    # concurrent checks per client IP and per account across all workers on
+    # the host, and how long (seconds) a check's lease outlives a killed worker
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256'
+    app.config['PASSWORD_HASH_WORKERS'] = 2
+    app.config['PASSWORD_HASH_MAX_PENDING'] = 16
+    app.config['PASSWORD_CHECKS_PER_IP'] = 2
+    app.config['PASSWORD_CHECKS_PER_ACCOUNT'] = 1
+    app.config['PASSWORD_CHECK_LEASE_TTL'] = 30
+
+    # Most product ids accepted by /api/v1/products/batch
+    app.config['API_BATCH_MAX'] = 100
+
+    # Days of image uploads shown on the admin dashboard; older per-day
+    # counters are deleted
+    app.config['STATS_UPLOAD_DAYS'] = 14
+
+    # Seconds between sweeps that mark job postings past their deadline
+    # inactive (one more runs just after midnight UTC); 0 disables the sweeper
+    app.config['JOBS_SWEEP_INTERVAL'] = 3600
+
+    # Response compression: smallest body worth compressing (bytes), gzip
+    # level (1-9) and brotli quality (0-11, used when brotli is installed)
+    app.config['COMPRESS_MIN_SIZE'] = 500
+    app.config['COMPRESS_LEVEL'] = 6
+    app.config['COMPRESS_BROTLI_LEVEL'] = 5
+
+    # Anonymous response cache: seconds an entry lives (0 disables it) and
+    # the byte budget per worker; the endpoints default to
+    # response_cache.CACHEABLE_ENDPOINTS (RESPONSE_CACHE_ENDPOINTS overrides)
+    app.config['RESPONSE_CACHE_TTL'] = 60
+    app.config['RESPONSE_CACHE_MAX_BYTES'] = 32 * 1024 * 1024
+    # Also keep rendered responses in the host-wide shared cache, so each
+    # page is rendered once per host rather than once per worker
+    app.config['RESPONSE_CACHE_SHARED'] = True
+    # Seconds an expired entry is still served while it is rendered again
+    # after the response went out (0 disables), and how long a miss waits
+    # for an identical request that is already rendering (0 disables the
+    # wait); keep the wait far below the gunicorn worker timeout
+    app.config['RESPONSE_CACHE_STALE'] = 300
+    app.config['RESPONSE_CACHE_WAIT'] = 2
+
+    # Host-wide cache shared by all worker processes (a SQLite file, by
+    # default instance/shared_cache.sqlite3): byte budget and default TTL
+    app.config['SHARED_CACHE_PATH'] = None
+    app.config['SHARED_CACHE_MAX_BYTES'] = 128 * 1024 * 1024
+    app.config['SHARED_CACHE_TTL'] = 300
+
+    # Public pages read the catalog from an in-memory snapshot (see
+    # website/catalog.py); above this many products they query instead.
+    # MAX_AGE (seconds) bounds how long edits made outside the app go unseen
+    app.config['CATALOG_SNAPSHOT'] = True
+    app.config['CATALOG_SNAPSHOT_MAX_PRODUCTS'] = 20000
+    app.config['CATALOG_SNAPSHOT_MAX_AGE'] = 300
+
+    # Run website.warmup in each gunicorn worker before it takes requests
+    # (templates are compiled once in the master), and how many of the
+    # largest categories it pre-renders there and in `flask warmup`
+    app.config['WARMUP_ON_BOOT'] = False
+    app.config['WARMUP_TOP_CATEGORIES'] = 10
+
+    # Seconds each /products shuffle order is served before the next one;
+    # pagination links carry the seed, so paging never reshuffles
+    app.config['PRODUCT_SHUFFLE_ROTATION'] = 86400
+
+    # Compiled templates are kept as bytecode files shared by all workers
+    # (by default in instance/jinja_cache); `flask compile-templates` fills it
+    app.config['TEMPLATE_BYTECODE_CACHE'] = True
+    app.config['TEMPLATE_BYTECODE_CACHE_DIR'] = None
+
+    # Days of catalog changes kept for /api/v1/changes (`flask changelog-prune`);
+    # clients with an older cursor are told to resync
+    app.config['CHANGELOG_RETENTION_DAYS'] = 90
+
+    # Reverse proxies in front of gunicorn whose X-Forwarded-For is trusted
+    # for the client IP (per-IP login caps); 0 when clients connect directly,
+    # or they could pick any IP
+    app.config['PROXY_FIX_X_FOR'] = 1
+
     app.config['SESSION_COOKIE_DOMAIN'] = ".stumarcot.co.tz" 
 
     app.config['SESSION_COOKIE_SAMESITE'] = 'None'
@@ -27,21 +133,48 @@ def create_app():
     # Set the session cookie httponly flag
     app.config['SESSION_COOKIE_HTTPONLY'] = False
         
+    if test_config:
+        app.config.update(test_config)
+        
+    if app.config['PROXY_FIX_X_FOR']:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
+        
     # Create upload directory if it doesn't exist
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     
     db.init_app(app)
+    
+    # Before anything creates app.jinja_env
+    from .template_cache import template_cache
+    template_cache.init_app(app)
+    
     migrate.init_app(app, db)
     
     from .views import views
     from .auth import auth
     from .error_handlers import error_bp
+    from .api import api
     
     app.register_blueprint(views, url_prefix='/')
     app.register_blueprint(auth, url_prefix='/')
     app.register_blueprint(error_bp, url_prefix='/')
+    app.register_blueprint(api, url_prefix='/api/v1')
     
     from .models import User, Category, Product, JobPosting
+    from .search_index import search_index
+    from .stats import site_stats
+    from .changelog import changelog
+    from .jobs import active_jobs
+    from .catalog import catalog
+    
+    search_index.init_app(app)
+    site_stats.init_app(app)
+    changelog.init_app(app)
+    active_jobs.init_app(app)
+    catalog.init_app(app)
+    
+    from .commands import register_commands
+    register_commands(app)
     
     # Add custom Jinja2 filters
     import json
@@ -59,49 +192,36 @@ def create_app():
     login_manager.login_view = 'auth.login'
     login_manager.init_app(app)
     
+    from .user_cache import user_cache
+    from .passwords import password_hasher
+    user_cache.init_app(app)
+    password_hasher.init_app(app)
+    
+    from .shared_cache import shared_cache
+    from .response_cache import response_cache
+    from .compression import compressor
+    shared_cache.init_app(app)
+    # after_request hooks run in reverse order of registration: responses
+    # are compressed first and then stored, so the cache holds encoded bytes
+    response_cache.init_app(app)
+    compressor.init_app(app)
+    
     @login_manager.user_loader
     def load_user(id):
-        return User.query.get(int(id))
+        return user_cache.load(int(id))
+    
+    @app.before_request
+    def skip_anonymous_user_loading():
+        # Without a session or remember-me cookie nobody can be logged in,
+        # so hand Flask-Login an anonymous user instead of letting it
+        # open the session and run its loaders
+        cookies = request.cookies
+        if (app.config['SESSION_COOKIE_NAME'] not in cookies
+                and app.config.get('REMEMBER_COOKIE_NAME', 'remember_token') not in cookies):
+            g._login_user = login_manager.anonymous_user()
+    
+    from . import metrics, startup
+    metrics.register('startup', lambda: dict(startup.timings))
+    startup.record('create_app_ms', started)
     
-    with app.app_context():
-        db.create_all()
-        
-        # Convenience seeding. Wrapped because this runs at import time under
-        # gunicorn: an exception here kills every worker and takes the whole
-        # site down, which is far worse than skipping a seed.
-        try:
-            # Create default admin user if it doesn't exist
-            admin = User.query.filter_by(email='admin@admin.com').first()
-            if not admin:
-                from werkzeug.security import generate_password_hash
-                admin_user = User(
-                    email='admin@admin.com',
-                    username='admin',
-                    password=generate_password_hash('admin123', method='pbkdf2:sha256'),
-                    is_admin=True
-                )
-                db.session.add(admin_user)
-                db.session.commit()
-
-            # Seed the first job posting if none exist
-            if not JobPosting.query.first():
-                first_job = JobPosting(
-                    title='Accountant',
-                    description='Stumarcot is looking for a detail-oriented Accountant to join our finance team, responsible for maintaining financial records, processing transactions, preparing reports, and supporting month-end close.',
-                    qualifications="Bachelor's degree in Accounting, Finance, or a related field\n"
-                                   "Minimum of 2 years of relevant accounting experience\n"
-                                   "Strong knowledge of accounting principles and financial reporting\n"
-                                   "Proficiency in accounting software and MS Excel\n"
-                                   "High attention to detail, accuracy and integrity\n"
-                                   "Good communication and reporting skills",
-                    deadline=date(2026, 8, 25),
-                    application_email='hr@stumarcot.co.tz',
-                    is_active=True,
-                )
-                db.session.add(first_job)
-                db.session.commit()
-        except Exception as exc:
-            db.session.rollback()
-            app.logger.warning('Startup seeding skipped: %s', exc)
-
     return app
\ No newline at end of file
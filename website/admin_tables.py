@@ -0,0 +1,226 @@
+"""
+Server-side paging, sorting and filtering for the admin tables
+
+Each page of rows comes from one projection query (plus one COUNT for the
+total) instead of loading every ORM object and lazily fetching its
+category, owner and images row by row. The same rows back the HTML tables
+and their JSON endpoints.
+"""
+
+import math
+from typing import List, Optional
+
+from flask import url_for
+from sqlalchemy import func, or_, select
+
+from . import db
+from .models import Category, Product, ProductImage, User
+from .read_models import first_image
+
+DEFAULT_PER_PAGE = 25
+MAX_PER_PAGE = 100
+
+
+class TablePage:
+    """One page of projection rows plus the paging state the templates need"""
+
+    def __init__(self, rows: List, page: int, per_page: int, total: int, sort: str, direction: str, filters: dict):
+        self.rows = rows
+        self.page = page
+        self.per_page = per_page
+        self.total = total
+        self.pages = max(1, math.ceil(total / per_page))
+        self.sort = sort
+        self.direction = direction
+        self.filters = filters
+
+    @property
+    def has_prev(self) -> bool:
+        return self.page > 1
+
+    @property
+    def has_next(self) -> bool:
+        return self.page < self.pages
+
+    def args(self, **overrides) -> dict:
+        """Query-string arguments for a link to another page/sort of this table"""
+        args = {k: v for k, v in self.filters.items() if v not in (None, '')}
+        args.update(page=self.page, sort=self.sort, dir=self.direction)
+        args.update(overrides)
+        return args
+
+    def meta(self) -> dict:
+        return {
+            'page': self.page,
+            'per_page': self.per_page,
+            'pages': self.pages,
+            'total': self.total,
+            'sort': self.sort,
+            'dir': self.direction,
+        }
+
+
+def _paging(args, sorts, default_sort: str, default_direction: str):
+    sort = args.get('sort', default_sort)
+    if sort not in sorts:
+        sort = default_sort
+    direction = args.get('dir', default_direction)
+    if direction not in ('asc', 'desc'):
+        direction = default_direction
+    page = max(1, args.get('page', 1, type=int) or 1)
+    per_page = min(MAX_PER_PAGE, max(1, args.get('per_page', DEFAULT_PER_PAGE, type=int) or DEFAULT_PER_PAGE))
+    return sort, direction, page, per_page
+
+
+def _order(column, direction: str):
+    return column.desc() if direction == 'desc' else column.asc()
+
+
+# Correlated per-row subquery; cheap with the index on product_image.product_id
+_image_count = (
+    select(func.count(ProductImage.id))
+    .where(ProductImage.product_id == Product.id)
+    .correlate(Product)
+    .scalar_subquery()
+)
+
+PRODUCT_SORTS = {
+    'name': Product.name,
+    'category': Category.name,
+    'owner': User.username,
+    'images': _image_count,
+    'added': Product.created_at,
+}
+
+
+def product_page(args) -> TablePage:
+    """Products for the admin table, filtered by ?q=, ?category= and ?owner="""
+    sort, direction, page, per_page = _paging(args, PRODUCT_SORTS, 'added', 'desc')
+    filters = {
+        'q': (args.get('q') or '').strip(),
+        'category': args.get('category', type=int),
+        'owner': args.get('owner', type=int),
+    }
+
+    conditions = []
+    if filters['q']:
+        conditions.append(Product.name.ilike(f"%{filters['q']}%"))
+    if filters['category']:
+        conditions.append(Product.category_id == filters['category'])
+    if filters['owner']:
+        conditions.append(Product.user_id == filters['owner'])
+
+    total = db.session.scalar(select(func.count(Product.id)).where(*conditions))
+    pages = max(1, math.ceil(total / per_page))
+    page = min(page, pages)
+
+    rows = db.session.execute(
+        select(
+            Product.id,
+            Product.name,
+            func.substr(Product.description, 1, 71).label('description'),
+            Product.created_at,
+            Category.id.label('category_id'),
+            Category.name.label('category_name'),
+            User.id.label('owner_id'),
+            User.username.label('owner_name'),
+            _image_count.label('image_count'),
+            first_image.label('thumbnail'),
+        )
+        .join(Category, Product.category_id == Category.id)
+        .join(User, Product.user_id == User.id)
+        .where(*conditions)
+        .order_by(_order(PRODUCT_SORTS[sort], direction), _order(Product.id, direction))
+        .limit(per_page)
+        .offset((page - 1) * per_page)
+    ).all()
+    return TablePage(rows, page, per_page, total, sort, direction, filters)
+
+
+def product_row_json(row) -> dict:
+    description = row.description or ''
+    return {
+        'id': row.id,
+        'name': row.name,
+        'description': description[:70] + ('...' if len(description) > 70 else ''),
+        'category': {'id': row.category_id, 'name': row.category_name},
+        'owner': {'id': row.owner_id, 'username': row.owner_name},
+        'images': row.image_count,
+        'thumbnail': url_for('static', filename='uploads/' + row.thumbnail) if row.thumbnail else None,
+        'created_at': row.created_at.isoformat() if row.created_at else None,
+        'urls': {
+            'view': url_for('views.product_single', product_id=row.id),
+            'edit': url_for('views.edit_product', product_id=row.id),
+            'delete': url_for('views.delete_product', product_id=row.id),
+        },
+    }
+
+
+USER_SORTS = ('username', 'email', 'role', 'products', 'joined')
+
+
+def user_page(args) -> TablePage:
+    """Users with their product counts, filtered by ?q= (name or email) and ?role="""
+    sort, direction, page, per_page = _paging(args, USER_SORTS, 'joined', 'asc')
+    filters = {
+        'q': (args.get('q') or '').strip(),
+        'role': args.get('role') if args.get('role') in ('admin', 'staff') else '',
+    }
+
+    conditions = []
+    if filters['q']:
+        pattern = f"%{filters['q']}%"
+        conditions.append(or_(User.username.ilike(pattern), User.email.ilike(pattern)))
+    if filters['role']:
+        conditions.append(User.is_admin == (filters['role'] == 'admin'))
+
+    total = db.session.scalar(select(func.count(User.id)).where(*conditions))
+    pages = max(1, math.ceil(total / per_page))
+    page = min(page, pages)
+
+    # One GROUP BY over products instead of loading each user's collection
+    counts = (
+        select(Product.user_id, func.count(Product.id).label('product_count'))
+        .group_by(Product.user_id)
+        .subquery()
+    )
+    product_count = func.coalesce(counts.c.product_count, 0)
+    sort_column = {
+        'username': User.username,
+        'email': User.email,
+        'role': User.is_admin,
+        'products': product_count,
+        'joined': User.created_at,
+    }[sort]
+
+    rows = db.session.execute(
+        select(
+            User.id,
+            User.username,
+            User.email,
+            User.is_admin,
+            User.created_at,
+            product_count.label('product_count'),
+        )
+        .outerjoin(counts, counts.c.user_id == User.id)
+        .where(*conditions)
+        .order_by(_order(sort_column, direction), _order(User.id, direction))
+        .limit(per_page)
+        .offset((page - 1) * per_page)
+    ).all()
+    return TablePage(rows, page, per_page, total, sort, direction, filters)
+
+
+def user_row_json(row, current_user_id: Optional[int] = None) -> dict:
+    return {
+        'id': row.id,
+        'username': row.username,
+        'email': row.email,
+        'is_admin': bool(row.is_admin),
+        'is_you': row.id == current_user_id,
+        'products': row.product_count,
+        'created_at': row.created_at.isoformat() if row.created_at else None,
+        'urls': {
+            'delete': url_for('views.delete_user', user_id=row.id),
+        },
+    }
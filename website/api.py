@@ -0,0 +1,441 @@
+"""
+Read-only JSON catalog API, mounted at /api/v1
+
+Lists are paged with an opaque cursor (keyset on id, so deep pages cost the
+same as the first) and accept `fields=` to pick the columns that are
+selected from the database. Responses carry an ETag and answer
+If-None-Match with 304. /changes serves the catalog change log for
+incremental sync.
+"""
+
+import base64
+import binascii
+import json
+from datetime import date, datetime
+
+from flask import Blueprint, current_app, request, url_for
+from sqlalchemy import select
+
+from . import db
+from .models import Category, JobPosting, Product, ProductImage
+
+try:
+    import orjson
+except ImportError:  # optional: faster serialization when installed
+    orjson = None
+
+api = Blueprint('api', __name__)
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _json_response(payload, status: int = 200):
+    if orjson is not None:
+        body = orjson.dumps(payload)
+    else:
+        body = json.dumps(payload, separators=(',', ':'), ensure_ascii=False, default=_default).encode('utf-8')
+
+    response = current_app.response_class(body, status=status, mimetype='application/json')
+    if request.method not in ('GET', 'HEAD'):
+        # e.g. POST /products/batch: the result depends on the body
+        response.headers['Cache-Control'] = 'no-store'
+    elif status == 200:
+        response.add_etag()
+        response.headers['Cache-Control'] = 'public, max-age=60'
+        response = response.make_conditional(request)
+    return response
+
+
+@api.errorhandler(ApiError)
+def handle_api_error(error):
+    return _json_response({'error': error.message}, error.status)
+
+
+@api.errorhandler(404)
+def handle_not_found(error):
+    return _json_response({'error': 'Not found'}, 404)
+
+
+def _encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return int(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise ApiError(400, 'Invalid cursor')
+
+
+def _limit(default: int = DEFAULT_LIMIT, maximum: int = MAX_LIMIT) -> int:
+    limit = request.args.get('limit', default, type=int)
+    if not 1 <= limit <= maximum:
+        raise ApiError(400, f'limit must be between 1 and {maximum}')
+    return limit
+
+
+def _fields(columns: dict, computed: tuple, default: tuple) -> list:
+    """Requested field names, validated against the resource's columns and computed fields"""
+    raw = request.args.get('fields')
+    if not raw:
+        return list(default)
+    fields = [f.strip() for f in raw.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in columns and f not in computed]
+    if unknown:
+        allowed = ', '.join(sorted(list(columns) + list(computed)))
+        raise ApiError(400, f"Unknown field(s): {', '.join(unknown)}. Allowed: {allowed}")
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+    return fields
+
+
+def _page(stmt, id_column, columns: dict, fields: list, single: bool = False):
+    """Run `stmt` with only the requested columns; returns (rows, next_cursor)"""
+    stmt = stmt.with_only_columns(*(columns[f].label(f) for f in fields if f in columns))
+    if single:
+        return db.session.execute(stmt.limit(1)).mappings().all(), None
+
+    limit = _limit()
+    cursor = request.args.get('cursor')
+    if cursor:
+        stmt = stmt.where(id_column > _decode_cursor(cursor))
+    rows = db.session.execute(stmt.order_by(id_column).limit(limit + 1)).mappings().all()
+    next_cursor = _encode_cursor(rows[limit - 1]['id']) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def _upload_url(filename):
+    return url_for('static', filename='uploads/' + filename, _external=True) if filename else None
+
+
+def _listing(items, next_cursor):
+    return _json_response({'data': items, 'next_cursor': next_cursor})
+
+
+# ---- Categories ------------------------------------------------------------
+
+CATEGORY_COLUMNS = {
+    'id': Category.id,
+    'name': Category.name,
+    'description': Category.description,
+    'image': Category.image,
+    'updated_at': Category.updated_at,
+}
+CATEGORY_COMPUTED = ('product_count', 'url')
+CATEGORY_DEFAULT = ('id', 'name', 'description', 'image', 'product_count', 'url')
+
+
+def _categories(category_id=None):
+    fields = _fields(CATEGORY_COLUMNS, CATEGORY_COMPUTED, CATEGORY_DEFAULT)
+    stmt = select(Category.id)
+    if category_id is not None:
+        stmt = stmt.where(Category.id == category_id)
+    rows, next_cursor = _page(stmt, Category.id, CATEGORY_COLUMNS, fields, single=category_id is not None)
+    return _category_items(rows, fields), next_cursor
+
+
+def _category_items(rows, fields) -> list:
+    counts = {}
+    if 'product_count' in fields:
+        from .stats import site_stats
+        counts = site_stats.snapshot()['products_per_category']
+
+    items = []
+    for row in rows:
+        item = dict(row)
+        if 'image' in item:
+            item['image'] = _upload_url(item['image'])
+        if 'product_count' in fields:
+            item['product_count'] = counts.get(row['id'], 0)
+        if 'url' in fields:
+            item['url'] = url_for('views.category_products', category_id=row['id'], _external=True)
+        items.append(item)
+    return items
+
+
+@api.route('/categories')
+def list_categories():
+    return _listing(*_categories())
+
+
+@api.route('/categories/<int:category_id>')
+def get_category(category_id):
+    items, _ = _categories(category_id)
+    if not items:
+        raise ApiError(404, 'Category not found')
+    return _json_response({'data': items[0]})
+
+
+# ---- Products --------------------------------------------------------------
+
+PRODUCT_COLUMNS = {
+    'id': Product.id,
+    'name': Product.name,
+    'description': Product.description,
+    'price': Product.price,
+    'category_id': Product.category_id,
+    'category': Category.name,
+    'created_at': Product.created_at,
+    'updated_at': Product.updated_at,
+}
+PRODUCT_COMPUTED = ('images', 'url')
+PRODUCT_DEFAULT = ('id', 'name', 'description', 'price', 'category_id', 'category', 'images', 'url')
+
+
+def product_images(product_ids) -> dict:
+    """Image URLs per product id from one query, in upload order"""
+    images = {product_id: [] for product_id in product_ids}
+    if product_ids:
+        for product_id, filename in db.session.execute(
+            select(ProductImage.product_id, ProductImage.image)
+            .where(ProductImage.product_id.in_(product_ids))
+            .order_by(ProductImage.product_id, ProductImage.id)
+        ):
+            images[product_id].append(_upload_url(filename))
+    return images
+
+
+def serialize_products(rows, fields) -> list:
+    """Turn projection rows into API items, adding the computed fields"""
+    images = product_images([row['id'] for row in rows]) if 'images' in fields else {}
+    items = []
+    for row in rows:
+        item = dict(row)
+        if 'images' in fields:
+            item['images'] = images.get(row['id'], [])
+        if 'url' in fields:
+            item['url'] = url_for('views.product_single', product_id=row['id'], _external=True)
+        items.append(item)
+    return items
+
+
+def product_select(fields):
+    """Base product statement, joining categories only when their name is requested"""
+    stmt = select(Product.id)
+    if 'category' in fields:
+        stmt = stmt.join(Category, Product.category_id == Category.id)
+    return stmt
+
+
+def _products(product_id=None):
+    fields = _fields(PRODUCT_COLUMNS, PRODUCT_COMPUTED, PRODUCT_DEFAULT)
+    stmt = product_select(fields)
+    if product_id is not None:
+        stmt = stmt.where(Product.id == product_id)
+
+    category_id = request.args.get('category', type=int)
+    if category_id:
+        stmt = stmt.where(Product.category_id == category_id)
+    since = request.args.get('updated_since')
+    if since:
+        from .exporter import parse_since
+        try:
+            stmt = stmt.where(Product.updated_at > parse_since(since))
+        except ValueError as e:
+            raise ApiError(400, str(e))
+
+    rows, next_cursor = _page(stmt, Product.id, PRODUCT_COLUMNS, fields, single=product_id is not None)
+    return serialize_products(rows, fields), next_cursor
+
+
+@api.route('/products')
+def list_products():
+    return _listing(*_products())
+
+
+@api.route('/products/batch', methods=['GET', 'POST'])
+def batch_products():
+    """
+    Many products in one round trip: ?ids=3,1,2 or a POSTed {"ids": [...]}
+
+    One IN query plus one image query, whatever the number of ids. Items
+    come back in request order and unknown ids are listed under "missing".
+    """
+    if request.method == 'POST':
+        raw_ids = (request.get_json(silent=True) or {}).get('ids')
+        if not isinstance(raw_ids, list):
+            raise ApiError(400, 'POST a JSON object like {"ids": [1, 2, 3]}')
+    else:
+        raw_ids = [v for v in request.args.get('ids', '').split(',') if v.strip()]
+
+    try:
+        ids = list(dict.fromkeys(int(v) for v in raw_ids))
+    except (TypeError, ValueError):
+        raise ApiError(400, 'ids must be integers')
+    if not ids:
+        raise ApiError(400, 'Pass at least one product id')
+    max_ids = current_app.config.get('API_BATCH_MAX', 100)
+    if len(ids) > max_ids:
+        raise ApiError(400, f'At most {max_ids} ids per request')
+
+    fields = _fields(PRODUCT_COLUMNS, PRODUCT_COMPUTED, PRODUCT_DEFAULT)
+    stmt = product_select(fields).where(Product.id.in_(ids))
+    stmt = stmt.with_only_columns(*(PRODUCT_COLUMNS[f].label(f) for f in fields if f in PRODUCT_COLUMNS))
+    rows = db.session.execute(stmt).mappings().all()
+
+    by_id = {item['id']: item for item in serialize_products(rows, fields)}
+    return _json_response({
+        'data': [by_id[i] for i in ids if i in by_id],
+        'missing': [i for i in ids if i not in by_id],
+    })
+
+
+@api.route('/products/<int:product_id>')
+def get_product(product_id):
+    items, _ = _products(product_id)
+    if not items:
+        raise ApiError(404, 'Product not found')
+    return _json_response({'data': items[0]})
+
+
+# ---- Jobs ------------------------------------------------------------------
+
+JOB_COLUMNS = {
+    'id': JobPosting.id,
+    'title': JobPosting.title,
+    'description': JobPosting.description,
+    'qualifications': JobPosting.qualifications,
+    'deadline': JobPosting.deadline,
+    'application_email': JobPosting.application_email,
+    'created_at': JobPosting.created_at,
+}
+JOB_COMPUTED = ('url',)
+JOB_DEFAULT = ('id', 'title', 'description', 'qualifications', 'deadline', 'application_email', 'url')
+
+
+def _jobs(job_id=None):
+    fields = _fields(JOB_COLUMNS, JOB_COMPUTED, JOB_DEFAULT)
+    stmt = _open_jobs()
+    if job_id is not None:
+        stmt = stmt.where(JobPosting.id == job_id)
+    rows, next_cursor = _page(stmt, JobPosting.id, JOB_COLUMNS, fields, single=job_id is not None)
+    return _job_items(rows, fields), next_cursor
+
+
+def _open_jobs():
+    # Same rule as the careers page: active and still accepting applications
+    return select(JobPosting.id).where(
+        JobPosting.is_active == True,
+        JobPosting.deadline >= datetime.utcnow().date()
+    )
+
+
+def _job_items(rows, fields) -> list:
+    items = []
+    for row in rows:
+        item = dict(row)
+        if 'url' in fields:
+            item['url'] = url_for('views.career_detail', job_id=row['id'], _external=True)
+        items.append(item)
+    return items
+
+
+@api.route('/jobs')
+def list_jobs():
+    return _listing(*_jobs())
+
+
+@api.route('/jobs/<int:job_id>')
+def get_job(job_id):
+    items, _ = _jobs(job_id)
+    if not items:
+        raise ApiError(404, 'Job posting not found')
+    return _json_response({'data': items[0]})
+
+
+# ---- Changes ---------------------------------------------------------------
+
+DEFAULT_CHANGES = 500
+MAX_CHANGES = 1000
+
+# Fields sent for an upserted object, and its response key, per logged entity
+CHANGE_FIELDS = {
+    'product': PRODUCT_DEFAULT + ('updated_at',),
+    'category': CATEGORY_DEFAULT + ('updated_at',),
+    'job': JOB_DEFAULT,
+}
+CHANGE_KEYS = {'product': 'products', 'category': 'categories', 'job': 'jobs'}
+
+
+def _current(entity: str, ids: list) -> list:
+    """Sync payloads of the given ids that still exist (and are public)"""
+    fields = CHANGE_FIELDS[entity]
+    if entity == 'product':
+        stmt, columns, id_column = product_select(fields), PRODUCT_COLUMNS, Product.id
+    elif entity == 'category':
+        stmt, columns, id_column = select(Category.id), CATEGORY_COLUMNS, Category.id
+    else:
+        stmt, columns, id_column = _open_jobs(), JOB_COLUMNS, JobPosting.id
+    stmt = stmt.where(id_column.in_(ids)).order_by(id_column)
+    rows = db.session.execute(
+        stmt.with_only_columns(*(columns[f].label(f) for f in fields if f in columns))
+    ).mappings().all()
+    if entity == 'product':
+        return serialize_products(rows, fields)
+    if entity == 'category':
+        return _category_items(rows, fields)
+    return _job_items(rows, fields)
+
+
+@api.route('/changes')
+def list_changes():
+    """
+    Catalog changes after `since` (a cursor from an earlier response)
+
+    Each object appears once: under "upserts" with its current fields if it
+    still exists, under "deletes" as a bare id if it is gone (a closed job
+    posting counts as gone). Without `since` the whole log is read, which
+    starts with an upsert of every live object, so it is a full sync. Keep
+    the returned cursor and ask again while has_more is true. "reset" means
+    the cursor is older than the retained log: drop the local copy and
+    continue from the returned cursor, which starts a full sync.
+    """
+    since = request.args.get('since')
+    since = _decode_cursor(since) if since else 0
+    if since < 0:
+        raise ApiError(400, 'Invalid cursor')
+    limit = _limit(DEFAULT_CHANGES, MAX_CHANGES)
+
+    from .changelog import changelog
+    changes, last_id, has_more, reset = changelog.read(since, limit)
+
+    touched = {}
+    for entity, entity_id in changes:
+        touched.setdefault(entity, []).append(entity_id)
+
+    upserts, deletes = {}, {}
+    for entity, ids in touched.items():
+        if entity not in CHANGE_FIELDS:
+            continue
+        # Load by id rather than trusting the logged action: an object
+        # deleted and re-created, or closed, is reported as it is now
+        items = _current(entity, ids)
+        found = {item['id'] for item in items}
+        if items:
+            upserts[CHANGE_KEYS[entity]] = items
+        gone = sorted(i for i in ids if i not in found)
+        if gone:
+            deletes[CHANGE_KEYS[entity]] = gone
+
+    return _json_response({
+        'upserts': upserts,
+        'deletes': deletes,
+        'cursor': _encode_cursor(last_id),
+        'has_more': has_more,
+        'reset': reset,
+    })
@@ -1,7 +1,8 @@
 from flask import Blueprint, render_template, request, flash, redirect, url_for
 from .models import User
-from werkzeug.security import generate_password_hash, check_password_hash
 from . import db
+from .user_cache import user_cache
+from .passwords import password_hasher, PasswordCheckBusy
 from flask_login import login_user, login_required, logout_user, current_user
 
 auth = Blueprint('auth', __name__)
@@ -14,7 +15,26 @@ def login():
         
         user = User.query.filter_by(email=email).first()
         if user:
-            if check_password_hash(user.password, password):
+            try:
+                password_ok = password_hasher.verify(user.password, password,
+                                                     ip=request.remote_addr, account=email)
+            except PasswordCheckBusy:
+                flash('Too many login attempts right now, please try again in a moment.', category='error')
+                return render_template("login.html", user=current_user), 429
+            
+            if password_ok:
+                # Upgrade hashes made with an older method or cost; when the
+                # hasher is busy this waits for the next login
+                if password_hasher.needs_rehash(user.password):
+                    try:
+                        user.password = password_hasher.hash(password)
+                    except PasswordCheckBusy:
+                        pass
+                    else:
+                        db.session.commit()
+                        password_hasher.rehashed += 1
+                        user_cache.invalidate(user.id)
+                
                 flash('Logged in successfully!', category='success')
                 login_user(user, remember=True)
                 return redirect(url_for('views.dashboard'))
@@ -57,14 +77,20 @@ def sign_up():
         elif len(password1) < 7:
             flash('Password must be at least 7 characters.', category='error')
         else:
+            try:
+                password_hash = password_hasher.hash(password1)
+            except PasswordCheckBusy:
+                flash('Too many password checks right now, please try again in a moment.', category='error')
+                return render_template("sign_up.html", user=current_user), 429
             new_user = User(
                 email=email, 
                 username=username, 
-                password=generate_password_hash(password1, method='pbkdf2:sha256'),
+                password=password_hash,
                 is_admin=is_admin
             )
             db.session.add(new_user)
             db.session.commit()
+            user_cache.invalidate(new_user.id)
             flash('User created successfully!', category='success')
             return redirect(url_for('views.manage_users'))
     
@@ -0,0 +1,504 @@
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+import click
+
+
+def _percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+BENCH_PASSWORD = 'bench-password'
+
+
+def _scratch_app(categories=5, products_per_category=40, users=8, **config):
+    """
+    App bound to a throwaway SQLite database with a small seeded catalog
+
+    Benchmarks never touch the live database; the caller deletes the
+    returned directory when done. Keyword arguments override app config.
+    """
+    from . import create_app, db
+    from .models import Category, Product, User
+    from .passwords import password_hasher
+    from .provisioning import provision
+
+    workdir = tempfile.mkdtemp(prefix='stumarcot-bench-')
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        'UPLOAD_FOLDER': os.path.join(workdir, 'uploads'),
+        'SESSION_COOKIE_DOMAIN': None,
+        'SESSION_COOKIE_SECURE': False,
+        **config,
+    }, instance_path=os.path.join(workdir, 'instance'))
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    provision(app)
+
+    with app.app_context():
+        admin = User.query.filter_by(email='admin@admin.com').first()
+        for c in range(categories):
+            category = Category(name=f'Bench category {c}')
+            db.session.add(category)
+            db.session.flush()
+            db.session.add_all(
+                Product(name=f'Bench product {c}-{p}', description='Benchmark product',
+                        price=1000 + p, category_id=category.id, user_id=admin.id)
+                for p in range(products_per_category)
+            )
+        # One hash shared by every bench account; logging in verifies it anyway
+        pwhash = password_hasher.hash(BENCH_PASSWORD)
+        db.session.add_all(
+            User(email=f'bench{u}@example.com', username=f'bench{u}', password=pwhash)
+            for u in range(users)
+        )
+        db.session.commit()
+    return app, workdir
+
+
+def _catalog_load(app, stop, latencies, path='/products'):
+    client = app.test_client()
+    while not stop.is_set():
+        started = time.perf_counter()
+        client.get(path)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+
+def _login_load(app, stop, counts, email, password, ip):
+    client = app.test_client()
+    while not stop.is_set():
+        response = client.post('/login', data={'email': email, 'password': password},
+                               environ_base={'REMOTE_ADDR': ip})
+        if response.status_code == 429:
+            counts['busy'] += 1
+            time.sleep(0.05)  # a real client backs off too
+        else:
+            counts['ok' if response.status_code == 302 else 'other'] += 1
+            client.get('/logout')
+
+
+def _run_phase(app, seconds, catalog_threads, login_threads, ips):
+    stop = threading.Event()
+    latencies = []
+    counts = {'ok': 0, 'busy': 0, 'other': 0}
+    threads = [threading.Thread(target=_catalog_load, args=(app, stop, latencies))
+               for _ in range(catalog_threads)]
+    threads += [threading.Thread(target=_login_load,
+                                 args=(app, stop, counts, f'bench{i}@example.com', BENCH_PASSWORD,
+                                       f'10.0.0.{i % ips + 1}'))
+                for i in range(login_threads)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return latencies, counts
+
+
+@click.group('bench')
+def bench_group():
+    """Run performance benchmarks against a scratch database."""
+
+
+@bench_group.command('login')
+@click.option('--seconds', default=5.0, show_default=True, help='Duration of each phase.')
+@click.option('--catalog-threads', default=4, show_default=True, help='Concurrent catalog readers.')
+@click.option('--login-threads', default=8, show_default=True, help='Concurrent login attempts.')
+@click.option('--ips', default=4, show_default=True, help='Distinct client IPs the logins come from.')
+def bench_login_command(seconds, catalog_threads, login_threads, ips):
+    """Login throughput and catalog latency with and without a login burst."""
+    import shutil
+    from .passwords import password_hasher
+
+    app, workdir = _scratch_app(users=login_threads)
+    try:
+        baseline, _ = _run_phase(app, seconds, catalog_threads, 0, ips)
+        mixed, counts = _run_phase(app, seconds, catalog_threads, login_threads, ips)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    cores = min(password_hasher.max_workers, os.cpu_count() or 1)
+    logins_per_sec = counts['ok'] / seconds
+    click.echo(f'hash method:        {password_hasher.method} ({password_hasher.max_workers} hashing threads)')
+    click.echo(f'logins/sec:         {logins_per_sec:8.1f} ({logins_per_sec / cores:.1f} per hashing core)')
+    click.echo(f'logins refused:     {counts["busy"]:8d} (429, concurrency cap)')
+    for label, samples in (('catalog only', baseline), ('catalog + logins', mixed)):
+        mean = statistics.fmean(samples) if samples else 0.0
+        click.echo(f'{label + ":":19} {len(samples) / seconds:8.1f} req/s  '
+                   f'mean {mean:6.1f} ms  p50 {_percentile(samples, 50):6.1f} ms  '
+                   f'p95 {_percentile(samples, 95):6.1f} ms')
+
+
+@bench_group.command('bulk')
+@click.option('--products', default=500, show_default=True, help='Products selected for each bulk action.')
+def bench_bulk_command(products):
+    """Time each bulk admin action on N selected products."""
+    import io
+    import shutil
+    from .models import Category, Product
+
+    app, workdir = _scratch_app(categories=2, products_per_category=products)
+    try:
+        with app.app_context():
+            target = Category.query.order_by(Category.id).first()
+            ids = [str(pid) for pid, in Product.query.with_entities(Product.id)
+                   .filter(Product.category_id != target.id).limit(products)]
+
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = '1'
+            session['_fresh'] = True
+
+        # A minimal valid GIF; the image is stored once and shared by every row
+        gif = b'GIF89a\x01\x00\x01\x00\x00\x00\x00;'
+        actions = [
+            ('move', {'category_id': str(target.id)}),
+            ('price', {'percent': '10'}),
+            ('image', {'image': (io.BytesIO(gif), 'bench.gif')}),
+            ('delete', {}),
+        ]
+        click.echo(f'{len(ids)} products per action')
+        for action, extra in actions:
+            data = dict(extra, action=action, product_ids=ids)
+            started = time.perf_counter()
+            response = client.post('/manage-products/bulk', data=data, content_type='multipart/form-data')
+            elapsed = (time.perf_counter() - started) * 1000
+            click.echo(f'  {action:8} {elapsed:8.1f} ms  (HTTP {response.status_code})')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _seed_products(app, count, description='Benchmark product ' * 10):
+    """Add `count` products (one image each) to a fresh category; returns its id"""
+    from sqlalchemy import insert
+    from . import db
+    from .models import Category, Product, ProductImage
+
+    with app.app_context():
+        category = Category(name=f'Stream category {count}')
+        db.session.add(category)
+        db.session.flush()
+        first_id = (db.session.query(db.func.max(Product.id)).scalar() or 0) + 1
+        db.session.execute(insert(Product), [
+            {'name': f'Stream product {i}', 'description': description,
+             'price': 1000, 'category_id': category.id, 'user_id': 1}
+            for i in range(count)
+        ])
+        db.session.execute(insert(ProductImage), [
+            {'product_id': product_id, 'image': f'stream-{product_id}.jpg'}
+            for product_id in range(first_id, first_id + count)
+        ])
+        db.session.commit()
+        return category.id
+
+
+def _peak_kib(func):
+    import tracemalloc
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+@bench_group.command('stream')
+@click.option('--rows', default=200, show_default=True, help='Products in the small catalog.')
+@click.option('--scale', default=100, show_default=True, help='How many times larger the big catalog is.')
+@click.option('--max-growth', default=2.0, show_default=True,
+              help='Fail if a streamed page\'s peak grows more than this factor.')
+def bench_stream_command(rows, scale, max_growth):
+    """Peak memory of the streamed pages as the catalog grows.
+
+    Exits non-zero when a streamed page's peak memory on the big catalog
+    exceeds --max-growth times its peak on the small one, so it can guard
+    against regressions in CI.
+    """
+    import shutil
+    from datetime import datetime
+    from flask import render_template
+    from .models import Category, Product
+
+    # The response cache would keep a copy of each body; measure the stream alone
+    app, workdir = _scratch_app(categories=0, users=0, RESPONSE_CACHE_TTL=0)
+    try:
+        client = app.test_client()
+        results = []
+        for count in (rows, rows * scale):
+            category_id = _seed_products(app, count - sum(r[0] for r in results))
+            paths = ('/sitemap.xml', '/sitemap_products.xml', f'/category/{category_id}')
+
+            def consume(path):
+                response = client.get(path, buffered=False)
+                size = sum(len(chunk) for chunk in response.response)
+                response.close()
+                return size
+
+            def buffered():
+                with app.test_request_context('/sitemap.xml'):
+                    render_template('sitemap.xml', categories=Category.query.all(), products=Product.query.all(),
+                                    jobs=[], current_time=datetime.utcnow(), moment=datetime.utcnow())
+
+            peaks = {path: _peak_kib(lambda path=path: consume(path)) for path in paths}
+            peaks['buffered sitemap'] = _peak_kib(buffered)
+            results.append((count, peaks))
+
+        (small, small_peaks), (large, large_peaks) = results
+        click.echo(f'{"":24} {small:>9} rows {large:>9} rows   growth')
+        failed = []
+        for (name, low), high in zip(small_peaks.items(), large_peaks.values()):
+            label = name if not name.startswith('/category/') else '/category/<id>'
+            click.echo(f'{label:24} {low:9.0f} KiB {high:9.0f} KiB  {high / low:6.1f}x')
+            # The buffered render is the reference: it is meant to grow
+            if name.startswith('/') and high > low * max_growth:
+                failed.append(f'{label} ({high / low:.1f}x)')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if failed:
+        raise click.ClickException(
+            f'Peak memory grew more than {max_growth}x with {scale}x the rows: {", ".join(failed)}')
+    click.echo(f'✓ Streamed pages stay within {max_growth}x peak memory at {scale}x the rows.')
+
+
+@bench_group.command('listing')
+@click.option('--products', default=2000, show_default=True, help='Products in the benchmark category.')
+@click.option('--description-size', default=4000, show_default=True, help='Characters of description per product.')
+@click.option('--repeat', default=30, show_default=True, help='Renders per measurement.')
+def bench_listing_command(products, description_size, repeat):
+    """Memory and render time of product cards: ORM objects vs read models."""
+    import shutil
+    from flask import render_template
+    from sqlalchemy import select
+    from sqlalchemy.orm import selectinload
+    from . import db
+    from .models import Product
+    from .read_models import card_select, product_cards
+
+    app, workdir = _scratch_app(categories=0, users=0)
+    try:
+        category_id = _seed_products(app, products, description='x' * description_size)
+
+        def orm(limit):
+            # The previous listing query (images preloaded, the better case)
+            return db.session.scalars(
+                select(Product).where(Product.category_id == category_id)
+                .options(selectinload(Product.images)).order_by(Product.id).limit(limit)
+            ).all()
+
+        def cards(limit):
+            return product_cards(
+                card_select().where(Product.category_id == category_id).order_by(Product.id).limit(limit)
+            )
+
+        def render(load, limit):
+            try:
+                return render_template('_product_cards.html', products=load(limit))
+            finally:
+                db.session.remove()
+
+        click.echo(f'{"cards per page":16} {"":12} {"peak KiB":>10} {"median ms":>10} {"p95 ms":>8}')
+        with app.test_request_context('/'):
+            for limit in (4, 24, min(500, products)):
+                results = {}
+                for label, load in (('ORM objects', orm), ('read models', cards)):
+                    assert render(load, limit)  # warm up the template and statement caches
+                    peak = _peak_kib(lambda: render(load, limit))
+                    timings = []
+                    for _ in range(repeat):
+                        started = time.perf_counter()
+                        render(load, limit)
+                        timings.append((time.perf_counter() - started) * 1000)
+                    results[label] = peak
+                    click.echo(f'{limit:<16} {label:12} {peak:10.0f} '
+                               f'{statistics.median(timings):10.2f} {_percentile(timings, 95):8.2f}')
+                click.echo(f'{"":16} {"":12} {results["ORM objects"] / results["read models"]:9.1f}x less memory')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _shared_cache_worker(path, seconds, keys, value_size, write_ratio, seed, counter_increments, results):
+    """One benchmark process: random get/set/cas traffic, then counter increments"""
+    import random
+    from .shared_cache import SharedCache
+
+    cache = SharedCache(path=path)
+    rng = random.Random(seed)
+    value = b'x' * value_size
+    latencies = {'get': [], 'set': [], 'cas': []}
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        key = f'bench:{rng.randrange(keys)}'
+        roll = rng.random()
+        started = time.perf_counter()
+        if roll < write_ratio / 2:
+            kind = 'set'
+            cache.set(key, value, ttl=600)
+        elif roll < write_ratio:
+            # Read-modify-write: the version read is part of the cost
+            kind = 'cas'
+            _, version = cache.get_versioned(key)
+            cache.cas(key, value, version, ttl=600)
+        else:
+            kind = 'get'
+            cache.get(key)
+        latencies[kind].append((time.perf_counter() - started) * 1e6)
+    for _ in range(counter_increments):
+        cache.incr('bench:counter')
+    results.put((latencies, cache.conflicts, cache.errors))
+
+
+@bench_group.command('shared-cache')
+@click.option('--processes', default='1,2,4,8', show_default=True, help='Comma-separated process counts to run.')
+@click.option('--seconds', default=2.0, show_default=True, help='Duration of each run.')
+@click.option('--keys', default=1000, show_default=True, help='Distinct keys.')
+@click.option('--value-size', default=4096, show_default=True, help='Bytes per value.')
+@click.option('--write-ratio', default=0.1, show_default=True, help='Share of operations that write (half set, half cas).')
+def bench_shared_cache_command(processes, seconds, keys, value_size, write_ratio):
+    """Get/set/cas latency of the shared cache with N processes hammering it."""
+    import multiprocessing
+    import shutil
+    from .shared_cache import SharedCache
+
+    workdir = tempfile.mkdtemp(prefix='stumarcot-bench-')
+    path = os.path.join(workdir, 'shared_cache.sqlite3')
+    # Independent interpreters, like gunicorn workers
+    context = multiprocessing.get_context('spawn')
+    increments = 200
+    try:
+        cache = SharedCache(path=path)
+        for i in range(keys):
+            cache.set(f'bench:{i}', b'x' * value_size, ttl=600)
+
+        click.echo(f'{"procs":>5} {"ops/s":>9} {"get p50/p99 us":>16} {"set p50/p99 us":>16} '
+                   f'{"cas p50/p99 us":>16} {"cas lost":>8} {"errors":>6}  counter')
+        for count in (int(n) for n in processes.split(',')):
+            cache.delete('bench:counter')
+            results = context.Queue()
+            workers = [
+                context.Process(target=_shared_cache_worker,
+                                args=(path, seconds, keys, value_size, write_ratio, seed, increments, results))
+                for seed in range(count)
+            ]
+            for worker in workers:
+                worker.start()
+            merged = {'get': [], 'set': [], 'cas': []}
+            conflicts = errors = 0
+            for _ in workers:
+                latencies, lost, failed = results.get()
+                for kind, samples in latencies.items():
+                    merged[kind].extend(samples)
+                conflicts += lost
+                errors += failed
+            for worker in workers:
+                worker.join()
+
+            ops = sum(len(samples) for samples in merged.values())
+            cells = ' '.join(
+                f'{_percentile(merged[kind], 50):7.0f}/{_percentile(merged[kind], 99):<8.0f}' for kind in ('get', 'set', 'cas')
+            )
+            counter = cache.get('bench:counter')
+            status = 'ok' if counter == count * increments else f'LOST {count * increments - (counter or 0)}'
+            click.echo(f'{count:5} {ops / seconds:9.0f} {cells} {conflicts:8} {errors:6}  {counter} {status}')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+@bench_group.command('catalog')
+@click.option('--products', default=2000, show_default=True, help='Products in the benchmark category.')
+@click.option('--requests', 'count', default=200, show_default=True, help='Requests per page and mode.')
+def bench_catalog_command(products, count):
+    """Snapshot build cost and page latency with and without the catalog snapshot."""
+    import shutil
+    from .catalog import _deep_size, catalog
+
+    # Pages are rendered every time: no response cache in front of them
+    app, workdir = _scratch_app(categories=0, users=0, RESPONSE_CACHE_TTL=0)
+    try:
+        category_id = _seed_products(app, products)
+        with app.app_context():
+            from . import seo
+            seo.backfill()  # as provisioning does: listings read the stored JSON-LD
+            snapshot = catalog.build(0)
+            click.echo(f'snapshot: {len(snapshot.products)} products built in {snapshot.build_ms:.1f} ms, '
+                       f'about {_deep_size(snapshot) / 1024:.0f} KiB')
+            product_id = snapshot.products[len(snapshot.products) // 2].id
+
+        client = app.test_client()
+        paths = ('/', f'/products?category={category_id}', f'/category/{category_id}',
+                 f'/product-single/{product_id}', '/sitemap_categories.xml')
+        click.echo(f'{"":34} {"SQL p50/p95 ms":>16} {"snapshot p50/p95 ms":>20}')
+        for path in paths:
+            cells = []
+            for enabled in (False, True):
+                catalog.enabled = enabled
+                client.get(path).close()
+                timings = []
+                for _ in range(count):
+                    started = time.perf_counter()
+                    client.get(path).close()
+                    timings.append((time.perf_counter() - started) * 1000)
+                cells.append(f'{statistics.median(timings):7.2f}/{_percentile(timings, 95):<7.2f}')
+            click.echo(f'{path:34} {cells[0]:>16} {cells[1]:>20}')
+    finally:
+        catalog.enabled = True
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+@bench_group.command('templates')
+@click.option('--requests', 'count', default=50, show_default=True, help='Renders per page.')
+@click.option('--top', default=15, show_default=True, help='Number of templates to list.')
+def bench_templates_command(count, top):
+    """Per-template compile and render cost; cold template loads with and without bytecode."""
+    import shutil
+    from .template_cache import template_cache
+
+    app, workdir = _scratch_app(RESPONSE_CACHE_TTL=0)
+    try:
+        env = app.jinja_env
+        names = env.list_templates()
+        results = template_cache.compile_all(app)
+
+        # A fresh worker: nothing in the environment's in-memory cache
+        cold = {}
+        for label, bytecode_cache in (('from source', None), ('from bytecode', template_cache.bytecode_cache)):
+            env.bytecode_cache = bytecode_cache
+            env.cache.clear()
+            started = time.perf_counter()
+            for name in names:
+                env.get_template(name)
+            cold[label] = (time.perf_counter() - started) * 1000
+        env.bytecode_cache = template_cache.bytecode_cache
+        click.echo(f'loading all {len(names)} templates in a fresh worker: '
+                   + ', '.join(f'{label} {ms:.0f} ms' for label, ms in cold.items()))
+
+        with app.app_context():
+            from .models import Category, Product, JobPosting
+            category_id = Category.query.first().id
+            product_id = Product.query.first().id
+            job_id = JobPosting.query.first().id
+        client = app.test_client()
+        paths = ('/', '/products', '/categories', f'/category/{category_id}', f'/product-single/{product_id}',
+                 '/careers', f'/careers/{job_id}', '/about', '/contact', '/sitemap.xml')
+        for path in paths:
+            for _ in range(count):
+                response = client.get(path)
+                response.get_data()  # streamed pages render while being read
+                response.close()
+
+        renders = {name: (avg_ms, max_ms) for name, _, avg_ms, max_ms in template_cache.render_timings()}
+        click.echo(f'{"template":40} {"compile ms":>10} {"bytecode ms":>11} {"render avg/max ms":>18}')
+        # The slowest to compile, plus every template the pages rendered
+        rows = results[:top] + [r for r in results[top:] if r[0] in renders]
+        for name, compile_ms, load_ms, _ in rows:
+            render = renders.get(name)
+            cell = f'{render[0]:.2f}/{render[1]:.2f}' if render else '-'
+            click.echo(f'{name:40} {compile_ms:10.1f} {load_ms:11.2f} {cell:>18}')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,408 @@
+"""
+Immutable in-memory snapshot of the public catalog
+
+The public pages (home, product listings, category pages, product pages
+and the sitemaps) only ever read categories, products and their images,
+and the whole catalog is small. Instead of querying SQLite on each of
+those requests, every worker holds a CatalogSnapshot built from three
+bulk queries, with id indexes and per-category arrays, and answers from it.
+
+A snapshot is never modified. A catalog write in any worker (or a CLI
+command) bumps a generation number in the shared cache; on its next read
+each worker sees the new number, builds a new snapshot and publishes it
+by swapping one reference. Requests that already hold the previous
+snapshot finish with it. Beyond CATALOG_SNAPSHOT_MAX_PRODUCTS, or with
+CATALOG_SNAPSHOT off, the same methods answer with SQL instead.
+"""
+
+import logging
+import random
+import sys
+import threading
+import time
+from bisect import bisect_right
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+
+from flask import g, has_app_context
+from flask_sqlalchemy.pagination import Pagination
+from sqlalchemy import func, select
+
+from . import db
+from .models import Category, Product, ProductImage, User
+from .read_models import CategoryRef, ImageRef, card_select, paginate_cards, product_cards
+from .shared_cache import shared_cache
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = 'catalog:generation'
+
+
+@dataclass(frozen=True, slots=True)
+class CategoryEntry:
+    id: int
+    name: str
+    description: Optional[str]
+    image: Optional[str]
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+
+
+@dataclass(frozen=True, slots=True)
+class UserRef:
+    username: str
+
+
+@dataclass(frozen=True, slots=True)
+class ProductEntry:
+    """Everything the public pages show of a product, images in upload order"""
+    id: int
+    name: str
+    description: Optional[str]
+    price: float
+    category_id: int
+    category: Optional[CategoryRef]
+    user: Optional[UserRef]
+    images: Tuple[ImageRef, ...]
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+    structured_data: Optional[str]
+    list_item_data: Optional[str]
+    meta_keywords: Optional[str]
+
+
+class CatalogSnapshot:
+    """One consistent, read-only copy of the catalog"""
+
+    __slots__ = ('generation', 'categories', 'products', '_categories_by_id', '_products_by_id',
+                 '_by_category', '_ids_by_category', 'built_at', 'build_ms', 'size_bytes')
+
+    def __init__(self, generation: int, categories: Sequence[CategoryEntry], products: Sequence[ProductEntry]):
+        self.generation = generation
+        self.categories = tuple(categories)
+        self.products = tuple(products)
+        self._categories_by_id = {c.id: c for c in self.categories}
+        self._products_by_id = {p.id: p for p in self.products}
+        by_category = defaultdict(list)
+        for product in self.products:
+            by_category[product.category_id].append(product)
+        self._by_category = {category_id: tuple(items) for category_id, items in by_category.items()}
+        self._ids_by_category = {
+            category_id: tuple(p.id for p in items) for category_id, items in self._by_category.items()
+        }
+        self.built_at = time.monotonic()
+        self.build_ms = 0.0
+        self.size_bytes = None
+
+    def category(self, category_id: int) -> Optional[CategoryEntry]:
+        return self._categories_by_id.get(category_id)
+
+    def product(self, product_id: int) -> Optional[ProductEntry]:
+        return self._products_by_id.get(product_id)
+
+    def category_products(self, category_id: int) -> Tuple[ProductEntry, ...]:
+        """Products of a category in id order"""
+        return self._by_category.get(category_id, ())
+
+    def category_page(self, category_id: int, after: int, limit: int):
+        products = self.category_products(category_id)
+        start = bisect_right(self._ids_by_category.get(category_id, ()), after)
+        page = products[start:start + limit]
+        next_after = page[-1].id if start + limit < len(products) else None
+        return list(page), next_after
+
+    def category_stats(self) -> List[Tuple[int, str, int]]:
+        """(id, name, product count) of the categories that have products, by id"""
+        return [(c.id, c.name, len(self._by_category[c.id])) for c in self.categories if c.id in self._by_category]
+
+
+def _deep_size(value, seen=None) -> int:
+    """Approximate bytes held by a snapshot (shared strings counted once)"""
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_deep_size(k, seen) + _deep_size(v, seen) for k, v in value.items())
+    elif isinstance(value, (tuple, list)):
+        size += sum(_deep_size(item, seen) for item in value)
+    elif hasattr(value, '__slots__') and not isinstance(value, (str, bytes)):
+        size += sum(_deep_size(getattr(value, name), seen) for name in value.__slots__ if hasattr(value, name))
+    return size
+
+
+class SequencePagination(Pagination):
+    """Flask-SQLAlchemy's paging over an in-memory sequence"""
+
+    def _query_items(self) -> list:
+        return list(self._query_args['items'][self._query_offset:self._query_offset + self.per_page])
+
+    def _query_count(self) -> int:
+        return len(self._query_args['items'])
+
+
+class Catalog:
+    """
+    The public catalog reads, answered from the current snapshot
+
+    Readers call snapshot() (or the helpers below); it returns the
+    published snapshot while its generation matches the shared one and it
+    is younger than `max_age` seconds, otherwise one thread builds the next
+    while the others wait for it. max_age only bounds how long a change
+    made behind the app's back (a manual SQL edit) can stay invisible.
+    """
+
+    def __init__(self, enabled: bool = True, max_products: int = 20000, max_age: int = 300):
+        self.enabled = enabled
+        self.max_products = max_products
+        self.max_age = max_age
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._oversized: Optional[int] = None
+        self._generation = 0
+        self._build_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.builds = 0
+        self.fallbacks = 0
+
+    def init_app(self, app) -> None:
+        self.enabled = app.config.get('CATALOG_SNAPSHOT', self.enabled)
+        self.max_products = app.config.get('CATALOG_SNAPSHOT_MAX_PRODUCTS', self.max_products)
+        self.max_age = app.config.get('CATALOG_SNAPSHOT_MAX_AGE', self.max_age)
+
+        from .signals import catalog_changed
+        catalog_changed.connect(self._on_catalog_changed, sender=app, weak=False)
+
+        from . import metrics
+        metrics.register('catalog', self.stats)
+
+    # -- snapshot lifecycle -----------------------------------------------
+
+    def _current_generation(self) -> int:
+        if shared_cache.enabled:
+            return shared_cache.get(GENERATION_KEY, 0)
+        return self._generation
+
+    def _fresh(self, snapshot: Optional[CatalogSnapshot], generation: int) -> bool:
+        return (snapshot is not None and snapshot.generation == generation
+                and time.monotonic() - snapshot.built_at < self.max_age)
+
+    def snapshot(self) -> Optional[CatalogSnapshot]:
+        """The current snapshot, or None when reads should go to the database"""
+        if not self.enabled:
+            return None
+        # One snapshot per request: every read of a page sees the same catalog
+        if has_app_context() and '_catalog_snapshot' in g:
+            return g._catalog_snapshot
+        snapshot = self._resolve()
+        if has_app_context():
+            g._catalog_snapshot = snapshot
+        return snapshot
+
+    def _resolve(self) -> Optional[CatalogSnapshot]:
+        generation = self._current_generation()
+        snapshot = self._snapshot
+        if self._fresh(snapshot, generation):
+            with self._lock:
+                self.hits += 1
+            return snapshot
+        if self._oversized == generation:
+            with self._lock:
+                self.fallbacks += 1
+            return None
+
+        with self._build_lock:
+            snapshot = self._snapshot
+            if self._fresh(snapshot, generation):
+                return snapshot
+            snapshot = self.build(generation)
+            if snapshot is None:
+                self._oversized = generation
+                return None
+            # Publish: one reference swap; readers keep whichever they hold
+            self._snapshot = snapshot
+            self._oversized = None
+        return snapshot
+
+    def build(self, generation: int) -> Optional[CatalogSnapshot]:
+        started = time.perf_counter()
+        if db.session.scalar(select(func.count(Product.id))) > self.max_products:
+            logger.info(f"Catalog snapshot skipped: more than {self.max_products} products")
+            return None
+
+        categories = [
+            CategoryEntry(*row) for row in db.session.execute(
+                select(Category.id, Category.name, Category.description, Category.image,
+                       Category.created_at, Category.updated_at).order_by(Category.id)
+            )
+        ]
+        category_refs = {c.id: CategoryRef(c.id, c.name) for c in categories}
+
+        images = defaultdict(list)
+        for product_id, image in db.session.execute(
+                select(ProductImage.product_id, ProductImage.image).order_by(ProductImage.product_id, ProductImage.id)):
+            images[product_id].append(ImageRef(image))
+
+        users = {}
+        products = []
+        for row in db.session.execute(
+                select(Product.id, Product.name, Product.description, Product.price, Product.category_id,
+                       User.username, Product.created_at, Product.updated_at, Product.structured_data,
+                       Product.list_item_data, Product.meta_keywords)
+                .outerjoin(User, User.id == Product.user_id)
+                .order_by(Product.id)):
+            username = row.username
+            if username is not None and username not in users:
+                users[username] = UserRef(username)
+            products.append(ProductEntry(
+                id=row.id,
+                name=row.name,
+                description=row.description,
+                price=row.price,
+                category_id=row.category_id,
+                category=category_refs.get(row.category_id),
+                user=users.get(username),
+                images=tuple(images.get(row.id, ())),
+                created_at=row.created_at,
+                updated_at=row.updated_at,
+                structured_data=row.structured_data,
+                list_item_data=row.list_item_data,
+                meta_keywords=row.meta_keywords,
+            ))
+        snapshot = CatalogSnapshot(generation, categories, products)
+        snapshot.build_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.builds += 1
+        logger.info(f"Built catalog snapshot {generation}: {len(products)} products, "
+                    f"{len(categories)} categories in {snapshot.build_ms:.1f} ms")
+        return snapshot
+
+    def invalidate(self) -> None:
+        """Make every worker build a new snapshot on its next read"""
+        if shared_cache.enabled:
+            generation = shared_cache.incr(GENERATION_KEY)
+        else:
+            generation = self._generation + 1
+        with self._lock:
+            self._generation = generation
+
+    def _on_catalog_changed(self, app, entity=None, **kwargs):
+        if entity in ('product', 'category'):
+            self.invalidate()
+
+    # -- reads (snapshot first, SQL otherwise) ----------------------------
+
+    def categories(self):
+        snapshot = self.snapshot()
+        if snapshot is not None:
+            return snapshot.categories
+        return Category.query.all()
+
+    def category(self, category_id: int):
+        snapshot = self.snapshot()
+        if snapshot is not None:
+            return snapshot.category(category_id)
+        return db.session.get(Category, category_id)
+
+    def product(self, product_id: int):
+        snapshot = self.snapshot()
+        if snapshot is not None:
+            return snapshot.product(product_id)
+        return db.session.get(Product, product_id)
+
+    def product_count(self, category_id: int) -> int:
+        snapshot = self.snapshot()
+        if snapshot is not None:
+            return len(snapshot.category_products(category_id))
+        from .stats import site_stats, category_key
+        return site_stats.count(category_key(category_id))
+
+    def category_page(self, category_id: int, after: int, limit: int):
+        """Products of a category after id `after`, plus the cursor of the next page"""
+        snapshot = self.snapshot()
+        if snapshot is not None:
+            return snapshot.category_page(category_id, after, limit)
+        products = product_cards(
+            card_select()
+            .where(Product.category_id == category_id, Product.id > after)
+            .order_by(Product.id)
+            .limit(limit + 1)
+        )
+        next_after = products[limit - 1].id if len(products) > limit else None
+        return products[:limit], next_after
+
+    def paginate_category(self, category_id: int, page: int, per_page: int):
+        snapshot = self.snapshot()
+        if snapshot is not None:
+            return SequencePagination(items=snapshot.category_products(category_id), page=page,
+                                      per_page=per_page, error_out=False)
+        return paginate_cards(card_select().where(Product.category_id == category_id).order_by(Product.id),
+                              page=page, per_page=per_page)
+
+    def category_stats(self) -> List[Tuple[int, str, int]]:
+        snapshot = self.snapshot()
+        if snapshot is not None:
+            return snapshot.category_stats()
+        return db.session.query(
+            Category.id,
+            Category.name,
+            func.count(Product.id).label('product_count')
+        ).join(Product).group_by(Category.id, Category.name).all()
+
+    def category_slice(self, category_id: int, offset: int, limit: int) -> list:
+        """Products of a category in id order, `limit` from `offset`"""
+        snapshot = self.snapshot()
+        if snapshot is not None:
+            return list(snapshot.category_products(category_id)[offset:offset + limit])
+        return product_cards(
+            card_select()
+            .where(Product.category_id == category_id)
+            .order_by(Product.id)
+            .offset(offset)
+            .limit(limit)
+        )
+
+    def related(self, product, limit: int = 4) -> list:
+        """Random other products of the same category, else from the whole catalog"""
+        snapshot = self.snapshot()
+        if snapshot is not None:
+            for pool in (snapshot.category_products(product.category_id), snapshot.products):
+                candidates = [p for p in pool if p.id != product.id]
+                if candidates:
+                    return random.sample(candidates, min(limit, len(candidates)))
+            return []
+        related = product_cards(card_select().where(
+            Product.category_id == product.category_id,
+            Product.id != product.id
+        ).order_by(func.random()).limit(limit))
+        if not related:
+            related = product_cards(card_select().where(
+                Product.id != product.id
+            ).order_by(func.random()).limit(limit))
+        return related
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.size_bytes is None:
+            # Walking every object takes a while; done once per snapshot, on demand
+            snapshot.size_bytes = _deep_size(snapshot)
+        return {
+            'enabled': self.enabled,
+            'generation': snapshot.generation if snapshot else None,
+            'products': len(snapshot.products) if snapshot else None,
+            'categories': len(snapshot.categories) if snapshot else None,
+            'build_ms': round(snapshot.build_ms, 1) if snapshot else None,
+            'size_bytes': snapshot.size_bytes if snapshot else None,
+            'age_seconds': round(time.monotonic() - snapshot.built_at, 1) if snapshot else None,
+            'max_products': self.max_products,
+            'hits': self.hits,
+            'builds': self.builds,
+            'fallbacks': self.fallbacks,
+        }
+
+
+# Create a global instance
+catalog = Catalog()
@@ -0,0 +1,203 @@
+"""
+Append-only log of catalog changes for incremental sync
+
+Every write to products, categories, images and job postings appends
+(entity, entity_id, action) rows to catalog_change in the same transaction
+as the write, the same way website.stats keeps its counters:
+
+* ORM writes (add/edit/delete views) are picked up by an after_flush
+  listener.
+* Set-based writes (website.services, the importer, the job sweeper) call
+  changelog.record() with the ids they touched.
+
+Image writes are logged as an upsert of their product, whose payload
+carries the image list. The row id is the sync cursor: read() returns what
+changed after a cursor, collapsed to one action per object, which is what
+GET /api/v1/changes serves. The log always starts with an upsert of every
+live object (provisioning logs one, pruning logs a new one), so reading
+from cursor 0 is a full sync.
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, event, func, inspect, insert, select
+
+from . import db
+from .models import CatalogChange, Category, JobPosting, Product, ProductImage
+
+logger = logging.getLogger(__name__)
+
+UPSERT = 'upsert'
+DELETE = 'delete'
+
+
+def _rows(changes: Dict[Tuple[str, int], str]) -> List[dict]:
+    now = datetime.utcnow()
+    return [
+        {'entity': entity, 'entity_id': entity_id, 'action': action, 'changed_at': now}
+        for (entity, entity_id), action in changes.items() if entity_id is not None
+    ]
+
+
+def _add(changes: Dict[Tuple[str, int], str], entity: str, entity_id: int, action: str) -> None:
+    # Within one write a delete wins over an upsert of the same object
+    if changes.get((entity, entity_id)) != DELETE:
+        changes[(entity, entity_id)] = action
+
+
+class ChangeLog:
+    """Writes and reads the catalog_change sync log"""
+
+    def __init__(self, retention_days: int = 90, baseline_batch: int = 5000):
+        self.retention_days = retention_days
+        self.baseline_batch = baseline_batch
+        self._listening = False
+
+    def init_app(self, app) -> None:
+        self.retention_days = app.config.get('CHANGELOG_RETENTION_DAYS', self.retention_days)
+        if not self._listening:
+            event.listen(db.session, 'after_flush', self._after_flush)
+            self._listening = True
+
+    # -- writing ----------------------------------------------------------
+
+    def record(self, entity: str, ids: Iterable[int], action: str = UPSERT) -> None:
+        """Log `action` for the given ids inside the current transaction"""
+        changes = {}
+        for entity_id in ids:
+            _add(changes, entity, entity_id, action)
+        rows = _rows(changes)
+        if rows:
+            db.session.execute(insert(CatalogChange), rows)
+
+    def _after_flush(self, session, flush_context) -> None:
+        changes = {}
+
+        for obj in session.new:
+            if isinstance(obj, Product):
+                _add(changes, 'product', obj.id, UPSERT)
+            elif isinstance(obj, Category):
+                _add(changes, 'category', obj.id, UPSERT)
+            elif isinstance(obj, JobPosting):
+                _add(changes, 'job', obj.id, UPSERT)
+            elif isinstance(obj, ProductImage):
+                _add(changes, 'product', obj.product_id, UPSERT)
+
+        for obj in session.dirty:
+            if not session.is_modified(obj, include_collections=False):
+                continue
+            if isinstance(obj, Product):
+                _add(changes, 'product', obj.id, UPSERT)
+            elif isinstance(obj, Category):
+                _add(changes, 'category', obj.id, UPSERT)
+                if inspect(obj).attrs.name.history.deleted:
+                    # Product payloads carry the category name
+                    for product_id in session.connection().scalars(
+                            select(Product.id).where(Product.category_id == obj.id)):
+                        _add(changes, 'product', product_id, UPSERT)
+            elif isinstance(obj, JobPosting):
+                _add(changes, 'job', obj.id, UPSERT)
+            elif isinstance(obj, ProductImage):
+                _add(changes, 'product', obj.product_id, UPSERT)
+
+        for obj in session.deleted:
+            if isinstance(obj, Product):
+                _add(changes, 'product', obj.id, DELETE)
+            elif isinstance(obj, Category):
+                _add(changes, 'category', obj.id, DELETE)
+            elif isinstance(obj, JobPosting):
+                _add(changes, 'job', obj.id, DELETE)
+            elif isinstance(obj, ProductImage):
+                _add(changes, 'product', obj.product_id, UPSERT)
+
+        rows = _rows(changes)
+        if rows:
+            # Same connection, so the log commits or rolls back with the flush
+            session.connection().execute(insert(CatalogChange), rows)
+
+    # -- reading ----------------------------------------------------------
+
+    def head(self) -> int:
+        """Id of the newest change (0 for an empty log)"""
+        return db.session.scalar(select(func.max(CatalogChange.id))) or 0
+
+    def read(self, since: int, limit: int) -> Tuple[Dict[Tuple[str, int], str], int, bool, bool]:
+        """
+        Changes after cursor `since`, at most `limit` log rows
+
+        Returns ({(entity, id): last action}, next cursor, has_more, reset).
+        `reset` means rows after `since` were pruned, so deletes may have
+        been missed: the caller drops its copy and reads again from the
+        returned cursor, 0, which is a full sync.
+        """
+        oldest = db.session.scalar(select(func.min(CatalogChange.id)))
+        if since and oldest is not None and oldest > since + 1:
+            return {}, 0, False, True
+
+        rows = db.session.execute(
+            select(CatalogChange.id, CatalogChange.entity, CatalogChange.entity_id, CatalogChange.action)
+            .where(CatalogChange.id > since)
+            .order_by(CatalogChange.id)
+            .limit(limit + 1)
+        ).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        changes = {}
+        for _, entity, entity_id, action in rows:
+            # Later rows win; re-inserting keeps the dict in order of last change
+            changes.pop((entity, entity_id), None)
+            changes[(entity, entity_id)] = action
+        return changes, rows[-1][0] if rows else since, has_more, False
+
+    # -- maintenance ------------------------------------------------------
+
+    def _log_baseline(self) -> int:
+        """Log an upsert for every existing row, without committing"""
+        total = 0
+        for entity, id_column in (('category', Category.id), ('product', Product.id), ('job', JobPosting.id)):
+            ids = db.session.scalars(select(id_column).order_by(id_column)).all()
+            for start in range(0, len(ids), self.baseline_batch):
+                self.record(entity, ids[start:start + self.baseline_batch])
+            total += len(ids)
+        return total
+
+    def ensure_baseline(self) -> int:
+        """
+        Log an upsert for every existing row once, for databases that
+        predate the log, so that reading from cursor 0 is a full sync
+        """
+        if db.session.scalar(select(func.count()).select_from(CatalogChange)):
+            return 0
+        total = self._log_baseline()
+        db.session.commit()
+        if total:
+            logger.info(f"Logged {total} existing catalog row(s) as the change log baseline")
+        return total
+
+    def prune(self, days: Optional[int] = None) -> int:
+        """
+        Delete log rows older than `days` (CHANGELOG_RETENTION_DAYS); returns the count
+
+        The pruned rows included the baseline, so a new one is logged in
+        the same transaction: reading from cursor 0 stays a full sync.
+        """
+        days = self.retention_days if days is None else days
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        # Keep the newest row so the AUTOINCREMENT head stays visible to head()
+        newest = self.head()
+        removed = db.session.execute(
+            delete(CatalogChange).where(CatalogChange.changed_at < cutoff, CatalogChange.id < newest)
+        ).rowcount
+        if removed:
+            self._log_baseline()
+        db.session.commit()
+        if removed:
+            logger.info(f"Pruned {removed} change log row(s) older than {days} day(s)")
+        return removed
+
+
+# Create a global instance
+changelog = ChangeLog()
@@ -0,0 +1,203 @@
+import os
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+
+@click.command('import-products')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), default=None,
+              help='Input format (detected from the file extension by default).')
+@click.option('--owner', default='admin@admin.com', show_default=True,
+              help='Email of the user the products are created for.')
+@click.option('--image-root', type=click.Path(file_okay=False), default=None,
+              help='Directory relative image paths are resolved against (defaults to the file\'s directory).')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows per transaction.')
+@click.option('--workers', default=None, type=int,
+              help='Image ingestion processes (default: CPU count, 1 disables the pool).')
+@click.option('--no-create-categories', is_flag=True, help='Skip rows whose category does not exist.')
+@with_appcontext
+def import_products_command(path, fmt, owner, image_root, batch_size, workers, no_create_categories):
+    """Bulk import products from a CSV or NDJSON file.
+
+    Re-running the same file resumes an interrupted import: products that
+    already exist with the same name and category are skipped.
+    """
+    from .importer import ProductImporter, read_rows
+    from .models import User
+
+    user = User.query.filter_by(email=owner).first()
+    if not user:
+        raise click.ClickException(f'No user with email {owner}')
+
+    importer = ProductImporter(
+        user_id=user.id,
+        upload_folder=current_app.config['UPLOAD_FOLDER'],
+        image_root=image_root or os.path.dirname(os.path.abspath(path)),
+        batch_size=batch_size,
+        workers=workers,
+        create_categories=not no_create_categories,
+    )
+
+    def progress(stats):
+        click.echo(f'  {stats.read} rows, {stats.inserted} inserted ({stats.rate:.0f} rows/s)')
+
+    try:
+        stats = importer.run(read_rows(path, fmt), progress=progress)
+    except Exception as e:
+        raise click.ClickException(
+            f'Import stopped after {importer.stats.inserted} products: {e}. '
+            'Committed batches are kept; run the same command again to resume.'
+        )
+
+    click.echo(f'✓ {stats.summary()}')
+
+    if stats.inserted:
+        from .indexnow_service import indexnow_service
+        from .signals import notify_catalog_change
+        indexnow_service.notify_product_change(None, "add")
+        # The running workers share the cache generations: they drop cached
+        # pages and rebuild their catalog snapshots on their next request
+        notify_catalog_change(current_app._get_current_object(), 'product', 'add', [])
+
+
+@click.command('export-catalog')
+@click.option('--entity', type=click.Choice(['products', 'categories', 'images', 'jobs', 'all']),
+              default='all', show_default=True)
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), default='ndjson', show_default=True)
+@click.option('--since', default=None, help='Only rows changed after this ISO date/time.')
+@click.option('--output', '-o', type=click.File('w', encoding='utf-8'), default='-',
+              help='Output file (default: stdout).')
+@with_appcontext
+def export_catalog_command(entity, fmt, since, output):
+    """Stream the catalog as CSV or NDJSON without loading whole tables."""
+    from .exporter import export_stream, parse_since
+
+    try:
+        chunks = export_stream(entity, fmt, parse_since(since))
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+    for chunk in chunks:
+        output.write(chunk)
+
+
+@click.command('provision')
+@with_appcontext
+def provision_command():
+    """Create the tables of an empty database and seed the default admin and job."""
+    from .provisioning import provision
+
+    if not provision(current_app._get_current_object()):
+        raise click.ClickException('Migrations are pending: run `flask db upgrade` first.')
+    click.echo('✓ Database provisioned.')
+
+
+@click.command('stats-rebuild')
+@with_appcontext
+def stats_rebuild_command():
+    """Recompute the dashboard counters from the catalog tables."""
+    from .stats import site_stats
+
+    counters = site_stats.rebuild()
+    click.echo(f'✓ Rebuilt {len(counters)} dashboard counters.')
+
+
+@click.command('expire-jobs')
+@with_appcontext
+def expire_jobs_command():
+    """Mark job postings past their deadline as inactive (e.g. from cron)."""
+    from .jobs import active_jobs
+
+    ids = active_jobs.expire()
+    click.echo(f'✓ Marked {len(ids)} expired job posting(s) inactive.')
+
+
+@click.command('warmup')
+@click.option('--page', 'pages', multiple=True,
+              help='Path to pre-render (repeatable; default: the home, listing and sitemap pages and top categories).')
+@click.option('--no-render', is_flag=True, help='Only compile templates, read tables and build caches.')
+@with_appcontext
+def warmup_command(pages, no_render):
+    """Compile templates, prime the database and pre-render the top pages.
+
+    Run it right after a deploy: rendered pages land in the host-wide
+    shared cache, where the restarted workers pick them up.
+    """
+    from .warmup import warm_up
+
+    report = warm_up(current_app._get_current_object(), pages=list(pages) or None, render=not no_render)
+    for line in report.lines():
+        click.echo(line)
+    click.echo(f'✓ Warm-up took {report.total_ms:.0f} ms.')
+
+
+@click.command('compile-templates')
+@click.option('--clear', is_flag=True, help='Delete the bytecode cache first (drops files of removed templates).')
+@click.option('--top', default=15, show_default=True, help='Number of slowest templates to list.')
+@with_appcontext
+def compile_templates_command(clear, top):
+    """Compile every template into the shared bytecode cache (run on deploy)."""
+    from .template_cache import template_cache
+
+    if template_cache.bytecode_cache is None:
+        raise click.ClickException('TEMPLATE_BYTECODE_CACHE is off; nothing to compile into.')
+    if clear:
+        template_cache.clear()
+    results = template_cache.compile_all(current_app._get_current_object())
+    failed = [r for r in results if r[3]]
+
+    click.echo(f'Slowest templates (compile from source / load bytecode, ms):')
+    for name, compile_ms, load_ms, error in results[:top]:
+        click.echo(f'  {compile_ms:8.1f} {load_ms:8.2f}  {name}')
+    for name, _, _, error in failed:
+        click.echo(f'  failed: {name}: {error}')
+    total = sum(r[1] for r in results)
+    click.echo(f'✓ Compiled {len(results) - len(failed)} templates ({total:.0f} ms from source) '
+               f'into {template_cache.directory}.')
+
+
+@click.command('changelog-prune')
+@click.option('--days', default=None, type=int,
+              help='Keep this many days of changes (default: CHANGELOG_RETENTION_DAYS).')
+@with_appcontext
+def changelog_prune_command(days):
+    """Delete old rows from the /api/v1/changes log (e.g. from cron)."""
+    from .changelog import changelog
+
+    removed = changelog.prune(days)
+    click.echo(f'✓ Pruned {removed} change log row(s).')
+
+
+@click.command('startup-report')
+@click.option('--top', default=15, show_default=True, help='Number of slowest imports to list.')
+def startup_report_command(top):
+    """Time a cold import and create_app() in a fresh interpreter."""
+    from .startup import measure_cold_start
+
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    import_ms, create_ms, modules = measure_cold_start(project_root)
+
+    click.echo(f'import website: {import_ms:8.1f} ms')
+    click.echo(f'create_app():   {create_ms:8.1f} ms')
+    click.echo(f'total:          {import_ms + create_ms:8.1f} ms')
+    click.echo(f'\nSlowest imports (cumulative / self, ms):')
+    for name, self_ms, cumulative_ms in modules[:top]:
+        click.echo(f'  {cumulative_ms:8.1f} {self_ms:8.1f}  {name}')
+
+
+def register_commands(app):
+    """Attach the application's CLI commands to `flask`"""
+    app.cli.add_command(import_products_command)
+    app.cli.add_command(export_catalog_command)
+    app.cli.add_command(provision_command)
+    app.cli.add_command(stats_rebuild_command)
+    app.cli.add_command(expire_jobs_command)
+    app.cli.add_command(changelog_prune_command)
+    app.cli.add_command(warmup_command)
+    app.cli.add_command(compile_templates_command)
+    app.cli.add_command(startup_report_command)
+
+    from .benchmarks import bench_group
+    app.cli.add_command(bench_group)
@@ -0,0 +1,158 @@
+import gzip
+import logging
+import threading
+import time
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip is offered
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Text formats worth compressing; images, fonts and uploads are already
+# compressed and static files are left to send_file/the web server
+COMPRESSIBLE_MIMETYPES = frozenset({
+    'text/html',
+    'text/plain',
+    'text/xml',
+    'text/css',
+    'text/javascript',
+    'application/xml',
+    'application/json',
+    'application/ld+json',
+    'application/javascript',
+})
+
+
+class Compressor:
+    """
+    Negotiated gzip/brotli compression of dynamic responses
+
+    Runs as an after_request hook: picks br or gzip from Accept-Encoding,
+    skips bodies smaller than `min_size` (the headers would outweigh the
+    saving) and always adds `Vary: Accept-Encoding` to compressible types so
+    shared caches keep the variants apart. Streamed responses are compressed
+    chunk by chunk. The response cache stores the compressed bytes per
+    encoding, so a repeat hit is served without compressing again.
+    """
+
+    def __init__(self, min_size: int = 500, level: int = 6, brotli_level: int = 5):
+        self.min_size = min_size
+        self.level = level
+        self.brotli_level = brotli_level
+        self._lock = threading.Lock()
+        self.compressed = {'gzip': 0, 'br': 0}
+        self.streamed = 0
+        self.skipped_small = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+
+    def init_app(self, app) -> None:
+        self.min_size = app.config.get('COMPRESS_MIN_SIZE', self.min_size)
+        self.level = app.config.get('COMPRESS_LEVEL', self.level)
+        self.brotli_level = app.config.get('COMPRESS_BROTLI_LEVEL', self.brotli_level)
+        app.after_request(self.compress)
+
+        from . import metrics
+        metrics.register('compression', self.stats)
+
+    def negotiate(self, req=None) -> str:
+        """'br', 'gzip' or 'identity' for the request's Accept-Encoding"""
+        accept = (req or request).accept_encodings
+        if brotli is not None and accept['br']:
+            return 'br'
+        if accept['gzip']:
+            return 'gzip'
+        return 'identity'
+
+    def compress(self, response):
+        if response.mimetype not in COMPRESSIBLE_MIMETYPES or response.direct_passthrough:
+            return response
+        response.vary.add('Accept-Encoding')
+
+        if (not 200 <= response.status_code < 300
+                or response.status_code in (204, 206)
+                or 'Content-Encoding' in response.headers
+                or 'no-transform' in response.headers.get('Cache-Control', '')):
+            return response
+
+        encoding = self.negotiate()
+        if encoding == 'identity':
+            return response
+
+        if response.is_streamed:
+            response.response = self._compress_stream(response.iter_encoded(), encoding)
+            response.headers.pop('Content-Length', None)
+            with self._lock:
+                self.streamed += 1
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                with self._lock:
+                    self.skipped_small += 1
+                return response
+            started = time.perf_counter()
+            body = self._compress_bytes(data, encoding)
+            elapsed = time.perf_counter() - started
+            if len(body) >= len(data):
+                return response
+            response.set_data(body)
+            with self._lock:
+                self.compressed[encoding] += 1
+                self.bytes_in += len(data)
+                self.bytes_out += len(body)
+                self.seconds += elapsed
+
+        response.headers['Content-Encoding'] = encoding
+        # The encoded bytes differ from the ones the ETag was computed over
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    def _compress_bytes(self, data: bytes, encoding: str) -> bytes:
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.brotli_level)
+        # mtime=0 keeps the output (and so any ETag over it) deterministic
+        return gzip.compress(data, compresslevel=self.level, mtime=0)
+
+    def _compress_stream(self, chunks, encoding: str):
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=self.brotli_level)
+            compress, flush, finish = compressor.process, compressor.flush, compressor.finish
+        else:
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)  # 31: gzip container
+            compress, finish = compressor.compress, compressor.flush
+            flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+        # Flush after every chunk (views join template output into ~8 KB
+        # chunks): otherwise the compressor holds the first bytes of a
+        # streamed page until its own buffer fills
+        for chunk in chunks:
+            data = compress(chunk) + flush()
+            if data:
+                yield data
+        yield finish()
+
+    def stats(self) -> dict:
+        return {
+            'brotli_available': brotli is not None,
+            'min_size': self.min_size,
+            'level': self.level,
+            'brotli_level': self.brotli_level,
+            'compressed': dict(self.compressed),
+            'streamed': self.streamed,
+            'skipped_small': self.skipped_small,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'ratio': round(self.bytes_out / self.bytes_in, 3) if self.bytes_in else None,
+            'cpu_ms': round(self.seconds * 1000, 1),
+        }
+
+
+# Create a global instance
+compressor = Compressor()
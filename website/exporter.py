@@ -0,0 +1,177 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from itertools import chain
+from typing import Iterator, Optional
+
+from sqlalchemy import select
+
+from . import db
+from .models import CatalogChange, Category, JobPosting, Product, ProductImage
+
+# entity -> (columns to export, column used for incremental exports)
+EXPORTS = {
+    'categories': (
+        [Category.id, Category.name, Category.description, Category.image,
+         Category.created_at, Category.updated_at],
+        Category.updated_at,
+    ),
+    'products': (
+        [Product.id, Product.name, Product.description, Product.price,
+         Product.category_id, Product.user_id, Product.created_at, Product.updated_at],
+        Product.updated_at,
+    ),
+    'images': (
+        [ProductImage.id, ProductImage.product_id, ProductImage.image, ProductImage.created_at],
+        ProductImage.created_at,
+    ),
+    'jobs': (
+        [JobPosting.id, JobPosting.title, JobPosting.description, JobPosting.qualifications,
+         JobPosting.deadline, JobPosting.application_email, JobPosting.is_active,
+         JobPosting.created_at, JobPosting.updated_at],
+        JobPosting.updated_at,
+    ),
+}
+
+# entity -> catalog_change entity whose deletes become tombstones. Images
+# have none: deleting one logs an upsert of its product, and the images of
+# a deleted product go with the product's tombstone.
+TOMBSTONES = {
+    'categories': ('category', Category.id),
+    'products': ('product', Product.id),
+    'jobs': ('job', JobPosting.id),
+}
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Rows fetched from the cursor at a time, and rows buffered per output chunk
+BATCH_SIZE = 1000
+
+
+def parse_since(value: Optional[str]) -> Optional[datetime]:
+    """Parse an ISO date or datetime; raises ValueError on bad input"""
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+
+
+def _serialize(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def iter_rows(entity: str, since: Optional[datetime] = None) -> Iterator[dict]:
+    """
+    Yield one dict per row of `entity`, oldest id first
+
+    Only the exported columns are selected and rows are pulled from the
+    cursor in batches of BATCH_SIZE, so memory use does not depend on the
+    size of the table.
+    """
+    columns, changed_column = EXPORTS[entity]
+    stmt = select(*columns).order_by(columns[0])
+    if since is not None:
+        stmt = stmt.where(changed_column > since)
+
+    keys = [c.key for c in columns]
+    result = db.session.execute(stmt.execution_options(yield_per=BATCH_SIZE))
+    for row in result:
+        yield dict(zip(keys, (_serialize(v) for v in row)))
+
+
+def iter_deleted(entity: str, since: datetime) -> Iterator[int]:
+    """
+    Yield the ids of `entity` rows deleted after `since`, from the change log
+
+    Ids that exist again (e.g. a job posting deleted and re-created) are
+    left out. Deletes older than CHANGELOG_RETENTION_DAYS have been pruned.
+    """
+    if entity not in TOMBSTONES:
+        return
+    logged_entity, id_column = TOMBSTONES[entity]
+    stmt = (
+        select(CatalogChange.entity_id)
+        .where(CatalogChange.entity == logged_entity,
+               CatalogChange.action == 'delete',
+               CatalogChange.changed_at > since,
+               CatalogChange.entity_id.not_in(select(id_column)))
+        .distinct()
+        .order_by(CatalogChange.entity_id)
+    )
+    yield from db.session.scalars(stmt.execution_options(yield_per=BATCH_SIZE))
+
+
+def iter_csv(entity: str, since: Optional[datetime] = None) -> Iterator[str]:
+    """
+    Stream one entity as CSV text chunks, header first
+
+    Incremental exports of TOMBSTONES entities get a trailing "deleted"
+    column, and one row with only the id and deleted=true per deleted row.
+    """
+    columns, _ = EXPORTS[entity]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    incremental = since is not None and entity in TOMBSTONES
+    writer.writerow([c.key for c in columns] + (['deleted'] if incremental else []))
+
+    for n, row in enumerate(iter_rows(entity, since), start=1):
+        writer.writerow(list(row.values()) + ([''] if incremental else []))
+        if n % BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if incremental:
+        blanks = [''] * (len(columns) - 1)
+        for n, entity_id in enumerate(iter_deleted(entity, since), start=1):
+            writer.writerow([entity_id] + blanks + ['true'])
+            if n % BATCH_SIZE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_ndjson(entities, since: Optional[datetime] = None) -> Iterator[str]:
+    """
+    Stream one or more entities as NDJSON text chunks
+
+    Every line carries an "entity" field so several tables can share a
+    single stream. Incremental exports end each entity with tombstones:
+    {"id": ..., "deleted": true, "entity": ...} per deleted row.
+    """
+    for entity in entities:
+        rows = iter_rows(entity, since)
+        if since is not None:
+            rows = chain(rows, ({'id': entity_id, 'deleted': True} for entity_id in iter_deleted(entity, since)))
+        lines = []
+        for row in rows:
+            row['entity'] = entity
+            lines.append(json.dumps(row, separators=(',', ':'), ensure_ascii=False))
+            if len(lines) >= BATCH_SIZE:
+                yield '\n'.join(lines) + '\n'
+                lines = []
+        if lines:
+            yield '\n'.join(lines) + '\n'
+
+
+def export_stream(entity: str, fmt: str, since: Optional[datetime] = None) -> Iterator[str]:
+    """
+    Return the chunk iterator for an export
+
+    `entity` is one of EXPORTS or 'all' (NDJSON only). Raises ValueError for
+    unknown entities or formats.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if entity == 'all':
+        if fmt != 'ndjson':
+            raise ValueError("Exporting all entities at once is only supported as NDJSON")
+        return iter_ndjson(list(EXPORTS), since)
+    if entity not in EXPORTS:
+        raise ValueError(f"Unknown export entity: {entity}")
+    return iter_csv(entity, since) if fmt == 'csv' else iter_ndjson([entity], since)
@@ -0,0 +1,304 @@
+import csv
+import json
+import logging
+import os
+import shutil
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import insert, tuple_
+
+from . import db, seo
+from .changelog import changelog
+from .models import Category, Product, ProductImage
+from .stats import category_key, file_bytes, site_stats, uploads_key
+from .uploads import allowed_file, generate_unique_filename
+
+logger = logging.getLogger(__name__)
+
+
+class ImportStats:
+    """Counters reported while an import runs"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.read = 0
+        self.inserted = 0
+        self.skipped_existing = 0
+        self.skipped_invalid = 0
+        self.categories_created = 0
+        self.images = 0
+        self.image_errors = 0
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def rate(self) -> float:
+        return self.read / self.elapsed if self.elapsed else 0.0
+
+    def summary(self) -> str:
+        return (f"{self.read} rows read, {self.inserted} inserted, "
+                f"{self.skipped_existing} already present, {self.skipped_invalid} invalid, "
+                f"{self.categories_created} categories created, {self.images} images "
+                f"({self.image_errors} failed) in {self.elapsed:.1f}s ({self.rate:.0f} rows/s)")
+
+
+def _split_images(value) -> List[str]:
+    if not value:
+        return []
+    if isinstance(value, list):
+        return [str(v).strip() for v in value if str(v).strip()]
+    return [v.strip() for v in str(value).replace(';', '|').split('|') if v.strip()]
+
+
+def read_rows(path: str, fmt: Optional[str] = None) -> Iterator[dict]:
+    """
+    Stream normalized rows out of a CSV or NDJSON file
+
+    Expected fields: name, description, price, category (or category_name)
+    and images (a list in NDJSON; "|" or ";" separated paths in CSV).
+    """
+    if fmt is None:
+        fmt = 'ndjson' if path.lower().endswith(('.ndjson', '.jsonl')) else 'csv'
+
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            records = csv.DictReader(f)
+        else:
+            records = (json.loads(line) for line in f if line.strip())
+
+        for record in records:
+            yield {
+                'name': (record.get('name') or '').strip(),
+                'description': record.get('description') or None,
+                'price': record.get('price'),
+                'category': (record.get('category') or record.get('category_name') or '').strip(),
+                'images': _split_images(record.get('images') or record.get('image_paths')),
+            }
+
+
+def _chunks(rows: Iterable[dict], size: int) -> Iterator[List[dict]]:
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def ingest_image(task: Tuple[str, str]) -> Tuple[str, Optional[str], Optional[str]]:
+    """
+    Validate one source image with Pillow and copy it into the upload folder
+
+    Runs inside the process pool, so it only takes and returns plain values.
+    Returns (source, stored_filename, error).
+    """
+    source, upload_folder = task
+    if not allowed_file(source):
+        return source, None, 'unsupported file type'
+    try:
+        from PIL import Image
+        with Image.open(source) as im:
+            im.verify()
+        filename = generate_unique_filename(os.path.basename(source))
+        shutil.copyfile(source, os.path.join(upload_folder, filename))
+        return source, filename, None
+    except Exception as e:
+        return source, None, str(e)
+
+
+class ProductImporter:
+    """
+    Batched bulk import of products
+
+    Each chunk of rows resolves its categories with one query, skips rows
+    whose (name, category) already exist, ingests images in a process pool,
+    and inserts products and images with executemany inside a single
+    transaction. Because committed chunks are skipped on the next run, a
+    failed import can simply be re-run to resume.
+    """
+
+    def __init__(self, user_id: int, upload_folder: str, image_root: str,
+                 batch_size: int = 1000, workers: Optional[int] = None,
+                 create_categories: bool = True):
+        self.user_id = user_id
+        self.upload_folder = upload_folder
+        self.image_root = image_root
+        self.batch_size = batch_size
+        self.workers = workers
+        self.create_categories = create_categories
+        self.categories: Dict[str, int] = {}
+        self.stats = ImportStats()
+
+    def _resolve_categories(self, names: set) -> None:
+        missing = [n for n in names if n not in self.categories]
+        if not missing:
+            return
+        for cat_id, name in db.session.query(Category.id, Category.name).filter(Category.name.in_(missing)):
+            self.categories[name] = cat_id
+
+        to_create = [n for n in missing if n not in self.categories]
+        if to_create and self.create_categories:
+            rows = db.session.execute(
+                insert(Category).returning(Category.id, Category.name, sort_by_parameter_order=True),
+                [{'name': n} for n in to_create]
+            )
+            for cat_id, name in rows:
+                self.categories[name] = cat_id
+            self.stats.categories_created += len(to_create)
+            site_stats.record({'categories': len(to_create)})
+            changelog.record('category', [self.categories[n] for n in to_create])
+
+    def _existing_keys(self, keys: List[Tuple[str, int]]) -> set:
+        rows = db.session.query(Product.name, Product.category_id).filter(
+            tuple_(Product.name, Product.category_id).in_(keys)
+        )
+        return {(name, cat_id) for name, cat_id in rows}
+
+    def _image_path(self, path: str) -> str:
+        return path if os.path.isabs(path) else os.path.join(self.image_root, path)
+
+    def _copy_upload(self, source: str, filename: str) -> str:
+        """Copy the ingested upload of `source` under a new unique name"""
+        copy = generate_unique_filename(os.path.basename(source))
+        shutil.copyfile(os.path.join(self.upload_folder, filename), os.path.join(self.upload_folder, copy))
+        return copy
+
+    def _import_chunk(self, chunk: List[dict], pool: Optional[ProcessPoolExecutor]) -> List[int]:
+        self.stats.read += len(chunk)
+
+        valid = []
+        for row in chunk:
+            try:
+                # Same placeholder price add_product stores when none is given
+                row['price'] = float(row['price']) if row['price'] not in (None, '') else 0.02
+            except (TypeError, ValueError):
+                row['price'] = None
+            if not row['name'] or not row['category'] or row['price'] is None:
+                self.stats.skipped_invalid += 1
+            else:
+                valid.append(row)
+
+        self._resolve_categories({row['category'] for row in valid})
+
+        pending, seen = [], set()
+        for row in valid:
+            cat_id = self.categories.get(row['category'])
+            if cat_id is None:
+                self.stats.skipped_invalid += 1
+                continue
+            key = (row['name'], cat_id)
+            if key in seen:
+                self.stats.skipped_existing += 1
+                continue
+            seen.add(key)
+            row['category_id'] = cat_id
+            pending.append(row)
+
+        existing = self._existing_keys(list(seen)) if seen else set()
+        new_rows = [r for r in pending if (r['name'], r['category_id']) not in existing]
+        self.stats.skipped_existing += len(pending) - len(new_rows)
+        if not new_rows:
+            db.session.commit()
+            return []
+
+        # Copy images before touching the product table so the transaction
+        # below stays short; files from a failed chunk are removed again.
+        # Each source is validated and copied once per chunk.
+        sources = [list(dict.fromkeys(self._image_path(p) for p in r['images'])) for r in new_rows]
+        tasks = [(source, self.upload_folder) for source in dict.fromkeys(s for row in sources for s in row)]
+        if pool and len(tasks) > 1:
+            ingested = list(pool.map(ingest_image, tasks, chunksize=16))
+        else:
+            ingested = [ingest_image(t) for t in tasks]
+        stored = {}
+        for source, filename, error in ingested:
+            if error:
+                self.stats.image_errors += 1
+                logger.warning(f"Skipping image {source}: {error}")
+            else:
+                stored[source] = filename
+
+        # Deleting a product removes its files, so a source used by several
+        # products gets a copy of the ingested file for each further one
+        written = list(stored.values())
+        row_files, used = [], set()
+        for row in sources:
+            files = []
+            for source in row:
+                filename = stored.get(source)
+                if filename is None:
+                    continue
+                if source in used:
+                    try:
+                        filename = self._copy_upload(source, filename)
+                    except OSError as e:
+                        self.stats.image_errors += 1
+                        logger.warning(f"Skipping image {source}: {e}")
+                        continue
+                    written.append(filename)
+                used.add(source)
+                files.append(filename)
+            row_files.append(files)
+
+        try:
+            product_ids = [pid for pid, in db.session.execute(
+                insert(Product).returning(Product.id, sort_by_parameter_order=True),
+                [{
+                    'name': r['name'],
+                    'description': r['description'],
+                    'price': r['price'],
+                    'category_id': r['category_id'],
+                    'user_id': self.user_id,
+                } for r in new_rows]
+            )]
+            image_rows = [
+                {'image': filename, 'product_id': pid}
+                for pid, files in zip(product_ids, row_files)
+                for filename in files
+            ]
+            if image_rows:
+                db.session.execute(insert(ProductImage), image_rows)
+
+            # Bulk inserts skip the ORM flush, so count them here
+            deltas = Counter(category_key(r['category_id']) for r in new_rows)
+            deltas['products'] = len(product_ids)
+            deltas['images'] = len(image_rows)
+            deltas[uploads_key(datetime.utcnow().date())] = len(image_rows)
+            deltas['image_bytes'] = file_bytes(written, self.upload_folder)
+            site_stats.record(deltas)
+            changelog.record('product', product_ids)
+            seo.refresh(product_ids)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            for filename in written:
+                try:
+                    os.remove(os.path.join(self.upload_folder, filename))
+                except OSError:
+                    pass
+            raise
+
+        self.stats.inserted += len(product_ids)
+        self.stats.images += len(image_rows)
+        return product_ids
+
+    def run(self, rows: Iterable[dict], progress=None) -> ImportStats:
+        """Import all rows; `progress` is called with the stats after each chunk"""
+        os.makedirs(self.upload_folder, exist_ok=True)
+        pool = ProcessPoolExecutor(max_workers=self.workers) if self.workers != 1 else None
+        try:
+            for chunk in _chunks(rows, self.batch_size):
+                self._import_chunk(chunk, pool)
+                if progress:
+                    progress(self.stats)
+        finally:
+            if pool:
+                pool.shutdown()
+        return self.stats
@@ -1,4 +1,3 @@
-import requests
 import logging
 from typing import List, Optional
 from flask import current_app
@@ -24,6 +23,10 @@ class IndexNowService:
         Returns:
             bool: True if submission was successful, False otherwise
         """
+        # Imported lazily: requests is slow to import and only needed when
+        # an admin actually changes the catalog
+        import requests
+        
         try:
             # Ensure URL is absolute
             if not url.startswith('http'):
@@ -66,6 +69,8 @@ class IndexNowService:
         Returns:
             bool: True if submission was successful, False otherwise
         """
+        import requests
+        
         try:
             # Ensure all URLs are absolute
             absolute_urls = []
@@ -0,0 +1,195 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from flask import current_app
+from sqlalchemy import select, update
+
+from . import db
+from .changelog import changelog
+from .models import JobPosting
+from .signals import notify_catalog_change
+
+logger = logging.getLogger(__name__)
+
+# Everything the careers page and the sitemap show for a posting
+_COLUMNS = (
+    JobPosting.id,
+    JobPosting.title,
+    JobPosting.description,
+    JobPosting.deadline,
+    JobPosting.application_email,
+    JobPosting.created_at,
+)
+
+
+DAY = 86400
+
+
+class ActiveJobs:
+    """
+    Open vacancies (active and deadline not yet passed), cached per worker
+
+    The list can only change when a posting is written or when the day
+    after the earliest deadline starts, so it is kept until that boundary
+    instead of being queried on every request. A job write in any worker
+    replaces a stamp file in the instance folder; the other workers notice
+    the new file with one stat() and reload.
+
+    A background sweeper marks postings whose deadline has passed as
+    inactive with a single UPDATE shortly after midnight (UTC) and every
+    `sweep_interval` seconds, then announces the change so dependent caches
+    are dropped. Sweeps run on slots shared by every worker (multiples of
+    the interval, and midnight), and a lease in the shared cache lets one
+    worker per host run each slot.
+    """
+
+    def __init__(self, sweep_interval: int = 3600):
+        self.sweep_interval = sweep_interval
+        self._jobs: Optional[tuple] = None
+        self._expires_at: Optional[datetime] = None
+        self._stamp = None
+        self._stamp_path = None
+        self._app = None
+        self._sweeper: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+        self.expired = 0
+        self.last_sweep: Optional[datetime] = None
+
+    def init_app(self, app) -> None:
+        self.sweep_interval = app.config.get('JOBS_SWEEP_INTERVAL', self.sweep_interval)
+        self._stamp_path = os.path.join(app.instance_path, 'jobs.stamp')
+        self._app = app
+        app.before_request(self._ensure_sweeper)
+
+        from .signals import catalog_changed
+        catalog_changed.connect(self._on_catalog_changed, sender=app, weak=False)
+
+        from . import metrics
+        metrics.register('active_jobs', self.stats)
+
+    # -- cached listing ---------------------------------------------------
+
+    def _read_stamp(self):
+        try:
+            info = os.stat(self._stamp_path)
+        except OSError:
+            return None
+        return info.st_ino, info.st_mtime_ns
+
+    def listing(self) -> tuple:
+        """Open postings, earliest deadline first, as read-only rows"""
+        now = datetime.utcnow()
+        stamp = self._read_stamp()
+        jobs = self._jobs
+        if (jobs is not None and stamp == self._stamp
+                and (self._expires_at is None or now < self._expires_at)):
+            self.hits += 1
+            return jobs
+
+        rows = db.session.execute(
+            select(*_COLUMNS)
+            .where(JobPosting.is_active == True, JobPosting.deadline >= now.date())
+            .order_by(JobPosting.deadline.asc())
+        ).all()
+        with self._lock:
+            self._jobs = tuple(rows)
+            # A stamp read before the query: a write racing with it forces
+            # another load on the next request
+            self._stamp = stamp
+            self._expires_at = (
+                datetime.combine(rows[0].deadline + timedelta(days=1), datetime.min.time()) if rows else None
+            )
+            self.loads += 1
+        return self._jobs
+
+    def invalidate(self) -> None:
+        """Drop this worker's copy and make every other worker reload"""
+        with self._lock:
+            self._jobs = None
+        if self._stamp_path:
+            os.makedirs(os.path.dirname(self._stamp_path), exist_ok=True)
+            # A new file (new inode) each time, so equal mtimes cannot hide a change
+            tmp_path = f'{self._stamp_path}.{uuid.uuid4().hex}'
+            with open(tmp_path, 'w') as f:
+                f.write(datetime.utcnow().isoformat())
+            os.replace(tmp_path, self._stamp_path)
+
+    def _on_catalog_changed(self, app, entity=None, **kwargs):
+        if entity == 'job':
+            self.invalidate()
+
+    # -- expiry sweep -----------------------------------------------------
+
+    def expire(self) -> List[int]:
+        """Mark postings past their deadline as inactive; returns their ids"""
+        ids = db.session.execute(
+            update(JobPosting)
+            .where(JobPosting.is_active == True, JobPosting.deadline < datetime.utcnow().date())
+            .values(is_active=False)
+            .returning(JobPosting.id)
+        ).scalars().all()
+        if ids:
+            # Closed postings drop out of the public job list
+            changelog.record('job', ids)
+        db.session.commit()
+
+        self.last_sweep = datetime.utcnow()
+        if ids:
+            self.expired += len(ids)
+            logger.info(f"Marked {len(ids)} expired job posting(s) inactive: {ids}")
+            notify_catalog_change(current_app._get_current_object(), 'job', 'update', ids)
+        return ids
+
+    def _ensure_sweeper(self) -> None:
+        # Started on the first request of each worker process (threads do
+        # not survive the fork from a preloading master)
+        if not self.sweep_interval or (self._sweeper is not None and self._sweeper.is_alive()):
+            return
+        with self._lock:
+            if self._sweeper is not None and self._sweeper.is_alive():
+                return
+            self._sweeper = threading.Thread(target=self._sweep_forever, name='job-sweeper', daemon=True)
+            self._sweeper.start()
+
+    def _slots(self, now: float):
+        """(start of the current sweep slot, start of the next), in epoch seconds"""
+        current = max(now // self.sweep_interval * self.sweep_interval, now // DAY * DAY)
+        following = min((now // self.sweep_interval + 1) * self.sweep_interval, (now // DAY + 1) * DAY)
+        return int(current), int(following)
+
+    def _sweep_forever(self) -> None:
+        from .shared_cache import shared_cache
+
+        while True:
+            current, following = self._slots(time.time())
+            try:
+                # Every worker wakes for the slot; the first to take its lease sweeps
+                if not shared_cache.enabled or shared_cache.add(f'jobs:sweep:{current}', os.getpid(),
+                                                                ttl=following - current + 60):
+                    with self._app.app_context():
+                        self.expire()
+            except Exception as e:
+                logger.error(f"Job expiry sweep failed: {str(e)}")
+            time.sleep(max(following - time.time(), 0) + 1)
+
+    def stats(self) -> dict:
+        return {
+            'cached': len(self._jobs) if self._jobs is not None else None,
+            'expires_at': self._expires_at.isoformat() if self._expires_at else None,
+            'hits': self.hits,
+            'loads': self.loads,
+            'expired': self.expired,
+            'sweep_interval': self.sweep_interval,
+            'last_sweep': self.last_sweep.isoformat() if self.last_sweep else None,
+        }
+
+
+# Create a global instance
+active_jobs = ActiveJobs()
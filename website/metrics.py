@@ -0,0 +1,29 @@
+import logging
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+# name -> zero-argument callable returning a JSON-serialisable value
+_providers: Dict[str, Callable[[], object]] = {}
+
+
+def register(name: str, provider: Callable[[], object]) -> None:
+    """Register a metrics provider reported under /admin/metrics"""
+    _providers[name] = provider
+
+
+def collect() -> dict:
+    """
+    Collect the current value of every registered provider
+
+    A failing provider is reported as an error string instead of breaking
+    the whole report.
+    """
+    report = {}
+    for name, provider in sorted(_providers.items()):
+        try:
+            report[name] = provider()
+        except Exception as e:
+            logger.error(f"Metrics provider {name} failed: {str(e)}")
+            report[name] = {'error': str(e)}
+    return report
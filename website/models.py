@@ -19,6 +19,7 @@ class Category(db.Model):
     description = db.Column(db.Text)
     image = db.Column(db.String(200))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # Relationship with products
     products = db.relationship('Product', backref='category', lazy=True)
@@ -28,10 +29,16 @@ class Product(db.Model):
     name = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text)
     price = db.Column(db.Float, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    
+    # JSON-LD and meta keywords built when the product is written (website.seo)
+    structured_data = db.Column(db.Text)
+    list_item_data = db.Column(db.Text)
+    meta_keywords = db.Column(db.Text)
     
     # Foreign keys
-    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False, index=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     
     # Relationship with product images
@@ -40,8 +47,8 @@ class Product(db.Model):
 class ProductImage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     image = db.Column(db.String(200), nullable=False)
-    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
 class JobPosting(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -51,4 +58,21 @@ class JobPosting(db.Model):
     deadline = db.Column(db.Date, nullable=False)
     application_email = db.Column(db.String(150), nullable=False, default='hr@stumarcot.co.tz')
     is_active = db.Column(db.Boolean, default=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+class CatalogStat(db.Model):
+    # Dashboard counters kept up to date by website.stats
+    name = db.Column(db.String(100), primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+
+class CatalogChange(db.Model):
+    # Append-only sync log written by website.changelog; the id is the cursor
+    # (AUTOINCREMENT, so ids of pruned rows are never handed out again)
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(20), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    action = db.Column(db.String(10), nullable=False)
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
@@ -0,0 +1,187 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from .shared_cache import shared_cache
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordCheckBusy(Exception):
+    """Raised when a verification is refused because too many are in flight"""
+
+
+class PasswordHasher:
+    """
+    Bounded executor for pbkdf2 password hashing and verification
+
+    Each hash burns a few hundred milliseconds of CPU. Running them on a small
+    thread pool (pbkdf2 releases the GIL) caps how much of a threaded worker
+    they can take; a sync worker serves one request at a time, so there the
+    pool offloads nothing. Per-IP / per-account limits on in-flight checks
+    make a burst of login attempts fail fast instead of starving catalog
+    requests. They are host-wide: each check holds one of `limit` lease
+    slots in the shared cache, with a TTL so a killed worker cannot leak
+    one. Without a shared cache they are counted per process.
+    """
+
+    def __init__(self, method: str = 'pbkdf2:sha256', max_workers: int = 2,
+                 max_pending: int = 16, per_ip: int = 2, per_account: int = 1,
+                 lease_ttl: int = 30):
+        self.method = method
+        self._method_prefix = None
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.per_ip = per_ip
+        self.per_account = per_account
+        self.lease_ttl = lease_ttl
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._pending = 0
+        self.verified = 0
+        self.rejected = 0
+        self.rehashed = 0
+        # A forked worker inherits the executor object but not its threads:
+        # anything submitted to it would wait forever
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self) -> None:
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._pending = 0
+
+    def init_app(self, app) -> None:
+        self.method = app.config.get('PASSWORD_HASH_METHOD', self.method)
+        self._method_prefix = None
+        self.max_workers = app.config.get('PASSWORD_HASH_WORKERS', self.max_workers)
+        self.max_pending = app.config.get('PASSWORD_HASH_MAX_PENDING', self.max_pending)
+        self.per_ip = app.config.get('PASSWORD_CHECKS_PER_IP', self.per_ip)
+        self.per_account = app.config.get('PASSWORD_CHECKS_PER_ACCOUNT', self.per_account)
+        self.lease_ttl = app.config.get('PASSWORD_CHECK_LEASE_TTL', self.lease_ttl)
+
+        from . import metrics
+        metrics.register('password_hasher', self.stats)
+
+    def _pool(self) -> ThreadPoolExecutor:
+        # Created on first use in each process (see _after_fork)
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='pwhash')
+        return self._executor
+
+    def _lease(self, key, limit: int) -> Optional[str]:
+        """
+        Take a free lease slot for `key` in the shared cache
+
+        Returns the slot's cache key, '' when the shared cache failed (checks
+        are then let through rather than locking everyone out), or None when
+        all `limit` slots are taken.
+        """
+        errors = shared_cache.errors
+        for slot in range(limit):
+            lease = f'password:lease:{key[0]}:{key[1]}:{slot}'
+            if shared_cache.add(lease, os.getpid(), ttl=self.lease_ttl):
+                return lease
+        return '' if shared_cache.errors != errors else None
+
+    def _acquire(self, keys, shared: bool) -> List[str]:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordCheckBusy('password hashing queue is full')
+            if not shared:
+                for key, limit in keys:
+                    if limit and self._in_flight.get(key, 0) >= limit:
+                        self.rejected += 1
+                        raise PasswordCheckBusy(f'too many concurrent checks for {key[0]}')
+                for key, _ in keys:
+                    self._in_flight[key] = self._in_flight.get(key, 0) + 1
+            self._pending += 1
+        if not shared:
+            return []
+
+        leases = []
+        for key, limit in keys:
+            if not limit:
+                continue
+            lease = self._lease(key, limit)
+            if lease is None:
+                self._release(keys, leases, shared)
+                with self._lock:
+                    self.rejected += 1
+                raise PasswordCheckBusy(f'too many concurrent checks for {key[0]}')
+            if lease:
+                leases.append(lease)
+        return leases
+
+    def _release(self, keys, leases, shared: bool) -> None:
+        for lease in leases:
+            shared_cache.delete(lease)
+        with self._lock:
+            self._pending -= 1
+            if not shared:
+                for key, _ in keys:
+                    remaining = self._in_flight.get(key, 1) - 1
+                    if remaining:
+                        self._in_flight[key] = remaining
+                    else:
+                        self._in_flight.pop(key, None)
+
+    def _run(self, keys, fn, *args):
+        shared = shared_cache.enabled
+        leases = self._acquire(keys, shared)
+        try:
+            return self._pool().submit(fn, *args).result()
+        finally:
+            self._release(keys, leases, shared)
+
+    def hash(self, password: str) -> str:
+        """Hash a password with the configured method and cost"""
+        return self._run([], generate_password_hash, password, self.method)
+
+    def verify(self, pwhash: str, password: str, ip: Optional[str] = None,
+               account: Optional[str] = None) -> bool:
+        """
+        Check a password against its hash
+
+        Raises PasswordCheckBusy instead of queueing when the client's IP or
+        the account already has the maximum number of checks in flight.
+        """
+        keys = []
+        if ip:
+            keys.append((('ip', ip), self.per_ip))
+        if account:
+            keys.append((('account', account.lower()), self.per_account))
+        ok = self._run(keys, check_password_hash, pwhash, password or '')
+        self.verified += 1
+        return ok
+
+    def needs_rehash(self, pwhash: str) -> bool:
+        """True when a stored hash was made with a different method or cost"""
+        if self._method_prefix is None:
+            # Werkzeug fills in defaults (e.g. the iteration count) when
+            # storing, so learn the exact prefix from one throwaway hash
+            self._method_prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return pwhash.split('$', 1)[0] != self._method_prefix
+
+    def stats(self) -> dict:
+        return {
+            'method': self.method,
+            'workers': self.max_workers,
+            'pending': self._pending,
+            'verified': self.verified,
+            'rejected': self.rejected,
+            'rehashed': self.rehashed,
+        }
+
+
+# Create a global instance
+password_hasher = PasswordHasher()
@@ -0,0 +1,112 @@
+import logging
+from datetime import date
+
+from sqlalchemy import inspect
+
+from . import db
+
+logger = logging.getLogger(__name__)
+
+
+def _schema_is_current(app) -> bool:
+    """
+    Create the schema of an empty database, or check that an existing one
+    has every migration applied
+
+    Existing databases are only changed by `flask db upgrade`, which also
+    runs the data backfills that go with new columns.
+    """
+    from alembic.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+    from flask_migrate import stamp
+
+    if not inspect(db.engine).get_table_names():
+        db.create_all()
+        # The models are the schema of the newest migration
+        stamp()
+        logger.info("Created the database schema")
+        return True
+
+    config = app.extensions['migrate'].migrate.get_config()
+    head = ScriptDirectory.from_config(config).get_current_head()
+    with db.engine.connect() as conn:
+        current = MigrationContext.configure(conn).get_current_revision()
+    if current != head:
+        logger.error(f"Database is at migration {current}, expected {head}; run `flask db upgrade`")
+        return False
+    return True
+
+
+def seed_defaults():
+    """Create the default admin user and the first job posting if missing"""
+    from .models import User, JobPosting
+
+    # Create default admin user if it doesn't exist
+    admin = User.query.filter_by(email='admin@admin.com').first()
+    if not admin:
+        # Hashed inline: this runs in the gunicorn master, which must not
+        # start the password hasher's thread pool before forking workers
+        from werkzeug.security import generate_password_hash
+        from flask import current_app
+        admin_user = User(
+            email='admin@admin.com',
+            username='admin',
+            password=generate_password_hash(
+                'admin123', current_app.config.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256')),
+            is_admin=True
+        )
+        db.session.add(admin_user)
+        db.session.commit()
+
+    # Seed the first job posting if none exist
+    if not JobPosting.query.first():
+        first_job = JobPosting(
+            title='Accountant',
+            description='Stumarcot is looking for a detail-oriented Accountant to join our finance team, responsible for maintaining financial records, processing transactions, preparing reports, and supporting month-end close.',
+            qualifications="Bachelor's degree in Accounting, Finance, or a related field\n"
+                           "Minimum of 2 years of relevant accounting experience\n"
+                           "Strong knowledge of accounting principles and financial reporting\n"
+                           "Proficiency in accounting software and MS Excel\n"
+                           "High attention to detail, accuracy and integrity\n"
+                           "Good communication and reporting skills",
+            deadline=date(2026, 8, 25),
+            application_email='hr@stumarcot.co.tz',
+            is_active=True,
+        )
+        db.session.add(first_job)
+        db.session.commit()
+
+
+def provision(app):
+    """
+    One-time database setup: create the tables of an empty database, build
+    the dashboard counters, product structured data and change log
+    baseline, and seed defaults
+
+    This used to run inside create_app(), i.e. in every gunicorn worker on
+    every boot. It now runs once per deploy from the gunicorn master (see
+    gunicorn.conf.py), `flask provision`, or `python app.py`. Returns False,
+    having changed nothing, when migrations are pending.
+    """
+    with app.app_context():
+        if not _schema_is_current(app):
+            return False
+
+        # Products created before their structured data was stored
+        from . import seo
+        seo.backfill()
+
+        # Before seeding, so seeded rows are counted exactly once
+        from .stats import site_stats
+        site_stats.ensure_built()
+        from .changelog import changelog
+        changelog.ensure_baseline()
+
+        # Convenience seeding. Wrapped because a failure here should not
+        # stop the site from starting, which is far worse than skipping a seed.
+        try:
+            seed_defaults()
+        except Exception as exc:
+            db.session.rollback()
+            app.logger.warning('Startup seeding skipped: %s', exc)
+    return True
@@ -0,0 +1,105 @@
+"""
+Read-only product rows for the listing pages
+
+A product card shows a name, a price, the start of the description, the
+first image and the category. Loading Product instances for that pulls the
+whole description Text, registers every row in the identity map and builds
+relationship collections (or queries the images card by card). Listings
+select just those columns instead, with the first image and the category
+name in the same query, into slotted dataclasses shaped like the ORM
+objects, so templates keep using product.images[0].image and
+product.category.name unchanged.
+"""
+
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from flask_sqlalchemy.pagination import SelectPagination
+from sqlalchemy import func, select
+
+from . import db
+from .models import Category, Product, ProductImage
+
+# Enough of the description for `truncate(100)` (leeway 5) and `[:100]` in
+# the card templates to print exactly what they print for the full text
+DESCRIPTION_PREVIEW = 106
+
+# Correlated per-row subquery; cheap with the index on product_image.product_id
+first_image = (
+    select(ProductImage.image)
+    .where(ProductImage.product_id == Product.id)
+    .order_by(ProductImage.id)
+    .limit(1)
+    .correlate(Product)
+    .scalar_subquery()
+)
+
+
+@dataclass(frozen=True, slots=True)
+class ImageRef:
+    image: str
+
+
+@dataclass(frozen=True, slots=True)
+class CategoryRef:
+    id: int
+    name: str
+
+
+@dataclass(frozen=True, slots=True)
+class ProductCard:
+    """What a listing shows of a product; `description` is a preview only"""
+    id: int
+    name: str
+    description: Optional[str]
+    price: float
+    category_id: int
+    category: Optional[CategoryRef]
+    images: Tuple[ImageRef, ...]
+    list_item_data: Optional[str]
+
+
+def card_select():
+    """The card columns; add where/order_by/limit and pass to product_cards()"""
+    return (
+        select(
+            Product.id,
+            Product.name,
+            func.substr(Product.description, 1, DESCRIPTION_PREVIEW),
+            Product.price,
+            Product.category_id,
+            Category.name,
+            first_image,
+            Product.list_item_data,
+        )
+        .outerjoin(Category, Category.id == Product.category_id)
+    )
+
+
+def product_cards(stmt) -> List[ProductCard]:
+    return [
+        ProductCard(
+            id=id,
+            name=name,
+            description=description,
+            price=price,
+            category_id=category_id,
+            category=CategoryRef(category_id, category_name) if category_name is not None else None,
+            images=(ImageRef(image),) if image else (),
+            list_item_data=list_item_data,
+        )
+        for id, name, description, price, category_id, category_name, image, list_item_data
+        in db.session.execute(stmt)
+    ]
+
+
+class CardPagination(SelectPagination):
+    """db.paginate() for card_select(): same paging, items are ProductCards"""
+
+    def _query_items(self) -> list:
+        stmt = self._query_args['select']
+        return product_cards(stmt.limit(self.per_page).offset(self._query_offset))
+
+
+def paginate_cards(stmt, page: int, per_page: int) -> CardPagination:
+    return CardPagination(select=stmt, session=db.session(), page=page, per_page=per_page, error_out=False)
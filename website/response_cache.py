@@ -0,0 +1,441 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from flask import current_app, g, request, session
+
+from .shared_cache import shared_cache
+
+logger = logging.getLogger(__name__)
+
+# Public, anonymous pages and API reads whose output depends only on the URL
+CACHEABLE_ENDPOINTS = (
+    'views.home',
+    'views.products',
+    'views.product_single',
+    'views.categories',
+    'views.category_products',
+    'views.category_cards',
+    'views.sitemap',
+    'views.sitemap_index',
+    'views.sitemap_products',
+    'views.sitemap_categories',
+    'views.robots_txt',
+    'api.list_categories',
+    'api.get_category',
+    'api.list_products',
+    'api.get_product',
+)
+
+# Never replayed from the cache
+_SKIPPED_HEADERS = ('Set-Cookie', 'Date', 'X-Cache')
+
+# Shared-cache counter bumped by every catalog write in any worker
+GENERATION_KEY = 'response_cache:generation'
+
+# WSGI environ flag of the internal requests that re-render a stale entry
+REFRESH_ENVIRON = 'stumarcot.response_cache.refresh'
+
+
+class ResponseCache:
+    """
+    Cache of finished responses for anonymous GET requests
+
+    Entries are keyed by the full path and the negotiated Content-Encoding
+    and hold the final, already compressed body, so a hit skips rendering,
+    SQL and compression alike. Only requests without a session or remember
+    cookie are cached, only endpoints listed in RESPONSE_CACHE_ENDPOINTS,
+    and only 200 responses that set no cookie.
+
+    Each worker keeps the entries it served in memory; with `shared` on,
+    a page rendered by one worker is also stored in the host-wide
+    shared_cache, so the others serve it without rendering it again.
+    Catalog writes bump a generation counter in the shared cache, which
+    every worker compares on each cacheable request: a write in one worker
+    invalidates the pages of all of them.
+
+    Expensive misses are rendered once. While one request renders a page,
+    identical requests wait up to `wait` seconds for its result instead of
+    running the same queries: other threads wait on an event, and other
+    workers poll the shared cache while the renderer holds a lease there.
+    `wait` stays short (a sync worker is blocked while it waits); after it
+    the request renders the page itself. An entry that has outlived its TTL
+    is still served for `stale` more seconds, and the worker that served it
+    renders it again once that response has been sent
+    (stale-while-revalidate), inside the same request cycle, so it stays
+    under the server's timeouts. A generation change is not an expiry:
+    pages from before a catalog write are never served stale.
+    """
+
+    # Seconds a render lease lives if its holder dies before releasing it
+    lease = 30
+    # Seconds between shared cache checks while another worker renders
+    poll_interval = 0.05
+
+    def __init__(self, ttl: int = 60, max_bytes: int = 32 * 1024 * 1024, endpoints=CACHEABLE_ENDPOINTS,
+                 shared: bool = True, stale: int = 300, wait: float = 2):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.endpoints = frozenset(endpoints)
+        self.shared = shared
+        self.stale = stale
+        self.wait = wait
+        self._entries = OrderedDict()
+        self._size = 0
+        self._generation = 0
+        self._flights = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.stale_hits = 0
+        self.coalesced = 0
+        self.refreshes = 0
+        self.misses = 0
+        self.stored = 0
+        self.invalidations = 0
+
+    def init_app(self, app) -> None:
+        self.ttl = app.config.get('RESPONSE_CACHE_TTL', self.ttl)
+        self.max_bytes = app.config.get('RESPONSE_CACHE_MAX_BYTES', self.max_bytes)
+        self.endpoints = frozenset(app.config.get('RESPONSE_CACHE_ENDPOINTS', self.endpoints))
+        self.shared = app.config.get('RESPONSE_CACHE_SHARED', self.shared) and shared_cache.enabled
+        self.stale = app.config.get('RESPONSE_CACHE_STALE', self.stale)
+        self.wait = app.config.get('RESPONSE_CACHE_WAIT', self.wait)
+        app.before_request(self._serve)
+        app.after_request(self._store)
+        app.teardown_request(self._teardown)
+
+        from .signals import catalog_changed
+        catalog_changed.connect(self._on_catalog_changed, sender=app, weak=False)
+
+        from . import metrics
+        metrics.register('response_cache', self.stats)
+
+    def _key(self) -> Optional[tuple]:
+        if not self.ttl or request.method not in ('GET', 'HEAD') or request.endpoint not in self.endpoints:
+            return None
+        cookies = request.cookies
+        config = current_app.config
+        if (config['SESSION_COOKIE_NAME'] in cookies
+                or config.get('REMEMBER_COOKIE_NAME', 'remember_token') in cookies):
+            return None
+        from .compression import compressor
+        return request.full_path, compressor.negotiate()
+
+    def _current_generation(self) -> int:
+        if not self.shared:
+            return self._generation
+        generation = shared_cache.get(GENERATION_KEY, 0)
+        if generation != self._generation:
+            # The catalog changed in another worker
+            with self._lock:
+                self._entries.clear()
+                self._size = 0
+                self._generation = generation
+        return generation
+
+    @staticmethod
+    def _shared_key(generation: int, key: tuple) -> str:
+        path, encoding = key
+        return f'response:{generation}:{encoding}:{path}'
+
+    def _serve(self):
+        key = self._key()
+        if key is None:
+            return None
+        generation = self._current_generation()
+        if request.environ.get(REFRESH_ENVIRON):
+            # Background re-render of a stale entry (see _refresh)
+            g._response_cache_key = key, generation, None
+            return None
+
+        entry = self._lookup(key, generation)
+        if entry is None:
+            entry, flight = self._single_flight(key, generation)
+            if entry is None:
+                with self._lock:
+                    self.misses += 1
+                g._response_cache_key = key, generation, flight
+                return None
+
+        fresh_until, status, headers, body = entry
+        g._response_cache_hit = True
+        response = current_app.response_class(body, status=status, headers=headers)
+        if fresh_until < time.monotonic():
+            with self._lock:
+                self.stale_hits += 1
+            self._revalidate(key, generation, response)
+            response.headers['X-Cache'] = 'STALE'
+        else:
+            response.headers['X-Cache'] = 'HIT'
+        return response.make_conditional(request)
+
+    def _lookup(self, key, generation) -> Optional[tuple]:
+        """A fresh or still servable stale entry: this worker's, else the shared one"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] + self.stale < now:
+                self._drop(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if entry[0] >= now or not self.shared:
+                    self.hits += 1
+                    return entry
+
+        if self.shared:
+            # Also when the local copy is stale: another worker may have
+            # rendered the page again already
+            stored = shared_cache.get(self._shared_key(generation, key))
+            if stored is not None:
+                expires_at, status, headers, body = stored
+                shared_entry = (now + expires_at - time.time(), status, headers, body)
+                if entry is None or shared_entry[0] > entry[0]:
+                    self._put_local(key, shared_entry)
+                    with self._lock:
+                        self.shared_hits += 1
+                    return shared_entry
+        if entry is not None:
+            with self._lock:
+                self.hits += 1
+        return entry
+
+    # -- single flight ----------------------------------------------------
+
+    def _single_flight(self, key, generation):
+        """
+        Wait for an identical request that is already rendering
+
+        Returns (entry, None) when that request's result arrived in time,
+        or (None, flight) when this request renders; `flight` is what
+        _land() releases afterwards (None if nobody waits on it).
+        """
+        if not self.wait:
+            return None, None
+        flight_key = (generation, key)
+        with self._lock:
+            event = self._flights.get(flight_key)
+            if event is None:
+                self._flights[flight_key] = threading.Event()
+        if event is not None:
+            # Another thread of this worker renders it
+            event.wait(self.wait)
+            entry = self._lookup(key, generation)
+            if entry is not None:
+                with self._lock:
+                    self.coalesced += 1
+            return entry, None
+
+        if not self.shared:
+            return None, (flight_key, None)
+        lease_key = 'render:' + self._shared_key(generation, key)
+        if shared_cache.add(lease_key, os.getpid(), ttl=self.lease):
+            return None, (flight_key, lease_key)
+
+        # Another worker renders it; this thread's waiters wait on us meanwhile
+        entry = self._await_shared(key, generation, lease_key)
+        if entry is not None:
+            with self._lock:
+                self.coalesced += 1
+            self._land((flight_key, None))
+            return entry, None
+        return None, (flight_key, None)
+
+    def _await_shared(self, key, generation, lease_key) -> Optional[tuple]:
+        deadline = time.monotonic() + self.wait
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            stored = shared_cache.get(self._shared_key(generation, key))
+            if stored is not None:
+                expires_at, status, headers, body = stored
+                entry = (time.monotonic() + expires_at - time.time(), status, headers, body)
+                self._put_local(key, entry)
+                return entry
+            if shared_cache.get(lease_key) is None:
+                # Released without storing (e.g. the page was not cacheable)
+                return None
+        return None
+
+    def _land(self, flight) -> None:
+        """Release a render: drop the lease and wake this worker's waiters"""
+        if flight is None:
+            return
+        flight_key, lease_key = flight
+        if lease_key:
+            shared_cache.delete(lease_key)
+        with self._lock:
+            event = self._flights.pop(flight_key, None)
+        if event is not None:
+            event.set()
+
+    def _teardown(self, exc=None) -> None:
+        # The view failed before _store took over the render
+        pending = g.pop('_response_cache_key', None)
+        if pending is not None:
+            self._land(pending[2])
+
+    # -- stale-while-revalidate -------------------------------------------
+
+    def _revalidate(self, key, generation, response) -> None:
+        """Render a stale entry again once `response` has been sent, once per host"""
+        refresh_key = (generation, key)
+        with self._lock:
+            if refresh_key in self._refreshing:
+                return
+            self._refreshing.add(refresh_key)
+        lease_key = None
+        if self.shared:
+            lease_key = 'refresh:' + self._shared_key(generation, key)
+            if not shared_cache.add(lease_key, os.getpid(), ttl=self.lease):
+                with self._lock:
+                    self._refreshing.discard(refresh_key)
+                return
+
+        args = (refresh_key, lease_key, current_app._get_current_object(), request.path,
+                request.query_string.decode('latin-1'), request.host_url, request.headers.get('Accept-Encoding', ''))
+        # The server closes the response after its last byte went out
+        response.call_on_close(lambda: self._refresh(*args))
+
+    def _refresh(self, refresh_key, lease_key, app, path, query_string, base_url, accept_encoding) -> None:
+        try:
+            # A cookie-less internal request through the full stack (before
+            # and after request hooks included); _store keeps the result
+            # like any other miss
+            with app.test_request_context(
+                    path, query_string=query_string, base_url=base_url,
+                    headers={'Accept-Encoding': accept_encoding},
+                    environ_overrides={REFRESH_ENVIRON: True}):
+                response = app.full_dispatch_request()
+                # Streamed bodies are stored once they have been consumed
+                response.get_data()
+                response.close()
+        except Exception as e:
+            logger.warning(f"Background refresh of {path} failed: {str(e)}")
+        finally:
+            if lease_key:
+                shared_cache.delete(lease_key)
+            with self._lock:
+                self._refreshing.discard(refresh_key)
+                self.refreshes += 1
+
+    # -- storing ----------------------------------------------------------
+
+    def _store(self, response):
+        pending = g.pop('_response_cache_key', None)
+        if g.pop('_response_cache_hit', False) or pending is None:
+            return response
+        key, generation, flight = pending
+        if (response.status_code != 200
+                or response.direct_passthrough
+                or 'Set-Cookie' in response.headers
+                or session.modified
+                or any(d in response.headers.get('Cache-Control', '') for d in ('no-store', 'private'))):
+            self._land(flight)
+            return response
+
+        response.headers['X-Cache'] = 'MISS'
+        if response.is_streamed:
+            # Keep a copy of the chunks as they go out and store the body
+            # once the stream has been sent completely
+            response.response = self._tee(key, generation, flight, response, response.iter_encoded())
+            return response
+
+        if response.get_etag()[0] is None:
+            response.add_etag()
+        try:
+            self._put(key, generation, response, response.get_data())
+        finally:
+            self._land(flight)
+        return response.make_conditional(request)
+
+    def _tee(self, key, generation, flight, response, chunks):
+        invalidations = self.invalidations
+        limit = self.max_bytes // 4
+        body, size = [], 0
+        try:
+            for chunk in chunks:
+                if body is not None:
+                    size += len(chunk)
+                    if size <= limit:
+                        body.append(chunk)
+                    else:
+                        body = None
+                yield chunk
+            # Skip the store if the catalog changed while the body was streaming
+            if body is not None and invalidations == self.invalidations:
+                self._put(key, generation, response, b''.join(body))
+        finally:
+            # Also when the client went away mid-stream
+            self._land(flight)
+
+    def _put(self, key, generation, response, body: bytes) -> None:
+        headers = [(k, v) for k, v in response.headers.items() if k not in _SKIPPED_HEADERS]
+        entry = (time.monotonic() + self.ttl, response.status_code, headers, body)
+        if not self._put_local(key, entry):
+            return
+        with self._lock:
+            self.stored += 1
+        if self.shared:
+            # Kept through the stale window; the stored time is when it stops being fresh
+            shared_cache.set(self._shared_key(generation, key),
+                             (time.time() + self.ttl, response.status_code, headers, body),
+                             ttl=self.ttl + self.stale)
+
+    def _put_local(self, key, entry) -> bool:
+        size = len(entry[3]) + sum(len(k) + len(v) for k, v in entry[2])
+        if size > self.max_bytes // 4:
+            return False
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = entry
+            self._size += size
+            while self._size > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+        return True
+
+    def _drop(self, key) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry[3]) + sum(len(k) + len(v) for k, v in entry[2])
+
+    def clear(self) -> None:
+        # Entries of older generations are never looked up again and age
+        # out of the shared cache by TTL
+        generation = shared_cache.incr(GENERATION_KEY) if self.shared else self._generation + 1
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self._generation = generation
+            self.invalidations += 1
+
+    def _on_catalog_changed(self, app, **kwargs):
+        self.clear()
+
+    def stats(self) -> dict:
+        return {
+            'entries': len(self._entries),
+            'bytes': self._size,
+            'max_bytes': self.max_bytes,
+            'ttl': self.ttl,
+            'stale': self.stale,
+            'shared': self.shared,
+            'generation': self._generation,
+            'hits': self.hits,
+            'shared_hits': self.shared_hits,
+            'stale_hits': self.stale_hits,
+            'coalesced': self.coalesced,
+            'refreshes': self.refreshes,
+            'in_flight': len(self._flights),
+            'misses': self.misses,
+            'stored': self.stored,
+            'invalidations': self.invalidations,
+        }
+
+
+# Create a global instance
+response_cache = ResponseCache()
@@ -0,0 +1,263 @@
+import logging
+import sys
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+from . import db
+from .catalog import GENERATION_KEY
+from .models import Category, Product
+from .shared_cache import shared_cache
+
+logger = logging.getLogger(__name__)
+
+PRODUCT = 0
+CATEGORY = 1
+
+# Prefixes up to this length get a precomputed top list: their ranges are
+# too long to rank on every keystroke
+SHORT_PREFIX = 2
+# Most suggestions per kind a request can ask for
+MAX_SUGGESTIONS = 20
+
+
+def normalize(text: str) -> str:
+    """Lower-case, strip accents and collapse whitespace for prefix matching"""
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(text.casefold().split())
+
+
+def _keys_for(name: str) -> List[Tuple[str, int]]:
+    """
+    Build the index keys for a name: the full normalized name plus every
+    word suffix, so "wall tiles" also matches a prefix of "tiles".
+
+    Returns (key, word_position) pairs.
+    """
+    words = normalize(name).split(' ')
+    return [(' '.join(words[i:]), i) for i in range(len(words)) if words[i]]
+
+
+def _rank(entries) -> List[Tuple[Tuple[int, int], tuple]]:
+    """
+    ((kind, id), rank) per item in `entries`, best first: whole-name matches
+    before word matches, then shorter keys
+    """
+    candidates = {}
+    for key, position, kind, item_id in entries:
+        rank = (position > 0, len(key), item_id)
+        if candidates.get((kind, item_id), rank) >= rank:
+            candidates[(kind, item_id)] = rank
+    return sorted(candidates.items(), key=lambda item: item[1])
+
+
+def _top(ranked, limit: int) -> List[Tuple[Tuple[int, int], tuple]]:
+    """The first `limit` ranked items of each kind"""
+    counts = {PRODUCT: 0, CATEGORY: 0}
+    top = []
+    for item in ranked:
+        kind = item[0][0]
+        if counts[kind] < limit:
+            counts[kind] += 1
+            top.append(item)
+    return top
+
+
+def _short_prefixes(entries) -> Dict[str, list]:
+    """Top MAX_SUGGESTIONS per kind for every prefix of up to SHORT_PREFIX characters"""
+    groups = {}
+    for entry in entries:
+        key = entry[0]
+        for n in range(1, min(SHORT_PREFIX, len(key)) + 1):
+            groups.setdefault(key[:n], []).append(entry)
+    return {prefix: _top(_rank(group), MAX_SUGGESTIONS) for prefix, group in groups.items()}
+
+
+class SearchIndex:
+    """
+    In-process prefix index over product and category names for typeahead
+
+    Entries live in one sorted list of (key, word_position, kind, id) tuples
+    that is searched with bisect. Writers build a new list and swap it in, so
+    readers never see a half-updated index and never need a lock.
+
+    Keystrokes never touch the database. The index is built by the warm-up
+    or, on the first keystroke, in a background thread; until then
+    suggestions are empty. It is rebuilt the same way when the catalog
+    generation in the shared cache moves (a write in any worker) or it is
+    older than max_age. The worker that made a write also patches its index
+    at once from the catalog_changed signal.
+    """
+
+    def __init__(self, max_entries: int = 200000, max_age: int = 300):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._entries: List[Tuple[str, int, int, int]] = []
+        self._names: Dict[Tuple[int, int], str] = {}
+        self._short: Dict[str, list] = {}
+        self._generation: Optional[int] = None
+        self._built_at: Optional[float] = None
+        self._build_seconds = 0.0
+        self._truncated = False
+        self._lock = threading.Lock()
+        self._rebuilding = False
+
+    def init_app(self, app) -> None:
+        self.max_entries = app.config.get('SEARCH_INDEX_MAX_ENTRIES', self.max_entries)
+        self.max_age = app.config.get('SEARCH_INDEX_MAX_AGE', self.max_age)
+
+        from .signals import catalog_changed
+        catalog_changed.connect(self._on_catalog_changed, sender=app, weak=False)
+
+        from . import metrics
+        metrics.register('search_index', self.stats)
+
+    # -- building ---------------------------------------------------------
+
+    def _make_entries(self, names: Dict[Tuple[int, int], str]) -> List[Tuple[str, int, int, int]]:
+        entries = []
+        for (kind, item_id), name in names.items():
+            for key, position in _keys_for(name):
+                entries.append((key, position, kind, item_id))
+        entries.sort()
+        self._truncated = len(entries) > self.max_entries
+        if self._truncated:
+            # Keep whole-name keys first so every item stays findable by the
+            # start of its name, then fill the remaining budget with suffixes.
+            entries.sort(key=lambda e: e[1])
+            entries = sorted(entries[:self.max_entries])
+        return entries
+
+    @staticmethod
+    def _current_generation() -> Optional[int]:
+        return shared_cache.get(GENERATION_KEY, 0) if shared_cache.enabled else None
+
+    def build(self) -> None:
+        """Load every product and category name with two narrow queries"""
+        started = time.perf_counter()
+        # Read before the queries: a write racing with them moves it again
+        generation = self._current_generation()
+        names = {}
+        for item_id, name in db.session.query(Category.id, Category.name):
+            names[(CATEGORY, item_id)] = name
+        for item_id, name in db.session.query(Product.id, Product.name):
+            names[(PRODUCT, item_id)] = name
+
+        entries = self._make_entries(names)
+        short = _short_prefixes(entries)
+        with self._lock:
+            self._entries = entries
+            self._names = names
+            self._short = short
+            self._generation = generation
+            self._built_at = time.time()
+        self._build_seconds = time.perf_counter() - started
+        logger.info(f"Search index built with {len(self._entries)} keys in {self._build_seconds * 1000:.1f}ms")
+
+    def _rebuild_in_background(self, app) -> None:
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+
+        def run():
+            try:
+                with app.app_context():
+                    self.build()
+            except Exception as e:
+                logger.error(f"Search index rebuild failed: {str(e)}")
+            finally:
+                with self._lock:
+                    self._rebuilding = False
+
+        threading.Thread(target=run, name='search-index-rebuild', daemon=True).start()
+
+    def ensure_built(self, app) -> None:
+        """
+        Start a background build when the index is missing, behind the
+        shared catalog generation or older than max_age; never waits
+        """
+        if (self._built_at is None
+                or self._generation != self._current_generation()
+                or (self.max_age and time.time() - self._built_at > self.max_age)):
+            self._rebuild_in_background(app)
+
+    # -- incremental updates ----------------------------------------------
+
+    def _apply(self, kind: int, removed_ids, upserts: Dict[int, str]) -> None:
+        with self._lock:
+            stale = set(removed_ids) | set(upserts)
+            names = {k: v for k, v in self._names.items() if not (k[0] == kind and k[1] in stale)}
+            entries = [e for e in self._entries if not (e[2] == kind and e[3] in stale)]
+            for item_id, name in upserts.items():
+                names[(kind, item_id)] = name
+                for key, position in _keys_for(name):
+                    entries.append((key, position, kind, item_id))
+            entries.sort()
+            if len(entries) > self.max_entries:
+                entries = self._make_entries(names)
+            self._entries = entries
+            self._names = names
+            self._short = _short_prefixes(entries)
+
+    def _on_catalog_changed(self, app, entity=None, action=None, ids=None, **kwargs):
+        if self._built_at is None or entity not in ('product', 'category') or not ids:
+            return
+        kind, model = (PRODUCT, Product) if entity == 'product' else (CATEGORY, Category)
+        if action == 'delete':
+            self._apply(kind, ids, {})
+            return
+        rows = db.session.query(model.id, model.name).filter(model.id.in_(ids)).all()
+        self._apply(kind, ids, {item_id: name for item_id, name in rows})
+
+    # -- querying ---------------------------------------------------------
+
+    def suggest(self, prefix: str, limit: int = 8) -> Dict[str, List[dict]]:
+        """
+        Return up to `limit` products and `limit` categories whose name (or a
+        word in it) starts with `prefix`, best matches first.
+        """
+        results = {'products': [], 'categories': []}
+        prefix = normalize(prefix)
+        if not prefix:
+            return results
+
+        entries, names = self._entries, self._names
+        if len(prefix) <= SHORT_PREFIX:
+            ranked = self._short.get(prefix, [])
+        else:
+            # Every key starting with the prefix sorts before prefix + the
+            # highest code point
+            start = bisect_left(entries, (prefix,))
+            end = bisect_left(entries, (prefix + '\U0010ffff',), lo=start)
+            ranked = _rank(entries[start:end])
+
+        for (kind, item_id), rank in _top(ranked, min(limit, MAX_SUGGESTIONS)):
+            bucket = results['products'] if kind == PRODUCT else results['categories']
+            bucket.append({'id': item_id, 'name': names.get((kind, item_id), '')})
+        return results
+
+    def stats(self) -> dict:
+        entries = self._entries
+        approx_bytes = sys.getsizeof(entries) + sum(
+            sys.getsizeof(e) + sys.getsizeof(e[0]) for e in entries
+        )
+        return {
+            'keys': len(entries),
+            'max_keys': self.max_entries,
+            'truncated': self._truncated,
+            'items': len(self._names),
+            'approx_bytes': approx_bytes,
+            'ready': self._built_at is not None,
+            'build_ms': round(self._build_seconds * 1000, 2),
+            'age_seconds': round(time.time() - self._built_at, 1) if self._built_at else None,
+        }
+
+
+# Create a global instance
+search_index = SearchIndex()
@@ -0,0 +1,199 @@
+"""
+Per-product structured data and meta keywords, built when a product is written
+
+product-single and the product listing used to assemble JSON-LD with Jinja
+loops, conditionals and url_for() calls on every view. The output only
+changes when the product, its images or its category change, so refresh()
+builds it from those write paths (in the same transaction) and stores it
+on the product row. Views inject the stored strings as they are; a listing
+page is a string join.
+"""
+
+import json
+import logging
+from typing import Iterable, List, Optional
+
+from flask import url_for
+from jinja2.utils import htmlsafe_json_dumps
+from markupsafe import Markup
+from sqlalchemy import select, update
+from sqlalchemy.orm import joinedload, selectinload
+
+from . import db
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+FALLBACK_IMAGE = 'Minimalist_House_Logo_Design-removebg-preview.png'
+DEFAULT_DESCRIPTION = 'High-quality construction product from Stumarcot Tanzania'
+BATCH_SIZE = 500
+
+
+def _dumps(value) -> str:
+    # Safe inside <script>: <, >, & and ' are written as \u escapes
+    return str(htmlsafe_json_dumps(value, dumps=json.dumps, separators=(',', ':')))
+
+
+def _image_urls(product) -> List[str]:
+    images = [url_for('static', filename='uploads/' + image.image, _external=True) for image in product.images]
+    return images or [url_for('static', filename=FALLBACK_IMAGE, _external=True)]
+
+
+def _structured_data(product, category_name: Optional[str], images: List[str]) -> dict:
+    offer = {
+        '@type': 'Offer',
+        'url': url_for('views.product_single', product_id=product.id, _external=True),
+        'priceCurrency': 'TZS',
+        'availability': 'https://schema.org/InStock',
+        'seller': {'@type': 'Organization', 'name': 'Stumarcot Company Limited'},
+        'contactPoint': {'@type': 'ContactPoint', 'telephone': '+255-769-226-111', 'contactType': 'sales'},
+    }
+    if product.price is not None:
+        offer['price'] = f'{product.price:.2f}'
+    # No aggregateRating: there are no published reviews to back one
+    return {
+        '@context': 'https://schema.org',
+        '@type': 'Product',
+        'name': product.name,
+        'description': product.description or DEFAULT_DESCRIPTION,
+        'image': images,
+        'brand': {'@type': 'Brand', 'name': 'Stumarcot'},
+        'manufacturer': {
+            '@type': 'Organization',
+            'name': 'Stumarcot Company Limited',
+            'url': 'https://stumarcot.co.tz',
+        },
+        'category': category_name or 'Construction Materials',
+        'offers': offer,
+        'additionalProperty': [
+            {'@type': 'PropertyValue', 'name': 'Product ID', 'value': str(product.id)},
+            {'@type': 'PropertyValue', 'name': 'Category', 'value': category_name or 'General'},
+            {'@type': 'PropertyValue', 'name': 'Date Listed',
+             'value': product.created_at.strftime('%Y-%m-%d') if product.created_at else ''},
+        ],
+    }
+
+
+def _list_item(product, category_name: Optional[str], images: List[str]) -> dict:
+    return {
+        '@type': 'Product',
+        'name': product.name,
+        'description': product.description[:150] if product.description else DEFAULT_DESCRIPTION,
+        'url': url_for('views.product_single', product_id=product.id, _external=True),
+        'image': images[0],
+        'brand': {'@type': 'Brand', 'name': 'Stumarcot'},
+        'category': category_name or 'Construction Materials',
+    }
+
+
+def _keywords(product, category_name: Optional[str]) -> str:
+    keywords = [product.name, category_name or 'construction materials', 'building supplies Tanzania',
+                'Stumarcot products', 'construction materials Dar es Salaam']
+    name = product.name.lower()
+    if 'block' in name:
+        keywords.append('paving blocks')
+    if 'tile' in name:
+        keywords += ['floor tiles', 'wall tiles']
+    keywords.append('quality construction products')
+    return ', '.join(keywords)
+
+
+def build(product) -> dict:
+    """The stored metadata columns for one product (images and category loaded)"""
+    category_name = product.category.name if product.category else None
+    images = _image_urls(product)
+    return {
+        'structured_data': _dumps(_structured_data(product, category_name, images)),
+        'list_item_data': _dumps(_list_item(product, category_name, images)),
+        'meta_keywords': _keywords(product, category_name),
+    }
+
+
+def refresh(product_ids: Iterable[int]) -> int:
+    """
+    Rebuild and store the metadata of the given products
+
+    Runs inside the caller's transaction; the caller commits. updated_at is
+    written back unchanged, since derived metadata is not a content change.
+    """
+    ids = sorted(set(product_ids))
+    for start in range(0, len(ids), BATCH_SIZE):
+        products = db.session.scalars(
+            select(Product)
+            .where(Product.id.in_(ids[start:start + BATCH_SIZE]))
+            .options(selectinload(Product.images), joinedload(Product.category))
+            # Set-based writes (e.g. adjust_prices) bypass loaded objects
+            .execution_options(populate_existing=True)
+        ).unique().all()
+        if products:
+            db.session.execute(
+                update(Product),
+                [dict(build(p), id=p.id, updated_at=p.updated_at) for p in products],
+            )
+    return len(ids)
+
+
+def refresh_category(category_id: int) -> int:
+    """Rebuild every product of a category, e.g. after it was renamed"""
+    return refresh(db.session.scalars(select(Product.id).where(Product.category_id == category_id)).all())
+
+
+def backfill() -> int:
+    """Fill in products that have no stored metadata yet (rows from before this existed)"""
+    ids = db.session.scalars(select(Product.id).where(Product.structured_data.is_(None))).all()
+    if ids:
+        refresh(ids)
+        db.session.commit()
+        logger.info(f"Built structured data for {len(ids)} product(s)")
+    return len(ids)
+
+
+# -- reading -------------------------------------------------------------
+
+def _stored(product) -> dict:
+    if product.structured_data is None:
+        # Not refreshed yet: build on the fly rather than render nothing
+        return build(product)
+    return {
+        'structured_data': product.structured_data,
+        'list_item_data': product.list_item_data,
+        'meta_keywords': product.meta_keywords,
+    }
+
+
+def _list_item_data(product) -> str:
+    # Listings pass read models (website.read_models) that carry only this column
+    if product.list_item_data is None:
+        if not isinstance(product, Product):
+            product = db.session.get(Product, product.id)
+        return build(product)['list_item_data']
+    return product.list_item_data
+
+
+def product_head(product) -> dict:
+    """JSON-LD script body and meta keywords for product-single"""
+    stored = _stored(product)
+    return {'structured_data': Markup(stored['structured_data']), 'keywords': stored['meta_keywords']}
+
+
+def item_list(products, category_name: Optional[str], url: str) -> Markup:
+    """ItemList JSON-LD for a listing page, joined from the stored per-product items"""
+    if category_name:
+        name = f'{category_name} Products'
+        description = f'Browse our premium {category_name} collection at Stumarcot Tanzania'
+    else:
+        name = 'All Construction Products'
+        description = "Explore Stumarcot's full range of premium construction products in Tanzania"
+    items = ','.join(
+        f'{{"@type":"ListItem","position":{position},"item":{_list_item_data(product)}}}'
+        for position, product in enumerate(products, 1)
+    )
+    head = _dumps({
+        '@context': 'https://schema.org',
+        '@type': 'ItemList',
+        'name': name,
+        'description': description,
+        'url': url,
+        'numberOfItems': str(len(products)),
+    })
+    return Markup(f'{head[:-1]},"itemListElement":[{items}]}}')
@@ -0,0 +1,228 @@
+"""
+Set-based catalog write operations
+
+Each function runs a handful of DELETE/UPDATE statements in a single
+transaction instead of loading and deleting ORM objects one by one, commits,
+and only then hands files to the background cleaner so a rollback never
+leaves rows pointing at missing files.
+"""
+
+import logging
+import os
+from collections import Counter
+from datetime import datetime
+from typing import Iterable, List
+
+from flask import current_app
+from sqlalchemy import delete, func, insert, select, update
+
+from . import db, seo
+from .changelog import DELETE, changelog
+from .models import Category, Product, ProductImage
+from .stats import category_key, file_bytes, removed_images, site_stats, uploads_key
+from .uploads import file_cleaner, generate_unique_filename
+
+logger = logging.getLogger(__name__)
+
+
+def _clean_ids(ids: Iterable) -> List[int]:
+    clean = set()
+    for value in ids:
+        try:
+            clean.add(int(value))
+        except (TypeError, ValueError):
+            continue
+    return sorted(clean)
+
+
+def unreferenced_files(filenames: Iterable[str]) -> List[str]:
+    """
+    The given upload filenames that no product image row uses any more
+
+    Rows can share one file (bulk "attach image", imports), so a file is
+    only handed to the cleaner once its last row is gone.
+    """
+    names = sorted(set(filenames))
+    if not names:
+        return []
+    still_used = set(db.session.scalars(
+        select(ProductImage.image).where(ProductImage.image.in_(names)).distinct()
+    ))
+    return [name for name in names if name not in still_used]
+
+
+def delete_products(product_ids: Iterable) -> List[int]:
+    """
+    Delete products and their image rows; returns the ids actually deleted
+
+    Image files are removed from disk by the background cleaner after the
+    transaction commits.
+    """
+    ids = _clean_ids(product_ids)
+    if not ids:
+        return []
+
+    rows = db.session.execute(select(Product.id, Product.category_id).where(Product.id.in_(ids))).all()
+    if not rows:
+        return []
+    existing = [product_id for product_id, _ in rows]
+    images = db.session.execute(
+        select(ProductImage.image, ProductImage.created_at).where(ProductImage.product_id.in_(existing))
+    ).all()
+
+    db.session.execute(
+        delete(ProductImage).where(ProductImage.product_id.in_(existing)),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.execute(
+        delete(Product).where(Product.id.in_(existing)),
+        execution_options={'synchronize_session': False}
+    )
+    removed_files = unreferenced_files(filename for filename, _ in images)
+
+    deltas = removed_images(images, removed_files)
+    deltas['products'] -= len(existing)
+    for _, category_id in rows:
+        deltas[category_key(category_id)] -= 1
+    site_stats.record(deltas)
+    changelog.record('product', existing, DELETE)
+    db.session.commit()
+
+    file_cleaner.enqueue(current_app.config['UPLOAD_FOLDER'], removed_files)
+    return existing
+
+
+def delete_category(category_id: int) -> List[int]:
+    """
+    Delete a category together with all of its products and their images
+
+    Returns the ids of the deleted products.
+    """
+    product_ids = select(Product.id).where(Product.category_id == category_id).scalar_subquery()
+
+    deleted_ids = db.session.scalars(select(Product.id).where(Product.category_id == category_id)).all()
+    images = db.session.execute(
+        select(ProductImage.image, ProductImage.created_at).where(ProductImage.product_id.in_(product_ids))
+    ).all()
+
+    db.session.execute(
+        delete(ProductImage).where(ProductImage.product_id.in_(product_ids)),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.execute(
+        delete(Product).where(Product.category_id == category_id),
+        execution_options={'synchronize_session': False}
+    )
+    deleted_categories = db.session.execute(
+        delete(Category).where(Category.id == category_id),
+        execution_options={'synchronize_session': False}
+    ).rowcount
+    removed_files = unreferenced_files(filename for filename, _ in images)
+
+    deltas = removed_images(images, removed_files)
+    deltas['categories'] -= deleted_categories
+    deltas['products'] -= len(deleted_ids)
+    site_stats.record(deltas)
+    site_stats.forget_category(category_id)
+    changelog.record('product', deleted_ids, DELETE)
+    if deleted_categories:
+        changelog.record('category', [category_id], DELETE)
+    db.session.commit()
+
+    file_cleaner.enqueue(current_app.config['UPLOAD_FOLDER'], removed_files)
+    return list(deleted_ids)
+
+
+def move_products(product_ids: Iterable, category_id: int) -> List[int]:
+    """Re-categorize products with one UPDATE; returns the ids that moved"""
+    ids = _clean_ids(product_ids)
+    if not ids:
+        return []
+
+    rows = db.session.execute(
+        select(Product.id, Product.category_id).where(Product.id.in_(ids), Product.category_id != category_id)
+    ).all()
+    moved = [product_id for product_id, _ in rows]
+    if moved:
+        db.session.execute(
+            update(Product).where(Product.id.in_(moved)).values(category_id=category_id),
+            execution_options={'synchronize_session': False}
+        )
+        deltas = Counter({category_key(category_id): len(moved)})
+        for _, old_category_id in rows:
+            deltas[category_key(old_category_id)] -= 1
+        site_stats.record(deltas)
+        changelog.record('product', moved)
+        seo.refresh(moved)
+    db.session.commit()
+    return moved
+
+
+def adjust_prices(product_ids: Iterable, percent: float) -> List[int]:
+    """
+    Change prices by `percent` (e.g. 10 or -15) with one UPDATE
+
+    Prices are rounded to cents and never drop below 0.01. Returns the ids
+    that were updated.
+    """
+    ids = _clean_ids(product_ids)
+    if not ids:
+        return []
+
+    factor = 1 + percent / 100.0
+    updated = db.session.scalars(select(Product.id).where(Product.id.in_(ids))).all()
+    if updated:
+        db.session.execute(
+            update(Product).where(Product.id.in_(updated))
+            .values(price=func.max(func.round(Product.price * factor, 2), 0.01)),
+            execution_options={'synchronize_session': False}
+        )
+        changelog.record('product', updated)
+        # The stored JSON-LD carries the price
+        seo.refresh(updated)
+    db.session.commit()
+    return list(updated)
+
+
+def attach_image(product_ids: Iterable, file_storage) -> List[int]:
+    """
+    Store one uploaded image and add it to every given product
+
+    The file is saved once and shared by all the new image rows, which are
+    inserted with a single executemany. Returns the ids it was attached to.
+    """
+    ids = _clean_ids(product_ids)
+    if not ids:
+        return []
+    existing = db.session.scalars(select(Product.id).where(Product.id.in_(ids))).all()
+    if not existing:
+        return []
+
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    filename = generate_unique_filename(file_storage.filename)
+    file_storage.save(os.path.join(upload_folder, filename))
+
+    try:
+        now = datetime.utcnow()
+        db.session.execute(
+            insert(ProductImage),
+            [{'image': filename, 'product_id': product_id, 'created_at': now} for product_id in existing]
+        )
+        site_stats.record({
+            'images': len(existing),
+            uploads_key(now.date()): len(existing),
+            'image_bytes': file_bytes([filename], upload_folder),
+        })
+        # Touch the products so incremental exports pick them up
+        db.session.execute(
+            update(Product).where(Product.id.in_(existing)).values(updated_at=now),
+            execution_options={'synchronize_session': False}
+        )
+        changelog.record('product', existing)
+        seo.refresh(existing)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        file_cleaner.enqueue(upload_folder, [filename])
+        raise
+    return list(existing)
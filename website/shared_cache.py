@@ -0,0 +1,304 @@
+"""
+Host-wide key/value cache shared by every worker process
+
+Each gunicorn worker used to keep its own copy of everything it cached, so
+N workers meant N cold caches and invalidation that only reached the worker
+that made the change. This cache lives in one SQLite file (WAL mode) in the
+instance folder: any process on the host reads what another one stored,
+and a write is visible to all of them at once. No extra service to run.
+
+Values are pickled; the file is as trusted as the database next to it.
+Entries carry a TTL and are evicted least recently used once the file
+holds more than `max_bytes` of values; a TTL of 0 keeps an entry until it
+is deleted. Every entry has a version number that cas() compares, and
+incr() is an atomic counter, which is how the caches built on top of this
+publish generations. A failing or locked
+store is treated as a miss: the cache never fails a request.
+"""
+
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    version INTEGER NOT NULL,
+    expires_at REAL,
+    accessed_at REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at);
+"""
+
+_MISSING = object()
+
+
+def _new_version() -> int:
+    # First version of a new row: a key that is deleted and stored again
+    # must not repeat a version some reader may still hold for cas()
+    return time.time_ns() // 1000
+
+
+class SharedCache:
+    """
+    SQLite-backed cache with TTL, LRU eviction and compare-and-set
+
+    One connection per thread and process (connections do not survive a
+    fork). Reads refresh an entry's LRU position at most every
+    `touch_interval` seconds so that hot keys do not turn every read into
+    a write.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_bytes: int = 128 * 1024 * 1024,
+                 default_ttl: int = 300, touch_interval: float = 5.0, busy_timeout: float = 2.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.touch_interval = touch_interval
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.conflicts = 0
+        self.evicted = 0
+        self.errors = 0
+
+    def init_app(self, app) -> None:
+        self.path = app.config.get('SHARED_CACHE_PATH') or os.path.join(app.instance_path, 'shared_cache.sqlite3')
+        self.max_bytes = app.config.get('SHARED_CACHE_MAX_BYTES', self.max_bytes)
+        self.default_ttl = app.config.get('SHARED_CACHE_TTL', self.default_ttl)
+
+        from . import metrics
+        metrics.register('shared_cache', self.stats)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    # -- connection -------------------------------------------------------
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid() and self._local.path == self.path:
+            return conn
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        # Autocommit: every statement below is atomic on its own
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                               check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(_SCHEMA)
+        self._local.conn, self._local.pid, self._local.path = conn, os.getpid(), self.path
+        return conn
+
+    def _run(self, operation: Callable[[sqlite3.Connection], Any], default=None):
+        if not self.path:
+            return default
+        try:
+            return operation(self._connection())
+        except sqlite3.Error as e:
+            with self._lock:
+                self.errors += 1
+            logger.warning(f"Shared cache unavailable ({self.path}): {str(e)}")
+            return default
+
+    def _expiry(self, ttl: Optional[int]) -> Optional[float]:
+        ttl = self.default_ttl if ttl is None else ttl
+        return time.time() + ttl if ttl else None
+
+    # -- reads ------------------------------------------------------------
+
+    def get_versioned(self, key: str) -> Tuple[Any, int]:
+        """(value, version) of a live entry, or (None, 0) when there is none"""
+        def operation(conn):
+            row = conn.execute(
+                'SELECT value, version, expires_at, accessed_at FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+            now = time.time()
+            if row is None or (row[2] is not None and row[2] <= now):
+                return _MISSING, 0
+            if row[3] < now - self.touch_interval:
+                conn.execute('UPDATE cache SET accessed_at = ? WHERE key = ?', (now, key))
+            return row[0], row[1]
+
+        blob, version = self._run(operation, (_MISSING, 0))
+        if blob is _MISSING:
+            with self._lock:
+                self.misses += 1
+            return None, 0
+        with self._lock:
+            self.hits += 1
+        return pickle.loads(blob), version
+
+    def get(self, key: str, default=None):
+        value, version = self.get_versioned(key)
+        return value if version else default
+
+    def get_or_set(self, key: str, compute: Callable[[], Any], ttl: Optional[int] = None):
+        """The cached value, or compute() stored for the other workers"""
+        value, version = self.get_versioned(key)
+        if version:
+            return value
+        value = compute()
+        self.set(key, value, ttl)
+        return value
+
+    # -- writes -----------------------------------------------------------
+
+    def set(self, key: str, value, ttl: Optional[int] = None) -> int:
+        """Store unconditionally; returns the entry's new version (0 on failure)"""
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        version = self._run(lambda conn: conn.execute(
+            'INSERT INTO cache (key, value, version, expires_at, accessed_at, size) VALUES (?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value, version = cache.version + 1, '
+            'expires_at = excluded.expires_at, accessed_at = excluded.accessed_at, size = excluded.size '
+            'RETURNING version',
+            (key, blob, _new_version(), self._expiry(ttl), now, len(blob)),
+        ).fetchone()[0], 0)
+        self._written(version)
+        return version
+
+    def add(self, key: str, value, ttl: Optional[int] = None) -> bool:
+        """Store only if there is no live entry; True if this call stored it"""
+        return self.cas(key, value, 0, ttl)
+
+    def cas(self, key: str, value, version: int, ttl: Optional[int] = None) -> bool:
+        """
+        Store only if the entry is still at `version` (from get_versioned)
+
+        Version 0 means "no live entry": an expired entry counts as absent.
+        False means another process got there first.
+        """
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        expires_at = self._expiry(ttl)
+
+        def operation(conn):
+            if version:
+                cursor = conn.execute(
+                    'UPDATE cache SET value = ?, version = version + 1, expires_at = ?, accessed_at = ?, size = ? '
+                    'WHERE key = ? AND version = ? AND (expires_at IS NULL OR expires_at > ?) RETURNING version',
+                    (blob, expires_at, now, len(blob), key, version, now),
+                )
+            else:
+                cursor = conn.execute(
+                    'INSERT INTO cache (key, value, version, expires_at, accessed_at, size) VALUES (?, ?, ?, ?, ?, ?) '
+                    'ON CONFLICT (key) DO UPDATE SET value = excluded.value, version = cache.version + 1, '
+                    'expires_at = excluded.expires_at, accessed_at = excluded.accessed_at, size = excluded.size '
+                    'WHERE cache.expires_at IS NOT NULL AND cache.expires_at <= ? RETURNING version',
+                    (key, blob, _new_version(), expires_at, now, len(blob), now),
+                )
+            row = cursor.fetchone()
+            return row[0] if row else 0
+
+        new_version = self._run(operation, 0)
+        if not new_version:
+            with self._lock:
+                self.conflicts += 1
+            return False
+        self._written(new_version)
+        return True
+
+    def incr(self, key: str, delta: int = 1) -> int:
+        """Atomically add `delta` to an integer entry (created at 0, kept until deleted)"""
+        def operation(conn):
+            # Holds the write lock from the read to the write
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute('SELECT value FROM cache WHERE key = ?', (key,)).fetchone()
+                value = (pickle.loads(row[0]) if row else 0) + delta
+                blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+                conn.execute(
+                    'INSERT INTO cache (key, value, version, expires_at, accessed_at, size) '
+                    'VALUES (?, ?, ?, NULL, ?, ?) '
+                    'ON CONFLICT (key) DO UPDATE SET value = excluded.value, version = cache.version + 1, '
+                    'expires_at = NULL, accessed_at = excluded.accessed_at, size = excluded.size',
+                    (key, blob, _new_version(), time.time(), len(blob)),
+                )
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            return value
+
+        return self._run(operation, 0)
+
+    def delete(self, key: str) -> None:
+        self._run(lambda conn: conn.execute('DELETE FROM cache WHERE key = ?', (key,)))
+
+    def clear(self) -> None:
+        self._run(lambda conn: conn.execute('DELETE FROM cache'))
+
+    # -- eviction ---------------------------------------------------------
+
+    def _written(self, version: int) -> None:
+        if not version:
+            return
+        with self._lock:
+            self.writes += 1
+            self._writes_since_evict += 1
+            due = self._writes_since_evict >= 64
+            if due:
+                self._writes_since_evict = 0
+        if due:
+            self.evict()
+
+    def evict(self) -> int:
+        """Drop expired entries, then the least recently used ones over the byte budget"""
+        def operation(conn):
+            removed = conn.execute('DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?',
+                                   (time.time(),)).rowcount
+            total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM cache').fetchone()[0]
+            if total > self.max_bytes:
+                # Down to 90% of the budget, so eviction does not run on every write
+                excess = total - int(self.max_bytes * 0.9)
+                keys = []
+                # Entries without a TTL (counters, generations) are never evicted
+                for key, size in conn.execute(
+                        'SELECT key, size FROM cache WHERE expires_at IS NOT NULL ORDER BY accessed_at'):
+                    keys.append((key,))
+                    excess -= size
+                    if excess <= 0:
+                        break
+                conn.executemany('DELETE FROM cache WHERE key = ?', keys)
+                removed += len(keys)
+            return removed
+
+        removed = self._run(operation, 0)
+        if removed:
+            with self._lock:
+                self.evicted += removed
+        return removed
+
+    def stats(self) -> dict:
+        entries, size = self._run(
+            lambda conn: conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache').fetchone(), (None, None)
+        )
+        return {
+            'path': self.path,
+            'entries': entries,
+            'bytes': size,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'writes': self.writes,
+            'cas_conflicts': self.conflicts,
+            'evicted': self.evicted,
+            'errors': self.errors,
+        }
+
+
+# Create a global instance
+shared_cache = SharedCache()
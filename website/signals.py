@@ -0,0 +1,19 @@
+from blinker import Namespace
+
+_signals = Namespace()
+
+# Sent after a catalog write has been committed.
+#
+# sender: the Flask application
+# entity: 'product', 'category' or 'job'
+# action: 'add', 'update' or 'delete'
+# ids:    list of affected primary keys
+#
+# In-process structures (search index, caches) subscribe to this instead of
+# every view having to know about each of them.
+catalog_changed = _signals.signal('catalog-changed')
+
+
+def notify_catalog_change(app, entity, action, ids):
+    """Broadcast a committed catalog change to all subscribers"""
+    catalog_changed.send(app, entity=entity, action=action, ids=list(ids))
@@ -0,0 +1,47 @@
+import os
+import subprocess
+import sys
+import time
+from typing import List, Tuple
+
+# Filled in by create_app(); reported under /admin/metrics and by
+# `flask startup-report`
+timings = {}
+
+_PROBE = (
+    "import time; t0 = time.perf_counter()\n"
+    "from website import create_app\n"
+    "t1 = time.perf_counter()\n"
+    "create_app()\n"
+    "t2 = time.perf_counter()\n"
+    "print(f'{(t1 - t0) * 1000:.1f} {(t2 - t1) * 1000:.1f}')\n"
+)
+
+
+def record(name: str, started: float) -> None:
+    """Store the milliseconds elapsed since `started` (a perf_counter value)"""
+    timings[name] = round((time.perf_counter() - started) * 1000, 2)
+
+
+def measure_cold_start(project_root: str) -> Tuple[float, float, List[Tuple[str, float, float]]]:
+    """
+    Import and create the app in a fresh interpreter with -X importtime
+
+    Returns (import_ms, create_app_ms, modules) where modules is a list of
+    (module, self_ms, cumulative_ms) sorted by cumulative time.
+    """
+    env = dict(os.environ, PYTHONPATH=project_root)
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _PROBE],
+        cwd=project_root, env=env, capture_output=True, text=True, check=True
+    )
+    import_ms, create_ms = (float(v) for v in proc.stdout.split()[-2:])
+
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append((name.strip(), int(self_us) / 1000, int(cumulative_us) / 1000))
+    modules.sort(key=lambda m: m[2], reverse=True)
+    return import_ms, create_ms, modules
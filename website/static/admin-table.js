@@ -0,0 +1,127 @@
+/* ==========================================================================
+   Server-side paged admin tables
+   Sorting, filtering and paging fetch the next page from the table's JSON
+   endpoint and re-render the rows in place. The links and the filter form
+   still work as plain page loads when JavaScript is unavailable.
+   ========================================================================== */
+(function () {
+    function escapeHtml(value) {
+        return String(value == null ? '' : value)
+            .replace(/&/g, '&amp;')
+            .replace(/</g, '&lt;')
+            .replace(/>/g, '&gt;')
+            .replace(/"/g, '&quot;')
+            .replace(/'/g, '&#39;');
+    }
+
+    function formatDate(iso) {
+        if (!iso) return '';
+        var date = new Date(iso);
+        return date.toLocaleDateString('en-GB', { day: '2-digit', month: 'short', year: 'numeric' });
+    }
+
+    function AdminTable(root, renderRow) {
+        var endpoint = root.getAttribute('data-endpoint');
+        var tbody = root.querySelector('tbody');
+        var params = new URLSearchParams(window.location.search);
+
+        // The server marks the column the first page was sorted by
+        var sorted = root.querySelector('[data-sort].is-sorted');
+        if (sorted && !params.get('sort')) {
+            params.set('sort', sorted.getAttribute('data-sort'));
+            params.set('dir', sorted.getAttribute('data-dir'));
+        }
+
+        function update(data) {
+            document.querySelectorAll('[data-table-total]').forEach(function (el) {
+                el.textContent = data.total;
+            });
+            root.querySelectorAll('[data-table-pageinfo]').forEach(function (el) {
+                el.textContent = 'Page ' + data.page + ' of ' + data.pages;
+            });
+            root.querySelectorAll('[data-page]').forEach(function (el) {
+                var target = el.getAttribute('data-page') === 'prev' ? data.page - 1 : data.page + 1;
+                el.style.visibility = target >= 1 && target <= data.pages ? '' : 'hidden';
+            });
+            root.querySelectorAll('[data-sort]').forEach(function (el) {
+                var active = el.getAttribute('data-sort') === data.sort;
+                el.classList.toggle('is-sorted', active);
+                el.setAttribute('data-dir', active ? data.dir : '');
+            });
+        }
+
+        function load(push) {
+            root.classList.add('is-loading');
+            fetch(endpoint + '?' + params.toString(), {
+                headers: { 'Accept': 'application/json' },
+                credentials: 'same-origin'
+            })
+                .then(function (response) {
+                    if (!response.ok) throw new Error('HTTP ' + response.status);
+                    return response.json();
+                })
+                .then(function (data) {
+                    if (data.items.length) {
+                        tbody.innerHTML = data.items.map(renderRow).join('');
+                    } else {
+                        var columns = root.querySelectorAll('thead th').length;
+                        tbody.innerHTML = '<tr><td colspan="' + columns + '" class="ad-table-empty">' +
+                            escapeHtml(root.getAttribute('data-empty') || 'Nothing found.') + '</td></tr>';
+                    }
+                    params.set('page', data.page);
+                    params.set('sort', data.sort);
+                    params.set('dir', data.dir);
+                    update(data);
+                    var url = window.location.pathname + '?' + params.toString();
+                    if (push) window.history.pushState(null, '', url);
+                    root.dispatchEvent(new CustomEvent('table:loaded', { detail: data }));
+                })
+                .catch(function () {
+                    // Fall back to a normal page load
+                    window.location.search = params.toString();
+                })
+                .finally(function () {
+                    root.classList.remove('is-loading');
+                });
+        }
+
+        root.addEventListener('click', function (event) {
+            var link = event.target.closest('[data-sort], [data-page]');
+            if (!link || !root.contains(link)) return;
+            event.preventDefault();
+
+            if (link.hasAttribute('data-sort')) {
+                var sort = link.getAttribute('data-sort');
+                var dir = params.get('sort') === sort && params.get('dir') === 'asc' ? 'desc' : 'asc';
+                params.set('sort', sort);
+                params.set('dir', dir);
+                params.set('page', 1);
+            } else {
+                var page = parseInt(params.get('page') || '1', 10);
+                params.set('page', link.getAttribute('data-page') === 'prev' ? page - 1 : page + 1);
+            }
+            load(true);
+        });
+
+        var filters = root.querySelector('form[data-table-filter]');
+        if (filters) {
+            filters.addEventListener('submit', function (event) {
+                event.preventDefault();
+                new FormData(filters).forEach(function (value, key) {
+                    if (value) params.set(key, value); else params.delete(key);
+                });
+                params.set('page', 1);
+                load(true);
+            });
+        }
+
+        window.addEventListener('popstate', function () {
+            params = new URLSearchParams(window.location.search);
+            load(false);
+        });
+    }
+
+    AdminTable.escape = escapeHtml;
+    AdminTable.formatDate = formatDate;
+    window.AdminTable = AdminTable;
+})();
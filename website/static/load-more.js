@@ -0,0 +1,47 @@
+/* ==========================================================================
+   Incremental "Load more" for paged card grids
+   A [data-load-more] link fetches the next HTML fragment from its endpoint
+   (?after=<cursor>) and appends it to its data-target. The response's
+   X-Next-After header carries the following cursor; without it the link
+   goes away. Without JavaScript the link is a plain next-page load.
+   ========================================================================== */
+(function () {
+    document.addEventListener('click', function (event) {
+        var link = event.target.closest('[data-load-more]');
+        if (!link) return;
+        event.preventDefault();
+        if (link.classList.contains('is-loading')) return;
+
+        var target = document.querySelector(link.getAttribute('data-target'));
+        var endpoint = link.getAttribute('data-load-more') + '?after=' +
+            encodeURIComponent(link.getAttribute('data-after'));
+        link.classList.add('is-loading');
+
+        fetch(endpoint, { headers: { 'Accept': 'text/html' }, credentials: 'same-origin' })
+            .then(function (response) {
+                if (!response.ok) throw new Error('HTTP ' + response.status);
+                var next = response.headers.get('X-Next-After');
+                return response.text().then(function (html) {
+                    return { html: html, next: next };
+                });
+            })
+            .then(function (page) {
+                target.insertAdjacentHTML('beforeend', page.html);
+                if (page.next) {
+                    var url = new URL(link.href, window.location.href);
+                    url.searchParams.set('after', page.next);
+                    link.href = url.toString();
+                    link.setAttribute('data-after', page.next);
+                } else {
+                    link.parentNode.removeChild(link);
+                }
+            })
+            .catch(function () {
+                // Fall back to a normal page load
+                window.location.href = link.href;
+            })
+            .finally(function () {
+                link.classList.remove('is-loading');
+            });
+    });
+})();
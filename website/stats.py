@@ -0,0 +1,267 @@
+"""
+Dashboard statistics maintained at write time
+
+Counters live in the catalog_stat table as (name, value) rows and are
+adjusted in the same transaction as the write that changes them:
+
+* ORM writes (add/edit/delete views, sign-up, jobs) are picked up by an
+  after_flush listener that diffs the session's new/deleted/dirty objects.
+* Set-based writes that bypass the ORM unit of work (website.services, the
+  importer) call site_stats.record() with their own deltas.
+
+Reading the dashboard is then a single scan of a table with a handful of
+rows instead of several COUNT(*) queries over the catalog. Per-day upload
+counters are kept for the STATS_UPLOAD_DAYS the dashboard shows: writes
+that touch them also delete the days that fell out of that window.
+`flask stats-rebuild` recomputes everything from scratch if they drift.
+"""
+
+import logging
+import os
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from flask import current_app, has_app_context
+from sqlalchemy import delete, event, func, inspect, or_, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from . import db
+from .models import CatalogStat, Category, JobPosting, Product, ProductImage, User
+
+logger = logging.getLogger(__name__)
+
+# Plain totals; per-category and per-day counters use the prefixes below
+TOTALS = ('users', 'categories', 'products', 'jobs', 'images', 'image_bytes')
+CATEGORY_PREFIX = 'category:'
+UPLOADS_PREFIX = 'uploads:'
+
+
+def category_key(category_id: int) -> str:
+    return f'{CATEGORY_PREFIX}{category_id}'
+
+
+def uploads_key(day: date) -> str:
+    return f'{UPLOADS_PREFIX}{day.isoformat()}'
+
+
+def _upsert(deltas: Dict[str, int]):
+    """Statement and parameters adding `deltas` to the stored counters"""
+    rows = [{'name': name, 'value': value} for name, value in deltas.items() if value]
+    stmt = sqlite_insert(CatalogStat)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CatalogStat.name],
+        set_={'value': CatalogStat.value + stmt.excluded.value}
+    )
+    return stmt, rows
+
+
+def file_bytes(filenames: Iterable[str], upload_folder: Optional[str] = None) -> int:
+    """Total size of uploaded files that still exist on disk"""
+    if upload_folder is None and not has_app_context():
+        return 0
+    folder = upload_folder or current_app.config['UPLOAD_FOLDER']
+    total = 0
+    for name in filenames:
+        try:
+            total += os.path.getsize(os.path.join(folder, name))
+        except OSError:
+            continue
+    return total
+
+
+def removed_images(images: Iterable[Tuple[str, Optional[datetime]]], removed_files: Iterable[str]) -> Counter:
+    """
+    Counter deltas for deleting (filename, created_at) image rows
+
+    Several rows can share one file (bulk "attach image", imports), so disk
+    usage only drops by the files in `removed_files` that no row uses any more.
+    """
+    deltas = Counter()
+    for _, created_at in images:
+        deltas['images'] -= 1
+        if created_at:
+            deltas[uploads_key(created_at.date())] -= 1
+    deltas['image_bytes'] -= file_bytes(removed_files)
+    return deltas
+
+
+class SiteStats:
+    """Write-time counters for the admin and user dashboards"""
+
+    def __init__(self, upload_days: int = 14):
+        self.upload_days = upload_days
+        self._listening = False
+
+    def init_app(self, app) -> None:
+        self.upload_days = app.config.get('STATS_UPLOAD_DAYS', self.upload_days)
+        if not self._listening:
+            event.listen(db.session, 'after_flush', self._after_flush)
+            self._listening = True
+
+    def _window_start(self) -> date:
+        """First day of the uploads-per-day window"""
+        return datetime.utcnow().date() - timedelta(days=self.upload_days - 1)
+
+    def _bounded(self, deltas: Dict[str, int]):
+        """
+        `deltas` without per-day counters older than the window, and the
+        statement deleting those days' rows (None if no day is touched)
+        """
+        if not any(name.startswith(UPLOADS_PREFIX) for name in deltas):
+            return deltas, None
+        since = uploads_key(self._window_start())
+        # Deleting an old image must not bring its day's row back
+        kept = {name: value for name, value in deltas.items()
+                if not (name.startswith(UPLOADS_PREFIX) and name < since)}
+        # A range over the name index: prefix <= name < first day kept
+        prune = delete(CatalogStat).where(CatalogStat.name >= UPLOADS_PREFIX, CatalogStat.name < since)
+        return kept, prune
+
+    def record(self, deltas: Dict[str, int]) -> None:
+        """
+        Add `deltas` to the stored counters inside the current transaction
+
+        Uses an upsert so concurrent workers never lose an increment.
+        """
+        deltas, prune = self._bounded(deltas)
+        if prune is not None:
+            db.session.execute(prune)
+        stmt, rows = _upsert(deltas)
+        if rows:
+            db.session.execute(stmt, rows)
+
+    def count(self, name: str) -> int:
+        """One counter, e.g. count(category_key(id)), from a primary-key lookup"""
+        return db.session.scalar(select(CatalogStat.value).where(CatalogStat.name == name)) or 0
+
+    def forget_category(self, category_id: int) -> None:
+        db.session.execute(delete(CatalogStat).where(CatalogStat.name == category_key(category_id)))
+
+    def _after_flush(self, session, flush_context) -> None:
+        deltas = Counter()
+        new_files = set()
+
+        for obj in session.new:
+            if isinstance(obj, User):
+                deltas['users'] += 1
+            elif isinstance(obj, Category):
+                deltas['categories'] += 1
+            elif isinstance(obj, JobPosting):
+                deltas['jobs'] += 1
+            elif isinstance(obj, Product):
+                deltas['products'] += 1
+                deltas[category_key(obj.category_id)] += 1
+            elif isinstance(obj, ProductImage):
+                deltas['images'] += 1
+                deltas[uploads_key((obj.created_at or datetime.utcnow()).date())] += 1
+                new_files.add(obj.image)
+
+        if new_files:
+            # Disk usage only grows by files no earlier row uses (rows of
+            # this flush are already written, hence the id filter)
+            new_ids = [obj.id for obj in session.new if isinstance(obj, ProductImage)]
+            shared = set(session.connection().scalars(
+                select(ProductImage.image).where(ProductImage.image.in_(new_files), ProductImage.id.not_in(new_ids))
+            ))
+            deltas['image_bytes'] += file_bytes(new_files - shared)
+
+        for obj in session.deleted:
+            if isinstance(obj, User):
+                deltas['users'] -= 1
+            elif isinstance(obj, Category):
+                deltas['categories'] -= 1
+            elif isinstance(obj, JobPosting):
+                deltas['jobs'] -= 1
+            elif isinstance(obj, Product):
+                deltas['products'] -= 1
+                deltas[category_key(obj.category_id)] -= 1
+            elif isinstance(obj, ProductImage):
+                # Files are removed after commit, so they can still be sized here
+                still_used = session.connection().scalar(
+                    select(ProductImage.id).where(ProductImage.image == obj.image).limit(1)
+                )
+                deltas.update(removed_images([(obj.image, obj.created_at)], [] if still_used else [obj.image]))
+
+        for obj in session.dirty:
+            if isinstance(obj, Product):
+                history = inspect(obj).attrs.category_id.history
+                if history.deleted and history.added:
+                    deltas[category_key(history.deleted[0])] -= 1
+                    deltas[category_key(history.added[0])] += 1
+
+        deltas, prune = self._bounded(deltas)
+        if prune is not None:
+            session.connection().execute(prune)
+        stmt, rows = _upsert(deltas)
+        if rows:
+            # Same connection, so the counters commit or roll back with the flush
+            session.connection().execute(stmt, rows)
+
+    def snapshot(self) -> dict:
+        """All dashboard counters from one small-table read"""
+        start = self._window_start()
+        since = uploads_key(start)
+        rows = db.session.execute(
+            select(CatalogStat.name, CatalogStat.value).where(or_(
+                ~CatalogStat.name.startswith(UPLOADS_PREFIX),
+                CatalogStat.name >= since,
+            ))
+        ).all()
+
+        snapshot = {name: 0 for name in TOTALS}
+        per_category, uploads = {}, {}
+        for name, value in rows:
+            if name.startswith(CATEGORY_PREFIX):
+                per_category[int(name[len(CATEGORY_PREFIX):])] = value
+            elif name.startswith(UPLOADS_PREFIX):
+                uploads[name[len(UPLOADS_PREFIX):]] = value
+            else:
+                snapshot[name] = value
+
+        days = [(start + timedelta(days=i)).isoformat() for i in range(self.upload_days)]
+        snapshot['products_per_category'] = per_category
+        snapshot['uploads_per_day'] = [(day, uploads.get(day, 0)) for day in days]
+        return snapshot
+
+    def rebuild(self) -> dict:
+        """Recompute every counter from the catalog tables and commit"""
+        deltas = {
+            'users': db.session.scalar(select(func.count(User.id))),
+            'categories': db.session.scalar(select(func.count(Category.id))),
+            'products': db.session.scalar(select(func.count(Product.id))),
+            'jobs': db.session.scalar(select(func.count(JobPosting.id))),
+            'images': db.session.scalar(select(func.count(ProductImage.id))),
+        }
+        for category_id, count in db.session.execute(
+            select(Product.category_id, func.count(Product.id)).group_by(Product.category_id)
+        ):
+            deltas[category_key(category_id)] = count
+        start = datetime.combine(self._window_start(), datetime.min.time())
+        for day, count in db.session.execute(
+            select(func.date(ProductImage.created_at), func.count(ProductImage.id))
+            .where(ProductImage.created_at >= start)
+            .group_by(func.date(ProductImage.created_at))
+        ):
+            if day:
+                deltas[f'{UPLOADS_PREFIX}{day}'] = count
+
+        deltas['image_bytes'] = 0
+        files = select(ProductImage.image).distinct().execution_options(yield_per=1000)
+        for chunk in db.session.scalars(files).partitions():
+            deltas['image_bytes'] += file_bytes(chunk)
+
+        db.session.execute(delete(CatalogStat))
+        self.record(deltas)
+        db.session.commit()
+        logger.info(f"Rebuilt {len(deltas)} dashboard counters")
+        return deltas
+
+    def ensure_built(self) -> None:
+        """Build the counters once for databases that predate them"""
+        if db.session.scalar(select(func.count()).select_from(CatalogStat)) == 0:
+            self.rebuild()
+
+
+# Create a global instance
+site_stats = SiteStats()
@@ -0,0 +1,157 @@
+"""
+Persistent Jinja bytecode cache and template timings
+
+Every worker used to compile each template from source the first time it
+rendered it (base2.html alone is ~600 lines of markup, JSON-LD and script),
+and did it again after every restart. Compiled templates are now kept as
+bytecode files in the instance folder: shared by all workers on the host,
+kept across restarts and written atomically, so concurrent workers never
+read half a file. Jinja stores a checksum of the source with each file, so
+an edited template is recompiled automatically after a deploy.
+
+`flask compile-templates` fills the cache ahead of time and reports what
+each template costs to compile; render times of real requests are kept
+per template and listed under /admin/metrics.
+"""
+
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from jinja2 import FileSystemBytecodeCache
+
+logger = logging.getLogger(__name__)
+
+
+class _BytecodeCache(FileSystemBytecodeCache):
+    """FileSystemBytecodeCache that counts how often a load found bytecode"""
+
+    def __init__(self, directory: str):
+        super().__init__(directory)
+        self.hits = 0
+        self.misses = 0
+
+    def load_bytecode(self, bucket) -> None:
+        super().load_bytecode(bucket)
+        # bucket.code stays None when the file is missing or the source changed
+        if bucket.code is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+
+class TemplateCache:
+    """Bytecode cache for the app's Jinja environment plus per-template render timings"""
+
+    def __init__(self, enabled: bool = True, directory: Optional[str] = None):
+        self.enabled = enabled
+        self.directory = directory
+        self.bytecode_cache: Optional[_BytecodeCache] = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._renders = {}
+
+    def init_app(self, app) -> None:
+        """Call before anything touches app.jinja_env"""
+        self.enabled = app.config.get('TEMPLATE_BYTECODE_CACHE', self.enabled)
+        self.directory = (app.config.get('TEMPLATE_BYTECODE_CACHE_DIR')
+                          or os.path.join(app.instance_path, 'jinja_cache'))
+        if self.enabled:
+            os.makedirs(self.directory, exist_ok=True)
+            self.bytecode_cache = _BytecodeCache(self.directory)
+            if 'jinja_env' in app.__dict__:
+                app.jinja_env.bytecode_cache = self.bytecode_cache
+            else:
+                app.jinja_options = {**app.jinja_options, 'bytecode_cache': self.bytecode_cache}
+
+        from flask import before_render_template, template_rendered
+        before_render_template.connect(self._before_render, app, weak=False)
+        template_rendered.connect(self._rendered, app, weak=False)
+
+        from . import metrics
+        metrics.register('templates', self.stats)
+
+    # -- render timings ---------------------------------------------------
+
+    def _before_render(self, app, template, context, **kwargs) -> None:
+        started = getattr(self._local, 'started', None)
+        if started is None:
+            started = self._local.started = {}
+        started[template.name] = time.perf_counter()
+
+    def _rendered(self, app, template, context, **kwargs) -> None:
+        # Streamed templates report once the last chunk was generated
+        started = getattr(self._local, 'started', {}).pop(template.name, None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            count, total, slowest = self._renders.get(template.name, (0, 0.0, 0.0))
+            self._renders[template.name] = (count + 1, total + elapsed, max(slowest, elapsed))
+
+    def render_timings(self) -> List[Tuple[str, int, float, float]]:
+        """(template, renders, average ms, max ms), most total time first"""
+        with self._lock:
+            rows = list(self._renders.items())
+        rows.sort(key=lambda item: item[1][1], reverse=True)
+        return [(name, count, round(total / count * 1000, 2), round(slowest * 1000, 2))
+                for name, (count, total, slowest) in rows]
+
+    # -- ahead-of-time compilation ----------------------------------------
+
+    def clear(self) -> None:
+        if self.directory and os.path.isdir(self.directory):
+            shutil.rmtree(self.directory)
+            os.makedirs(self.directory, exist_ok=True)
+
+    def compile_all(self, app) -> List[Tuple[str, float, float, Optional[str]]]:
+        """
+        Compile every template into the bytecode cache
+
+        Returns (template, compile ms from source, load ms through the
+        cache, error) per template, slowest compile first.
+        """
+        env = app.jinja_env
+        results = []
+        for name in env.list_templates():
+            try:
+                source, filename, _ = env.loader.get_source(env, name)
+                started = time.perf_counter()
+                env.compile(source, name, filename)
+                compile_ms = (time.perf_counter() - started) * 1000
+
+                # Through the loader: writes the bytecode file if it is missing
+                # or stale, then reads it back as a worker would
+                env.loader.load(env, name, env.make_globals(None))
+                started = time.perf_counter()
+                env.loader.load(env, name, env.make_globals(None))
+                load_ms = (time.perf_counter() - started) * 1000
+                results.append((name, round(compile_ms, 2), round(load_ms, 2), None))
+            except Exception as e:
+                logger.warning(f"Template {name} failed to compile: {str(e)}")
+                results.append((name, 0.0, 0.0, str(e)))
+        results.sort(key=lambda r: r[1], reverse=True)
+        return results
+
+    def stats(self) -> dict:
+        cache = self.bytecode_cache
+        files = None
+        if cache is not None and os.path.isdir(self.directory):
+            files = sum(1 for f in os.listdir(self.directory) if f.endswith('.cache'))
+        return {
+            'bytecode_cache': self.directory if cache is not None else None,
+            'bytecode_files': files,
+            'bytecode_hits': cache.hits if cache is not None else None,
+            'bytecode_misses': cache.misses if cache is not None else None,
+            'renders': [
+                {'template': name, 'count': count, 'avg_ms': avg_ms, 'max_ms': max_ms}
+                for name, count, avg_ms, max_ms in self.render_timings()[:20]
+            ],
+        }
+
+
+# Create a global instance
+template_cache = TemplateCache()
@@ -0,0 +1,92 @@
+import logging
+import os
+import queue
+import threading
+import uuid
+from datetime import datetime
+from typing import Iterable
+from werkzeug.utils import secure_filename
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'avif'}
+
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+def generate_unique_filename(original_filename):
+    """Generate a unique filename to prevent overwrites"""
+    if not original_filename:
+        return None
+    
+    # Get the file extension
+    filename = secure_filename(original_filename)
+    name, ext = os.path.splitext(filename)
+    
+    # Generate unique filename using timestamp and UUID
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    unique_id = str(uuid.uuid4())[:8]  # First 8 characters of UUID
+    
+    # Create new filename: originalname_timestamp_uniqueid.ext
+    unique_filename = f"{name}_{timestamp}_{unique_id}{ext}"
+    
+    return unique_filename
+
+
+class FileCleaner:
+    """
+    Background remover for uploaded files
+
+    Requests queue the files of deleted rows here after their transaction
+    has committed, and a single daemon thread unlinks them, so deleting
+    hundreds of products never waits on the filesystem.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.removed = 0
+        self.failed = 0
+
+    def _run(self):
+        while True:
+            path = self._queue.get()
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+                    self.removed += 1
+            except OSError as e:
+                self.failed += 1
+                logger.error(f"Could not remove upload {path}: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='file-cleaner', daemon=True)
+                self._thread.start()
+
+    def enqueue(self, upload_folder: str, filenames: Iterable[str]) -> int:
+        """Queue files (relative to the upload folder) for removal"""
+        count = 0
+        for filename in filenames:
+            if filename:
+                self._queue.put(os.path.join(upload_folder, filename))
+                count += 1
+        if count:
+            self._ensure_started()
+        return count
+
+    def drain(self) -> None:
+        """Block until every queued file has been handled"""
+        if self._thread is not None:
+            self._queue.join()
+
+    def stats(self) -> dict:
+        return {'pending': self._queue.qsize(), 'removed': self.removed, 'failed': self.failed}
+
+
+# Create a global instance
+file_cleaner = FileCleaner()
@@ -0,0 +1,98 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from sqlalchemy.orm import make_transient_to_detached
+
+from . import db
+from .models import User
+
+
+class UserCache:
+    """
+    Short-lived, size-bounded cache of the logged-in user's row
+
+    Flask-Login calls the user loader on every request that touches
+    current_user. Instead of a SELECT each time, the user's column values
+    are cached per worker for `ttl` seconds and re-attached to the request's
+    session as a detached instance, which costs no SQL but still supports
+    lazy relationships. sign_up and delete_user invalidate entries; the short
+    TTL bounds how long other workers can serve a stale copy.
+    """
+
+    def __init__(self, ttl: int = 30, max_size: int = 1024):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app) -> None:
+        self.ttl = app.config.get('USER_CACHE_TTL', self.ttl)
+        self.max_size = app.config.get('USER_CACHE_SIZE', self.max_size)
+
+        from . import metrics
+        metrics.register('user_cache', self.stats)
+
+    def _get(self, user_id: int) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires, values = entry
+            if expires < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return values
+
+    def _put(self, user_id: int, values: dict) -> None:
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, values)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: Optional[int] = None) -> None:
+        """Drop one user, or every user when no id is given"""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def load(self, user_id: int) -> Optional[User]:
+        """Return the user attached to the current session, or None"""
+        session = db.session()
+        key = session.identity_key(User, user_id)
+        if key in session.identity_map:
+            return session.identity_map[key]
+
+        values = self._get(user_id) if self.ttl else None
+        if values is None:
+            self.misses += 1
+            user = session.get(User, user_id)
+            if user is not None and self.ttl:
+                self._put(user_id, {c.key: getattr(user, c.key) for c in User.__table__.columns})
+            return user
+
+        self.hits += 1
+        user = User(**values)
+        make_transient_to_detached(user)
+        session.add(user)
+        return user
+
+    def stats(self) -> dict:
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+# Create a global instance
+user_cache = UserCache()
@@ -1,9 +1,19 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app, Response, session
+from flask import Blueprint, render_template, stream_template, request, flash, redirect, url_for, current_app, Response, jsonify, stream_with_context, abort, get_flashed_messages
 from flask_login import login_required, current_user
 from .models import User, Category, Product, ProductImage, JobPosting
-from . import db
+from . import db, metrics
 from .indexnow_service import indexnow_service
+from .search_index import search_index
+from .user_cache import user_cache
+from .signals import notify_catalog_change
+from .stats import site_stats
+from .jobs import active_jobs
+from .uploads import allowed_file, generate_unique_filename, file_cleaner
+from . import services, seo
+from .admin_tables import product_page, product_row_json, user_page, user_row_json
+from .catalog import catalog
 import os
+import time
 import uuid
 from datetime import datetime
 from werkzeug.utils import secure_filename
@@ -11,31 +21,52 @@ from sqlalchemy.sql.expression import func
 import random
 from sqlalchemy import func
 from sqlalchemy.types import String
+from sqlalchemy import select
+from markupsafe import escape
+from sqlalchemy.orm import joinedload, selectinload
 
 views = Blueprint('views', __name__)
 
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'avif'}
+def catalog_changed(entity, action, *ids):
+    """Tell in-process subscribers (search index, caches) about a committed write"""
+    notify_catalog_change(current_app._get_current_object(), entity, action, ids)
 
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+# Rows fetched per round trip by the streamed pages
+STREAM_BATCH = 500
 
-def generate_unique_filename(original_filename):
-    """Generate a unique filename to prevent overwrites"""
-    if not original_filename:
-        return None
-    
-    # Get the file extension
-    filename = secure_filename(original_filename)
-    name, ext = os.path.splitext(filename)
-    
-    # Generate unique filename using timestamp and UUID
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    unique_id = str(uuid.uuid4())[:8]  # First 8 characters of UUID
-    
-    # Create new filename: originalname_timestamp_uniqueid.ext
-    unique_filename = f"{name}_{timestamp}_{unique_id}{ext}"
-    
-    return unique_filename
+
+def _chunked(pieces, size=8192):
+    """Join small template output pieces into ~`size` byte chunks"""
+    buffer, length = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+def stream_rows(stmt):
+    """
+    ORM rows of `stmt`, fetched STREAM_BATCH at a time
+
+    The query runs when a streamed page first iterates it: the view's own
+    session is closed once the view returns, and the stream gets a new one.
+    """
+    yield from db.session.scalars(stmt.execution_options(yield_per=STREAM_BATCH))
+
+def stream_page(template_name, mimetype=None, **context):
+    """
+    Render `template_name` while the response is sent
+
+    Pass stream_rows() instead of lists and the page is written as the rows
+    are read, so memory does not grow with the row count. Flashed messages
+    are taken from the session now, because the session cookie is written
+    before the body is streamed.
+    """
+    get_flashed_messages()
+    return Response(_chunked(stream_template(template_name, **context)), mimetype=mimetype)
 
 def create_mock_pagination(page, per_page, total_items, total_pages=None):
     """
@@ -72,22 +103,32 @@ def create_mock_pagination(page, per_page, total_items, total_pages=None):
     
     return pagination
 
-def get_balanced_random_products(per_page=20, page=1):
+# How many earlier shuffle buckets a /products?seed= link stays valid for
+SHUFFLE_SEED_MAX_AGE = 7
+
+def shuffle_seed(requested=None):
     """
-    Get products with balanced representation from each category, with consistent pseudo-random order across pages using session seed.
+    Seed of the /products shuffle: the current rotation bucket (one per
+    PRODUCT_SHUFFLE_ROTATION seconds, by default a day), or an earlier one
+    carried in the URL so a visitor paging across a rotation keeps the
+    order they started with. The same URL always gives the same page.
     """
-    # Regenerate seed only on page 1 or if not exists
-    if page == 1 or 'product_seed' not in session:
-        session['product_seed'] = str(random.randint(0, 999999999))
-    
-    seed = session['product_seed']
+    rotation = current_app.config.get('PRODUCT_SHUFFLE_ROTATION', 86400)
+    current = int(time.time() // rotation)
+    if requested is not None and current - SHUFFLE_SEED_MAX_AGE <= requested <= current:
+        return requested
+    return current
+
+def get_balanced_random_products(per_page=20, page=1, seed=None):
+    """
+    Get products with balanced representation from each category, with consistent pseudo-random order across pages using the URL's shuffle seed.
+    """
+    if seed is None:
+        seed = shuffle_seed()
+    seed = str(seed)
     
     # Get all categories with their product counts
-    category_stats = db.session.query(
-        Category.id,
-        Category.name,
-        func.count(Product.id).label('product_count')
-    ).join(Product).group_by(Category.id, Category.name).all()
+    category_stats = catalog.category_stats()
     
     if not category_stats:
         # Fallback if no products
@@ -96,12 +137,10 @@ def get_balanced_random_products(per_page=20, page=1):
             'pagination': create_mock_pagination(page, per_page, 0)
         }
     
-    # Set seed for consistent shuffling
-    random.seed(seed)
-    
-    # Shuffle categories for fair distribution
+    # Seeded generators of our own: reseeding the module-level one would
+    # make every other random.* call in the worker predictable
     category_stats = list(category_stats)
-    random.shuffle(category_stats)
+    random.Random(seed).shuffle(category_stats)
     
     # Calculate how many products to get from each category per page
     total_categories = len(category_stats)
@@ -131,25 +170,20 @@ def get_balanced_random_products(per_page=20, page=1):
                 limit = product_count - offset
             
             # Fetch products for this category
-            category_products = Product.query.filter_by(category_id=cat_id)\
-                .order_by(Product.id)\
-                .offset(offset)\
-                .limit(limit)\
-                .all()
+            category_products = catalog.category_slice(cat_id, offset, limit)
             
             # Create deterministic order using seed and product IDs
-            random.seed(seed + str(cat_id))  # Unique seed per category
-            category_products = sorted(category_products, key=lambda p: random.random())
+            rng = random.Random(seed + str(cat_id))  # Unique seed per category
+            category_products = sorted(category_products, key=lambda p: rng.random())
             
             balanced_products.extend(category_products)
             total_available_this_page += len(category_products)
     
     # Final shuffle of mixed category products for this page
-    random.seed(seed + str(page))  # Page-specific seed for final shuffle
-    random.shuffle(balanced_products)
+    random.Random(seed + str(page)).shuffle(balanced_products)  # Page-specific seed for final shuffle
     
     # Calculate pagination info
-    total_products = sum(stat.product_count for stat in category_stats)
+    total_products = sum(product_count for _, _, product_count in category_stats)
     total_pages = (total_products + per_page - 1) // per_page
     
     return {
@@ -344,8 +378,7 @@ def get_round_robin_products(per_page=20, page=1):
 
 @views.route('/')
 def home():
-    categories = Category.query.all()
-    products = Product.query.limit(8).all()  # Show latest 8 products
+    categories = catalog.categories()
     return render_template("langingPage.html", categories=categories)
 
 
@@ -355,41 +388,53 @@ def products():
     page = request.args.get('page', 1, type=int)
     category_id = request.args.get('category', 'all', type=str)
     
-    categories = Category.query.all()
-    
-    # Base query
-    query = Product.query
+    categories = catalog.categories()
     
     # Convert category_id to integer if not 'all'
     selected_category = None
     if category_id != 'all':
         try:
             selected_category = int(category_id)
-            query = query.filter_by(category_id=selected_category)
         except ValueError:
             selected_category = None
     else:
-        # Balanced randomization when showing all categories
-        products = get_balanced_random_products(per_page=20, page=page)
+        # Balanced randomization when showing all categories; the seed
+        # travels in the pagination links instead of the session
+        requested = request.args.get('seed')
+        seed = shuffle_seed(request.args.get('seed', type=int))
+        if (requested is not None or page > 1) and requested != str(seed):
+            # One URL per page and seed: a missing, expired or malformed
+            # seed would otherwise be cached as a page of its own
+            args = request.args.to_dict()
+            args['seed'] = seed
+            return redirect(url_for('views.products', **args))
+        products = get_balanced_random_products(per_page=20, page=page, seed=seed)
         return render_template(
             "products.html",
             categories=categories,
             products=products['items'],
             pagination=products['pagination'],
-            selected_category=selected_category
+            selected_category=selected_category,
+            shuffle_seed=seed,
+            # Every seed is the same listing as far as search engines go
+            canonical_url=url_for('views.products', page=page if page > 1 else None, _external=True),
+            structured_data=seo.item_list(products['items'], None, request.url)
         )
     
     # For specific category, use regular pagination
     per_page = 15
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    pagination = catalog.paginate_category(selected_category, page=page, per_page=per_page)
     products = pagination.items
+    category_name = next((c.name for c in categories if c.id == selected_category), None)
     
     return render_template(
         "products.html",
         categories=categories,
         products=products,
         pagination=pagination,
-        selected_category=selected_category
+        selected_category=selected_category,
+        shuffle_seed=None,
+        structured_data=seo.item_list(products, category_name, request.url)
     )
 
 
@@ -471,41 +516,54 @@ def technical_support():
 
 @views.route('/product-single/<int:product_id>')
 def product_single(product_id):
-    product = Product.query.get_or_404(product_id)
-    
-    # Get random related products from the same category (excluding current product)
-    related_products = Product.query.filter(
-        Product.category_id == product.category_id,
-        Product.id != product.id
-    ).order_by(func.random()).limit(4).all()
+    product = catalog.product(product_id)
+    if product is None:
+        abort(404)
     
-    # If no products in same category, get random products from all categories
-    if not related_products:
-        related_products = Product.query.filter(
-            Product.id != product.id
-        ).order_by(func.random()).limit(4).all()
+    # Random related products from the same category (excluding the current
+    # product), else from all categories
+    related_products = catalog.related(product, 4)
     
     return render_template("product-single.html", 
                          product=product, 
-                         related_products=related_products)
+                         related_products=related_products,
+                         head=seo.product_head(product))
+
+@views.route('/search/suggest')
+def search_suggest():
+    """Typeahead suggestions served from the in-memory prefix index"""
+    query = request.args.get('q', '', type=str)[:64]
+    limit = max(1, min(request.args.get('limit', 8, type=int), 20))
+    
+    search_index.ensure_built(current_app._get_current_object())
+    results = search_index.suggest(query, limit=limit)
+    
+    for item in results['products']:
+        item['url'] = url_for('views.product_single', product_id=item['id'])
+    for item in results['categories']:
+        item['url'] = url_for('views.category_products', category_id=item['id'])
+    
+    return jsonify(query=query, **results)
 
 @views.route('/sitemap.xml')
 def sitemap():
     current_time = datetime.utcnow()
     # Only list vacancies that are actually reachable from /careers
-    jobs = JobPosting.query.filter(
-        JobPosting.is_active == True,
-        JobPosting.deadline >= current_time.date()
-    ).order_by(JobPosting.deadline.asc()).all()
-
-    sitemap_xml = render_template("sitemap.xml",
-                                categories=Category.query.all(),
-                                products=Product.query.all(),
-                                jobs=jobs,
-                                current_time=current_time,
-                                moment = current_time)
-    response = Response(sitemap_xml, mimetype='application/xml')
-    return response
+    jobs = active_jobs.listing()
+
+    snapshot = catalog.snapshot()
+    if snapshot is not None:
+        categories, products = snapshot.categories, snapshot.products
+    else:
+        categories = stream_rows(select(Category).order_by(Category.id))
+        products = stream_rows(select(Product).options(selectinload(Product.images)).order_by(Product.id))
+    return stream_page("sitemap.xml",
+                       mimetype='application/xml',
+                       categories=categories,
+                       products=products,
+                       jobs=jobs,
+                       current_time=current_time,
+                       moment=current_time)
 
 @views.route('/sitemap_index.xml')
 def sitemap_index():
@@ -530,43 +588,44 @@ def sitemap_index():
 
 @views.route('/sitemap_products.xml')
 def sitemap_products():
-    current_time = datetime.utcnow()
-    products = Product.query.all()
-    
-    sitemap_xml = f"""<?xml version="1.0" encoding="UTF-8"?>
+    def generate():
+        yield """<?xml version="1.0" encoding="UTF-8"?>
 <urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"
         xmlns:image="http://www.google.com/schemas/sitemap-image/1.1">"""
-    
-    for product in products:
-        sitemap_xml += f"""
+
+        snapshot = catalog.snapshot()
+        if snapshot is not None:
+            products = snapshot.products
+        else:
+            products = stream_rows(select(Product).options(selectinload(Product.images)).order_by(Product.id))
+        for product in products:
+            entry = f"""
     <url>
         <loc>{url_for('views.product_single', product_id=product.id, _external=True)}</loc>
         <lastmod>{product.created_at.strftime('%Y-%m-%d')}</lastmod>
         <changefreq>weekly</changefreq>
         <priority>0.9</priority>"""
-        
-        if product.images:
+
             for image in product.images:
-                sitemap_xml += f"""
+                entry += f"""
         <image:image>
             <image:loc>{url_for('static', filename='uploads/' + image.image, _external=True)}</image:loc>
-            <image:title>{product.name}</image:title>
-            <image:caption>{product.description[:200] if product.description else product.name}</image:caption>
+            <image:title>{escape(product.name)}</image:title>
+            <image:caption>{escape(product.description[:200] if product.description else product.name)}</image:caption>
         </image:image>"""
-        
-        sitemap_xml += """
+
+            yield entry + """
     </url>"""
-    
-    sitemap_xml += """
+
+        yield """
 </urlset>"""
-    
-    response = Response(sitemap_xml, mimetype='application/xml')
-    return response
+
+    return Response(_chunked(stream_with_context(generate())), mimetype='application/xml')
 
 @views.route('/sitemap_categories.xml')
 def sitemap_categories():
     current_time = datetime.utcnow()
-    categories = Category.query.all()
+    categories = catalog.categories()
     
     sitemap_xml = f"""<?xml version="1.0" encoding="UTF-8"?>
 <urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">"""
@@ -610,22 +669,70 @@ def link_tree():
 @login_required
 def dashboard():
     if current_user.is_admin:
-        total_users = User.query.count()
-        total_categories = Category.query.count()
-        total_products = Product.query.count()
-        total_jobs = JobPosting.query.count()
-        recent_products = Product.query.order_by(Product.created_at.desc()).limit(5).all()
+        # Counters are maintained at write time (see website/stats.py)
+        stats = site_stats.snapshot()
+        recent_products = Product.query.options(
+            selectinload(Product.images), joinedload(Product.category)
+        ).order_by(Product.created_at.desc()).limit(5).all()
+
+        # Names of the top counters only, from the catalog snapshot
+        top_categories = []
+        for cat_id, count in sorted(stats['products_per_category'].items(), key=lambda item: item[1], reverse=True):
+            category = catalog.category(cat_id) if count > 0 else None
+            if category is not None:
+                top_categories.append((category.name, count))
+                if len(top_categories) == 8:
+                    break
 
         return render_template("admin_dashboard.html",
                              user=current_user,
-                             total_users=total_users,
-                             total_categories=total_categories,
-                             total_products=total_products,
-                             total_jobs=total_jobs,
+                             total_users=stats['users'],
+                             total_categories=stats['categories'],
+                             total_products=stats['products'],
+                             total_jobs=stats['jobs'],
+                             total_images=stats['images'],
+                             image_bytes=stats['image_bytes'],
+                             top_categories=top_categories,
+                             uploads_per_day=stats['uploads_per_day'],
                              recent_products=recent_products)
     else:
-        user_products = Product.query.filter_by(user_id=current_user.id).all()
-        return render_template("user_dashboard.html", user=current_user, products=user_products)
+        page = request.args.get('page', 1, type=int)
+        pagination = Product.query.filter_by(user_id=current_user.id).options(
+            selectinload(Product.images), joinedload(Product.category)
+        ).order_by(Product.created_at.desc()).paginate(page=page, per_page=20, error_out=False)
+        return render_template("user_dashboard.html", user=current_user,
+                               products=pagination.items, pagination=pagination)
+
+@views.route('/admin/metrics')
+@login_required
+def admin_metrics():
+    if not current_user.is_admin:
+        flash('Access denied. Admin privileges required.', category='error')
+        return redirect(url_for('views.dashboard'))
+    
+    return jsonify(metrics.collect())
+
+@views.route('/admin/export/<entity>.<fmt>')
+@login_required
+def admin_export(entity, fmt):
+    """Stream a catalog export; ?since=<ISO timestamp> limits it to changed rows"""
+    if not current_user.is_admin:
+        flash('Access denied. Admin privileges required.', category='error')
+        return redirect(url_for('views.dashboard'))
+    
+    from .exporter import FORMATS, export_stream, parse_since
+    try:
+        since = parse_since(request.args.get('since'))
+        chunks = export_stream(entity, fmt, since)
+    except ValueError as e:
+        abort(400, description=str(e))
+    
+    filename = f"stumarcot-{entity}-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{fmt}"
+    return Response(
+        stream_with_context(chunks),
+        mimetype=FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
 
 @views.route('/about')
 def about_page():
@@ -634,11 +741,8 @@ def about_page():
 @views.route('/careers')
 def careers():
     today = datetime.utcnow().date()
-    # Only list postings that are active and still accepting applications
-    jobs = JobPosting.query.filter(
-        JobPosting.is_active == True,
-        JobPosting.deadline >= today
-    ).order_by(JobPosting.deadline.asc()).all()
+    # Active postings still accepting applications, cached until they change
+    jobs = active_jobs.listing()
     return render_template("careers.html", jobs=jobs, today=today)
 
 @views.route('/careers/<int:job_id>')
@@ -651,11 +755,30 @@ def categories():
     categories = Category.query.all()
     return render_template("categories.html", user=current_user, categories=categories)
 
+# Product cards per category page and per "Load more" fragment
+CATEGORY_PAGE_SIZE = 24
+
 @views.route('/category/<int:category_id>')
 def category_products(category_id):
-    category = Category.query.get_or_404(category_id)
-    products = Product.query.filter_by(category_id=category_id).all()
-    return render_template("category_products.html", user=current_user, category=category, products=products)
+    category = catalog.category(category_id)
+    if category is None:
+        abort(404)
+    # From the snapshot, or the counter maintained at write time: no COUNT(*)
+    product_count = catalog.product_count(category_id)
+    products, next_after = catalog.category_page(category_id, request.args.get('after', 0, type=int),
+                                                 CATEGORY_PAGE_SIZE)
+    return stream_page("category_products.html", user=current_user, category=category,
+                       products=products, product_count=product_count, next_after=next_after)
+
+@views.route('/category/<int:category_id>/cards')
+def category_cards(category_id):
+    """The next page of product cards as an HTML fragment (see load-more.js)"""
+    products, next_after = catalog.category_page(category_id, request.args.get('after', 0, type=int),
+                                                 CATEGORY_PAGE_SIZE)
+    response = Response(render_template("_product_cards.html", products=products), mimetype='text/html')
+    if next_after:
+        response.headers['X-Next-After'] = str(next_after)
+    return response
 
 @views.route('/product/<int:product_id>')
 def product_detail(product_id):
@@ -689,8 +812,80 @@ def manage_products():
         flash('Access denied. Admin privileges required.', category='error')
         return redirect(url_for('views.dashboard'))
     
-    products = Product.query.all()
-    return render_template("manage_products.html", user=current_user, products=products)
+    table = product_page(request.args)
+    categories = db.session.query(Category.id, Category.name).order_by(Category.name).all()
+    owners = db.session.query(User.id, User.username).order_by(User.username).all()
+    return stream_page("manage_products.html", user=current_user, table=table,
+                       categories=categories, owners=owners)
+
+@views.route('/manage-products/data')
+@login_required
+def manage_products_data():
+    """One page of the product table as JSON, same query arguments as the page"""
+    if not current_user.is_admin:
+        flash('Access denied. Admin privileges required.', category='error')
+        return redirect(url_for('views.dashboard'))
+    
+    table = product_page(request.args)
+    return jsonify(items=[product_row_json(row) for row in table.rows], **table.meta())
+
+@views.route('/manage-products/bulk', methods=['POST'])
+@login_required
+def bulk_products():
+    """Apply one action to every selected product in a single transaction"""
+    if not current_user.is_admin:
+        flash('Access denied. Admin privileges required.', category='error')
+        return redirect(url_for('views.dashboard'))
+    
+    action = request.form.get('action')
+    product_ids = request.form.getlist('product_ids')
+    
+    if not product_ids:
+        flash('Select at least one product.', category='error')
+    elif action == 'delete':
+        deleted = services.delete_products(product_ids)
+        if deleted:
+            catalog_changed('product', 'delete', *deleted)
+            indexnow_service.notify_product_change(None, "delete")
+        flash(f'{len(deleted)} product(s) deleted.', category='success')
+    elif action == 'move':
+        category = db.session.get(Category, request.form.get('category_id', type=int) or 0)
+        if not category:
+            flash('Choose a category to move the products to.', category='error')
+        else:
+            moved = services.move_products(product_ids, category.id)
+            if moved:
+                catalog_changed('product', 'update', *moved)
+                indexnow_service.notify_product_change(None, "update")
+            flash(f'{len(moved)} product(s) moved to {category.name}.', category='success')
+    elif action == 'price':
+        percent = request.form.get('percent', type=float)
+        if percent is None or not -90 <= percent <= 1000:
+            flash('Enter a price change between -90% and 1000%.', category='error')
+        else:
+            updated = services.adjust_prices(product_ids, percent)
+            if updated:
+                catalog_changed('product', 'update', *updated)
+                indexnow_service.notify_product_change(None, "update")
+            flash(f'{len(updated)} product price(s) changed by {percent:g}%.', category='success')
+    elif action == 'image':
+        file = request.files.get('image')
+        if not file or file.filename == '' or not allowed_file(file.filename):
+            flash('Choose a PNG, JPG, GIF or AVIF image to attach.', category='error')
+        else:
+            attached = services.attach_image(product_ids, file)
+            if attached:
+                catalog_changed('product', 'update', *attached)
+                indexnow_service.notify_product_change(None, "update")
+            flash(f'Image attached to {len(attached)} product(s).', category='success')
+    else:
+        flash('Unknown bulk action.', category='error')
+    
+    # Back to the same page, sort and filters of the table
+    return_to = request.form.get('return_to', '')
+    if not return_to.startswith(url_for('views.manage_products') + '?'):
+        return_to = url_for('views.manage_products')
+    return redirect(return_to)
 
 @views.route('/add-category', methods=['GET', 'POST'])
 @login_required
@@ -719,6 +914,8 @@ def add_category():
             db.session.add(new_category)
             db.session.commit()
             
+            catalog_changed('category', 'add', new_category.id)
+            
             # Notify IndexNow about new category
             indexnow_service.notify_category_change(new_category.id, "add")
             
@@ -761,6 +958,7 @@ def add_job():
             )
             db.session.add(new_job)
             db.session.commit()
+            catalog_changed('job', 'add', new_job.id)
             flash('Job posting added successfully!', category='success')
             return redirect(url_for('views.manage_jobs'))
 
@@ -773,8 +971,19 @@ def manage_users():
         flash('Access denied. Admin privileges required.', category='error')
         return redirect(url_for('views.dashboard'))
     
-    users = User.query.all()
-    return render_template("manage_users.html", user=current_user, users=users)
+    table = user_page(request.args)
+    return stream_page("manage_users.html", user=current_user, table=table)
+
+@views.route('/manage-users/data')
+@login_required
+def manage_users_data():
+    """One page of the user table as JSON, same query arguments as the page"""
+    if not current_user.is_admin:
+        flash('Access denied. Admin privileges required.', category='error')
+        return redirect(url_for('views.dashboard'))
+    
+    table = user_page(request.args)
+    return jsonify(items=[user_row_json(row, current_user.id) for row in table.rows], **table.meta())
 
 @views.route('/add-product', methods=['GET', 'POST'])
 @login_required
@@ -849,8 +1058,11 @@ def add_product():
                         product_image = ProductImage(image=filename, product_id=new_product.id)
                         db.session.add(product_image)
             
+            seo.refresh([new_product.id])
             db.session.commit()
             
+            catalog_changed('product', 'add', new_product.id)
+            
             # Notify IndexNow about new product
             indexnow_service.notify_product_change(new_product.id, "add")
             
@@ -873,6 +1085,7 @@ def delete_user(user_id):
     else:
         db.session.delete(user)
         db.session.commit()
+        user_cache.invalidate(user_id)
         flash('User deleted successfully!', category='success')
     
     return redirect(url_for('views.manage_users'))
@@ -901,10 +1114,16 @@ def edit_category(category_id):
         if len(name) < 1:
             flash('Category name is required.', category='error')
         else:
+            renamed = category.name != name
             category.name = name
             category.description = description
+            if renamed:
+                # The category name is part of every product's structured data
+                seo.refresh_category(category.id)
             db.session.commit()
             
+            catalog_changed('category', 'update', category.id)
+            
             # Notify IndexNow about category update
             indexnow_service.notify_category_change(category.id, "update")
             
@@ -946,6 +1165,7 @@ def edit_job(job_id):
             job.application_email = application_email
             job.is_active = is_active
             db.session.commit()
+            catalog_changed('job', 'update', job.id)
             flash('Job posting updated successfully!', category='success')
             return redirect(url_for('views.manage_jobs'))
 
@@ -1017,15 +1237,13 @@ def edit_product(product_id):
             product.available_colors = json.dumps(colors_list) if colors_list else None
             product.tags = json.dumps(tags_list) if tags_list else None
             
-            # Handle image deletions
+            # Handle image deletions; files are removed after the commit
+            removed_files = []
             if delete_images:
                 for image_id in delete_images:
                     image = ProductImage.query.get(int(image_id))
-                    if image:
-                        # Optionally, delete the file from the filesystem
-                        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], image.image)
-                        if os.path.exists(file_path):
-                            os.remove(file_path)
+                    if image and image.product_id == product.id:
+                        removed_files.append(image.image)
                         db.session.delete(image)
             
             # Handle new image uploads
@@ -1038,7 +1256,11 @@ def edit_product(product_id):
                         product_image = ProductImage(image=filename, product_id=product.id)
                         db.session.add(product_image)
             
+            seo.refresh([product.id])
             db.session.commit()
+            file_cleaner.enqueue(current_app.config['UPLOAD_FOLDER'], services.unreferenced_files(removed_files))
+            
+            catalog_changed('product', 'update', product.id)
             
             # Notify IndexNow about product update
             indexnow_service.notify_product_change(product.id, "update")
@@ -1061,14 +1283,11 @@ def delete_category(category_id):
     # Store category ID before deletion for IndexNow notification
     category_id_for_notification = category.id
     
-    # Delete all products in this category first
-    if category.products:
-        for product in category.products:
-            db.session.delete(product)
+    # Products, their images and the category go in one set-based transaction
+    deleted_product_ids = services.delete_category(category.id)
     
-    # Now delete the category
-    db.session.delete(category)
-    db.session.commit()
+    catalog_changed('product', 'delete', *deleted_product_ids)
+    catalog_changed('category', 'delete', category_id_for_notification)
     
     # Notify IndexNow about category deletion
     indexnow_service.notify_category_change(category_id_for_notification, "delete")
@@ -1087,6 +1306,7 @@ def delete_job(job_id):
     job = JobPosting.query.get_or_404(job_id)
     db.session.delete(job)
     db.session.commit()
+    catalog_changed('job', 'delete', job_id)
 
     flash('Job posting deleted successfully!', category='success')
 
@@ -1102,17 +1322,13 @@ def delete_product(product_id):
         flash('Access denied.', category='error')
         return redirect(url_for('views.dashboard'))
     
-    # Delete associated images from filesystem
-    for image in product.images:
-        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], image.image)
-        if os.path.exists(file_path):
-            os.remove(file_path)
-    
     # Store product ID before deletion for IndexNow notification
     product_id = product.id
     
-    db.session.delete(product)
-    db.session.commit()
+    # Image files are removed by the background cleaner once this commits
+    services.delete_products([product_id])
+    
+    catalog_changed('product', 'delete', product_id)
     
     # Notify IndexNow about product deletion
     indexnow_service.notify_product_change(product_id, "delete")
@@ -1141,6 +1357,7 @@ Allow: /link-tree
 
 # Disallow admin and private areas
 Disallow: /admin/
+Disallow: /api/
 Disallow: /dashboard
 Disallow: /manage-categories
 Disallow: /manage-products
@@ -1158,6 +1375,7 @@ Disallow: /delete-product/
 Disallow: /delete-job/
 Disallow: /login
 Disallow: /sign-up
+Disallow: /search/
 
 # Bing-specific directives
 User-agent: BingBot
@@ -0,0 +1,167 @@
+"""
+Warm-up after a deploy or when a worker starts
+
+A restarted worker starts with nothing compiled, built or cached: the first
+visitors wait for Jinja to compile templates, SQLite to read pages from
+disk, the catalog snapshot and search index to build and every page to
+render. warm_up() does all of that up front:
+
+1. compile every template into the Jinja environment's cache
+2. read the hot tables once, so their pages are in the OS page cache
+3. build the in-process read caches (catalog snapshot, search index,
+   open job postings)
+4. request the top pages without cookies, once per response encoding, so
+   the response cache (and the host-wide shared cache behind it) holds
+   them already
+
+`flask warmup` runs it from the deploy script; WARMUP_ON_BOOT runs it in
+every gunicorn worker before it takes requests (see gunicorn.conf.py).
+"""
+
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import select
+
+from . import db, startup
+from .models import CatalogStat, Category, JobPosting, Product, ProductImage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGES = (
+    '/',
+    '/products',
+    '/categories',
+    '/careers',
+    '/sitemap.xml',
+    '/sitemap_index.xml',
+    '/sitemap_products.xml',
+    '/sitemap_categories.xml',
+    '/robots.txt',
+)
+
+# Read by nearly every public page
+HOT_TABLES = (Category, Product, ProductImage, JobPosting, CatalogStat)
+
+
+@dataclass
+class WarmupReport:
+    steps: List[Tuple[str, float, str]] = field(default_factory=list)
+    pages: List[Tuple[str, str, int, Optional[str], float]] = field(default_factory=list)
+    total_ms: float = 0.0
+
+    def step(self, name: str, started: float, detail: str = '') -> None:
+        self.steps.append((name, round((time.perf_counter() - started) * 1000, 1), detail))
+
+    def lines(self) -> List[str]:
+        lines = [f'{name:<16} {ms:9.1f} ms  {detail}' for name, ms, detail in self.steps]
+        for path, encoding, status, cache, ms in self.pages:
+            lines.append(f'  {ms:9.1f} ms  {status} {cache or "-":<5} {encoding:<8} {path}')
+        lines.append(f'{"total":<16} {self.total_ms:9.1f} ms')
+        return lines
+
+
+def compile_templates(app) -> int:
+    """Load every template once; returns how many compiled"""
+    env = app.jinja_env
+    count = 0
+    for name in env.list_templates():
+        try:
+            env.get_template(name)
+            count += 1
+        except Exception as e:
+            logger.warning(f"Template {name} failed to compile: {str(e)}")
+    return count
+
+
+def prime_tables(batch_size: int = 5000) -> int:
+    """Read the hot tables end to end; returns the number of rows read"""
+    rows = 0
+    for model in HOT_TABLES:
+        result = db.session.execute(select(model.__table__).execution_options(yield_per=batch_size))
+        for partition in result.partitions():
+            rows += len(partition)
+    db.session.rollback()
+    return rows
+
+
+def build_caches(app) -> str:
+    from .catalog import catalog
+    from .jobs import active_jobs
+    from .search_index import search_index
+
+    snapshot = catalog.snapshot()
+    search_index.build()
+    active_jobs.listing()
+    return f'snapshot={"yes" if snapshot is not None else "no"}'
+
+
+def top_pages(limit: int) -> List[str]:
+    """The fixed pages plus the `limit` categories with the most products"""
+    from .stats import site_stats
+
+    per_category = site_stats.snapshot()['products_per_category']
+    top = sorted(per_category, key=per_category.get, reverse=True)[:limit]
+    return list(DEFAULT_PAGES) + [f'/category/{category_id}' for category_id in top]
+
+
+def render_pages(app, paths: Sequence[str], report: WarmupReport) -> None:
+    from .compression import brotli
+
+    encodings = ('br', 'gzip') if brotli is not None else ('gzip',)
+    # No cookie jar: a session cookie set by one page would make the rest uncacheable
+    client = app.test_client(use_cookies=False)
+    base_url = f"{app.config.get('PREFERRED_URL_SCHEME', 'http')}://{app.config.get('SERVER_NAME') or 'localhost'}"
+    for path in paths:
+        for encoding in encodings:
+            started = time.perf_counter()
+            try:
+                # A fresh app context per request: under `flask warmup` the
+                # requests would otherwise share the command's context and `g`
+                with app.app_context():
+                    response = client.get(path, base_url=base_url, headers={'Accept-Encoding': encoding})
+                    # Consume streamed bodies so the response cache stores them
+                    response.get_data()
+                    response.close()
+                status, cache = response.status_code, response.headers.get('X-Cache')
+            except Exception as e:
+                logger.warning(f"Warm-up request for {path} failed: {str(e)}")
+                status, cache = 0, None
+            report.pages.append((path, encoding, status, cache,
+                                 round((time.perf_counter() - started) * 1000, 1)))
+
+
+def warm_up(app, pages: Optional[Sequence[str]] = None, render: bool = True) -> WarmupReport:
+    """
+    Run every warm-up step and report how long each took
+
+    `pages` overrides the rendered paths (default: DEFAULT_PAGES plus the
+    top WARMUP_TOP_CATEGORIES category pages).
+    """
+    report = WarmupReport()
+    started = time.perf_counter()
+
+    step = time.perf_counter()
+    report.step('templates', step, f'{compile_templates(app)} compiled')
+
+    with app.app_context():
+        step = time.perf_counter()
+        report.step('tables', step, f'{prime_tables()} rows read')
+
+        step = time.perf_counter()
+        report.step('caches', step, build_caches(app))
+
+        if render and pages is None:
+            pages = top_pages(app.config.get('WARMUP_TOP_CATEGORIES', 10))
+
+    if render:
+        step = time.perf_counter()
+        render_pages(app, pages, report)
+        report.step('pages', step, f'{len(report.pages)} requests')
+
+    report.total_ms = round((time.perf_counter() - started) * 1000, 1)
+    startup.timings['warmup_ms'] = report.total_ms
+    logger.info(f"Warm-up finished in {report.total_ms:.0f}ms")
+    return report